@@ -1,6 +1,9 @@
 import frappe
 import requests
 import json
+from frappe.utils.password import get_decrypted_password
+
+from insurance_erp.insurance_erp.doctype.insurance_system_settings.insurance_system_settings import get_insurance_settings
 
 @frappe.whitelist()
 def fetch_vehicle_rc(reg_no):
@@ -8,14 +11,18 @@ def fetch_vehicle_rc(reg_no):
     Fetches vehicle RC details from Cashfree API.
     """
     # 1. Get Settings
-    settings = frappe.get_single("Insurance System Settings")
+    settings = get_insurance_settings()
     if not settings.enable_vehicle_rc_verification:
         frappe.throw("Vehicle RC Verification is disabled in 'Insurance System Settings'.")
         
     if settings.rc_verification_provider != "Cashfree":
         frappe.throw(f"Provider '{settings.rc_verification_provider}' not implemented in this script.")
 
-    if not settings.cashfree_client_id or not settings.cashfree_client_secret:
+    # Secrets are not part of the cached settings
+    client_secret = get_decrypted_password(
+        "Insurance System Settings", "Insurance System Settings", "cashfree_client_secret", raise_exception=False
+    )
+    if not settings.cashfree_client_id or not client_secret:
         frappe.throw("Cashfree API Credentials not configured in 'Insurance System Settings'.")
 
     # 2. Determine URL
@@ -25,7 +32,7 @@ def fetch_vehicle_rc(reg_no):
     # 3. Prepare Request
     headers = {
         "x-client-id": settings.cashfree_client_id,
-        "x-client-secret": settings.get_password("cashfree_client_secret"),
+        "x-client-secret": client_secret,
         "Content-Type": "application/json"
     }
     payload = {
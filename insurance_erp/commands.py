@@ -0,0 +1,30 @@
+# Copyright (c) 2026, Insurance Solutions Inc and contributors
+# For license information, please see license.txt
+
+import click
+from frappe.commands import get_site, pass_context
+
+
+@click.command("rebuild-claim-counters")
+@pass_context
+def rebuild_claim_counters(context):
+	"Recompute the per-policy and per-add-on Insurance Claim Counters from existing claims"
+	import frappe
+
+	from insurance_erp.insurance_erp.doctype.insurance_claim_counter.insurance_claim_counter import (
+		rebuild_claim_counters,
+	)
+
+	site = get_site(context)
+	frappe.init(site=site)
+	frappe.connect()
+	try:
+		frappe.set_user("Administrator")
+		count = rebuild_claim_counters()
+		frappe.db.commit()
+		click.echo(f"Rebuilt {count} claim counters on {site}")
+	finally:
+		frappe.destroy()
+
+
+commands = [rebuild_claim_counters]
@@ -38,7 +38,7 @@ def create_insurance_plan():
             "depreciation_percent": 5
         })
         plan.append("depreciation_slabs", {
-            "from_age_months": 6,
+            "from_age_months": 7,
             "to_age_months": 12,
             "depreciation_percent": 10
         })
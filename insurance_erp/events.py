@@ -1,12 +1,28 @@
+import hashlib
+import hmac
 import frappe
 from frappe import _
-from frappe.utils import flt
+from frappe.utils import flt, now
+from frappe.utils.password import get_encryption_key
 import json
 
+from insurance_erp.insurance_erp import identity_map, notifications
+from insurance_erp.insurance_erp.api.plan_rating import get_plan_rating
+from insurance_erp.insurance_erp.doctype.insurance_claim.insurance_claim import get_settlement_amount
+from insurance_erp.insurance_erp.doctype.insurance_system_settings.insurance_system_settings import get_insurance_settings
+from insurance_erp.insurance_erp.doctype.policy_number_block.policy_number_block import next_policy_number
+
+# Sales Order fields written by the rating engine, covered by the rating fingerprint
+PREMIUM_FIELDS = ["od_premium", "tp_premium", "addon_premium", "total_net_premium", "total_gst", "grand_total_premium"]
+
 def validate_sales_order(doc, method):
     """
     Validate Sales Order as Insurance Proposal.
     Recalculates premium to prevent tampering and updates Item rate.
+
+    Saves that change neither the rating inputs nor the premium fields skip the
+    recalculation: `rating_fingerprint` is an HMAC over both, so a premium edited
+    on the client no longer matches and is recalculated as before.
     """
     if not doc.get("is_insurance_proposal"):
         return
@@ -16,42 +32,64 @@ def validate_sales_order(doc, method):
     addons = []
     if doc.proposal_addons:
         addons = [row.addon for row in doc.proposal_addons]
+
+    if doc.get("rating_fingerprint") and doc.rating_fingerprint == get_rating_fingerprint(doc, addons):
+        return
+
+    calc = None
+    if doc.get("insurance_quote"):
+        # Reuse the quoted premium while the quote is valid for these inputs
+        from insurance_erp.insurance_erp.doctype.insurance_quote.insurance_quote import get_quoted_premium
+
+        calc = get_quoted_premium(doc.insurance_quote, doc.insurance_plan, doc.vehicle, doc.idv, doc.ncb_percent, addons)
+        if not calc:
+            frappe.msgprint(_("Quote has expired or no longer matches this order, the premium was recalculated"), alert=True)
+            doc.insurance_quote = None
         
-    calc = calculate_premium(doc.insurance_plan, doc.vehicle, doc.idv, addons, doc.ncb_percent)
+    if not calc:
+        calc = calculate_premium(doc.insurance_plan, doc.vehicle, doc.idv, addons, doc.ncb_percent)
     
     if not calc:
         return
 
     # 1. Update Breakdown Fields (Server side override to ensure correctness)
-    doc.od_premium = calc.get("od_premium")
-    doc.tp_premium = calc.get("tp_premium")
-    doc.addon_premium = calc.get("addon_premium")
-    doc.total_net_premium = calc.get("total_net_premium")
-    doc.total_gst = calc.get("total_gst")
-    doc.grand_total_premium = calc.get("grand_total_premium")
+    for field in PREMIUM_FIELDS:
+        doc.set(field, calc.get(field))
     
     # 2. Update Item Rate
-    # Find the line item corresponding to Insurance Plan (assuming it matches the plan name or code)
-    # Or just the first item if we enforce single item policy
-    plan_item_found = False
+    item = get_premium_item(doc)
+    if item:
+        item.rate = calc.get("total_net_premium")
+        item.amount = item.rate * item.qty
+
+    doc.rating_fingerprint = get_rating_fingerprint(doc, addons)
+
+def get_premium_item(doc):
+    """
+    The line item carrying the premium: the one whose item code matches the
+    Insurance Plan (common pattern), else the first item.
+    """
     for item in doc.items:
-        # Check if item code matches plan (if plan is item) or custom logic
-        # For now, let's assume the user added the correct Item.
-        # We update the FIRST item's rate to the Net Premium.
-        # Ideally, we should check `item.item_code == doc.insurance_plan`.
-        
-        # If Plan Name matches Item Code (Common pattern)
         if item.item_code == doc.insurance_plan:
-            item.rate = calc.get("total_net_premium")
-            item.amount = item.rate * item.qty
-            plan_item_found = True
-            break
-            
-    if not plan_item_found and doc.items:
-        # Fallback: Update the first item? Or warning?
-        # Let's update the first item, assuming it is the insurance product.
-        doc.items[0].rate = calc.get("total_net_premium")
-        doc.items[0].amount = doc.items[0].rate * doc.items[0].qty
+            return item
+    return doc.items[0] if doc.items else None
+
+def get_rating_fingerprint(doc, addons):
+    """HMAC of the rating inputs (plan + version, vehicle, IDV, add-ons, NCB) and the rated outputs"""
+    rating = get_plan_rating(doc.insurance_plan)
+    item = get_premium_item(doc)
+    payload = {
+        "plan": doc.insurance_plan,
+        "plan_version": rating.modified if rating else None,
+        "vehicle": doc.vehicle,
+        "idv": flt(doc.idv),
+        "addons": sorted(addons),
+        "ncb_percent": flt(doc.ncb_percent),
+        "premium": [flt(doc.get(field)) for field in PREMIUM_FIELDS],
+        "rate": flt(item.rate) if item else None,
+    }
+    message = json.dumps(payload, sort_keys=True, separators=(",", ":")).encode()
+    return hmac.new(get_encryption_key().encode(), message, hashlib.sha256).hexdigest()
 
 def before_insert_sales_invoice(doc, method):
     """
@@ -62,18 +100,7 @@ def before_insert_sales_invoice(doc, method):
     4. Set Status
     """
     # 1. Identify if this is from an Insurance Proposal
-    so_doc = None
-    for item in doc.items:
-        if item.sales_order:
-            # Fetch SO (Optimization: Could use db.get_value but we need details for snapshot)
-            try:
-                so = frappe.get_doc("Sales Order", item.sales_order)
-                if so.is_insurance_proposal:
-                    so_doc = so
-                    break
-            except:
-                pass
-    
+    so_doc = get_insurance_sales_order(doc)
     if not so_doc:
         return
 
@@ -86,121 +113,314 @@ def before_insert_sales_invoice(doc, method):
     doc.policy_start_date = so_doc.policy_duration_from
     doc.policy_end_date = so_doc.policy_duration_to
     
-    # 2. Generate Policy Number
-    settings = frappe.get_single("Insurance System Settings")
-    series_pattern = settings.policy_naming_series or "POL-.YYYY.-.#####"
-    from frappe.model.naming import make_autoname
-    doc.policy_number = make_autoname(series_pattern)
+    # 2. Generate Policy Number (from this worker's reserved block, no lock on tabSeries)
+    doc.policy_number = next_policy_number()
     
     # 3. Snapshot Coverages
     if so_doc.insurance_plan:
-        plan = frappe.get_doc("Insurance Plan", so_doc.insurance_plan)
+        rating = get_plan_rating(so_doc.insurance_plan)
         
-        # A. Own Damage
-        if plan.od_config_section: # Just checking existence/config
-             # Using Limit=IDV for OD
-             doc.append("coverage_snapshot", {
-                 "coverage_type": "Own Damage",
-                 "limit_type": "Percentage of IDV",
-                 "limit_value": 100, # 100% of IDV
-                 "deductible": plan.deductible_amount or 0
-             })
-             
-        # B. Third Party
-        doc.append("coverage_snapshot", {
-             "coverage_type": "Third Party Liability",
-             "limit_type": "Unlimited", # Usually unlimited for TP death/injury, fixed for property
-             "limit_value": 0,
-             "deductible": 0
-        })
+        # A. Own Damage / B. Third Party, from the plan's cached coverage template
+        for coverage_type, limit_type, limit_value, deductible in (rating.coverage_template if rating else ()):
+            doc.append("coverage_snapshot", {
+                "coverage_type": coverage_type,
+                "limit_type": limit_type,
+                "limit_value": limit_value,
+                "deductible": deductible
+            })
         
-        # C. Add-ons
-        # We need to look at SO Proposal Addons
-        if so_doc.proposal_addons:
-             for addon_row in so_doc.proposal_addons:
-                 # Fetch addon config from Plan to see if there are limits?
-                 # ideally we just list them.
-                 doc.append("coverage_snapshot", {
-                     "coverage_type": addon_row.addon,
-                     "limit_type": "Fixed Amount", # Simplification
-                     "limit_value": 0, # Depending on addon
-                     "deductible": 0
-                 })
+        # C. Add-ons selected on the proposal
+        for addon in get_proposal_addons(so_doc.name):
+            doc.append("coverage_snapshot", {
+                "coverage_type": addon,
+                "limit_type": "Fixed Amount", # Simplification
+                "limit_value": 0, # Depending on addon
+                "deductible": 0
+            })
+
+def get_insurance_sales_order(invoice):
+    """
+    The first insurance proposal Sales Order referenced by the invoice items,
+    resolved with one query for all distinct orders (only the fields used above).
+    """
+    sales_orders = list(dict.fromkeys(item.sales_order for item in invoice.items if item.sales_order))
+    if not sales_orders:
+        return None
+
+    rows = frappe.get_all(
+        "Sales Order",
+        filters={"name": ["in", sales_orders], "is_insurance_proposal": 1},
+        fields=["name", "vehicle", "idv", "policy_duration_from", "policy_duration_to", "insurance_plan"],
+    )
+    by_name = {row.name: row for row in rows}
+    return next((by_name[name] for name in sales_orders if name in by_name), None)
+
+def get_proposal_addons(sales_order):
+    return frappe.get_all(
+        "Proposal Addon",
+        filters={"parent": sales_order, "parenttype": "Sales Order", "parentfield": "proposal_addons"},
+        pluck="addon",
+        order_by="idx",
+    )
 
 def handle_payment_entry_submission(doc, method):
 	"""
 	Hooked to Payment Entry: After Submit
 	Updates Sales Invoice (Policy) status to Active if fully paid.
 	"""
-	for ref in doc.get("references", []):
-		if ref.reference_doctype == 'Sales Invoice':
-			try:
-				inv = frappe.get_doc('Sales Invoice', ref.reference_name)
-				if not inv.get("is_insurance_policy"):
-					continue
-					
-				# Check if fully paid
-				# Payment Entry submission already updates Sales Invoice 'outstanding_amount' via standard ERPNext logic usually.
-				# But to be safe or trigger specific status change:
-				
-				# Reload to get updated outstanding (after standard processing)
-				inv.reload()
-				
-				if inv.outstanding_amount <= 0.1: # float tolerance
-					inv.db_set('policy_status', 'Active', notify=True, commit=True)
-					
-					settings = frappe.get_single('Insurance System Settings')
-					if settings.notify_customer_on_policy_activation:
-						frappe.msgprint(_('Policy {0} has been activated').format(inv.policy_number), alert=True)
-						
-						if settings.notification_email_template:
-						    # Fetch Customer Email
-						    customer_email = frappe.db.get_value("Customer", inv.customer, "email_id")
-						    if customer_email:
-						        email_template = frappe.get_doc("Email Template", settings.notification_email_template)
-						        message = frappe.render_template(email_template.response, {"doc": inv})
-						        frappe.sendmail(
-						            recipients=[customer_email],
-						            subject=email_template.subject,
-						            message=message,
-						            reference_doctype=inv.doctype,
-						            reference_name=inv.name
-						        )
-				else:
-				    # Maybe set to Pending Payment if not?
-				    pass
-					
-			except Exception:
-				frappe.log_error(frappe.get_traceback(), _("Policy Activation Failed"))
+	invoices = [
+		ref.reference_name for ref in doc.get("references", [])
+		if ref.reference_doctype == "Sales Invoice" and ref.reference_name
+	]
+	activate_paid_policies(invoices)
 
 def handle_journal_entry_submission(doc, method):
 	"""
 	Hooked to Journal Entry: After Submit
 	Handles both Premium Receipts (for policies via SI) and Settlement Payments (for Claims).
 	"""
+	invoices, claims = [], []
 	for row in doc.get("accounts", []):
-		# 1. Handle Premium Receipt
 		if row.reference_type == "Sales Invoice" and row.reference_name:
-			try:
-				inv = frappe.get_doc("Sales Invoice", row.reference_name)
-				if inv.get("is_insurance_policy"):
-				    inv.reload()
-				    if inv.outstanding_amount <= 0.1:
-				        inv.db_set('policy_status', 'Active', notify=True, commit=True)
-			except Exception:
-				frappe.log_error(frappe.get_traceback(), _("Policy Activation via JE Failed"))
-
-		# 2. Handle Claim Settlement
-		if row.reference_type == "Insurance Claim" and row.reference_name:
-			try:
-				claim = frappe.get_doc("Insurance Claim", row.reference_name)
-				# Assuming settlement logic matches
-				claim.db_set('claim_status', 'Settled', notify=True)
-				claim.db_set('settlement_journal_entry', doc.name)
-				frappe.db.commit()
-				
-				settings = frappe.get_single('Insurance System Settings')
-				if settings.notify_customer_on_claim_status_change:
-					frappe.msgprint(_('Claim {0} has been settled via JE {1}').format(claim.name, doc.name), alert=True)
-			except Exception:
-				frappe.log_error(frappe.get_traceback(), _("Claim Settlement via JE Failed"))
+			invoices.append(row.reference_name)
+		if row.get("insurance_claim"):
+			claims.append(row.insurance_claim)
+
+	# 1. Premium Receipts
+	activate_paid_policies(invoices)
+
+	# 2. Claim Settlements
+	settle_claims(claims, doc.name)
+
+def validate_journal_entry(doc, method):
+	"""
+	Hooked to Journal Entry: Validate
+	Claim settlement lines (linked through the custom `insurance_claim` field) must pay Approved claims that are not settled or part of another
+	Journal Entry, for exactly their settlement amount. Checked with one query per table.
+	"""
+	amounts = {}
+	for row in doc.get("accounts", []):
+		if row.get("insurance_claim"):
+			amounts[row.insurance_claim] = (
+				amounts.get(row.insurance_claim, 0)
+				+ flt(row.debit_in_account_currency) - flt(row.credit_in_account_currency)
+			)
+	if not amounts:
+		return
+
+	claim_names = list(amounts)
+	claims = {
+		row.name: row for row in frappe.get_all(
+			"Insurance Claim",
+			filters={"name": ["in", claim_names]},
+			fields=["name", "claim_status", "settlement_journal_entry", "approved_amount", "settlement_amount", "deductible_applied"],
+		)
+	}
+	in_other_entries = set(frappe.get_all(
+		"Journal Entry Account",
+		filters={
+			"insurance_claim": ["in", claim_names],
+			"docstatus": ["<", 2],
+			"parent": ["!=", doc.name or ""],
+		},
+		pluck="insurance_claim",
+	))
+
+	for name, amount in amounts.items():
+		claim = claims.get(name)
+		if not claim:
+			frappe.throw(_("Insurance Claim {0} does not exist").format(name))
+		if claim.claim_status != "Approved" or (claim.settlement_journal_entry and claim.settlement_journal_entry != doc.name):
+			frappe.throw(_("Insurance Claim {0} is not Approved for settlement").format(name))
+		if name in in_other_entries:
+			frappe.throw(_("Insurance Claim {0} is already part of another Journal Entry").format(name))
+		if abs(amount - get_settlement_amount(claim)) > 0.01:
+			frappe.throw(_("Journal Entry pays {0} for Insurance Claim {1}, its settlement amount is {2}").format(
+				amount, name, get_settlement_amount(claim)
+			))
+
+def handle_journal_entry_cancel(doc, method):
+	"""
+	Hooked to Journal Entry: On Cancel
+	Claims settled by the Journal Entry go back to Approved with one UPDATE.
+	"""
+	claims = frappe.get_all("Insurance Claim", filters={"settlement_journal_entry": doc.name}, pluck="name")
+	if not claims:
+		return
+
+	frappe.db.sql("""
+		UPDATE `tabInsurance Claim`
+		SET claim_status = 'Approved', settlement_journal_entry = NULL, modified = %s, modified_by = %s
+		WHERE name IN %s
+	""", (now(), frappe.session.user, claims))
+	frappe.publish_realtime("list_update", {"doctype": "Insurance Claim"}, after_commit=True)
+	for claim in claims:
+		identity_map.forget("Insurance Claim", claim)
+	notifications.queue_notifications(notifications.CLAIM_STATUS_CHANGED, "Insurance Claim", claims)
+
+def activate_paid_policies(invoices):
+	"""
+	Mark the fully paid policy invoices among `invoices` Active with one fetch and one UPDATE.
+	Runs inside the submitting transaction; emails are only queued once it commits.
+	"""
+	if not invoices:
+		return []
+
+	# Outstanding amounts were already updated by the Payment / Journal Entry's own on_submit
+	paid = frappe.get_all(
+		"Sales Invoice",
+		filters={
+			"name": ["in", list(set(invoices))],
+			"is_insurance_policy": 1,
+			"outstanding_amount": ["<=", 0.1],  # float tolerance
+			"policy_status": ["!=", "Active"],
+		},
+		fields=["name", "policy_number"],
+	)
+	if not paid:
+		return []
+
+	names = [row.name for row in paid]
+	frappe.db.sql("""
+		UPDATE `tabSales Invoice`
+		SET policy_status = 'Active', modified = %s, modified_by = %s
+		WHERE name IN %s
+	""", (now(), frappe.session.user, names))
+	frappe.publish_realtime("list_update", {"doctype": "Sales Invoice"}, after_commit=True)
+
+	if get_insurance_settings().notify_customer_on_policy_activation:
+		for row in paid:
+			frappe.msgprint(_("Policy {0} has been activated").format(row.policy_number), alert=True)
+	notifications.queue_notifications(notifications.POLICY_ACTIVATED, "Sales Invoice", names)
+
+	return names
+
+def settle_claims(claims, journal_entry):
+	"""Mark the claims paid by `journal_entry` Settled with one UPDATE (no commit)"""
+	if not claims:
+		return []
+
+	claims = list(set(claims))
+	frappe.db.sql("""
+		UPDATE `tabInsurance Claim`
+		SET claim_status = 'Settled', settlement_journal_entry = %s, modified = %s, modified_by = %s
+		WHERE name IN %s
+	""", (journal_entry, now(), frappe.session.user, claims))
+	frappe.publish_realtime("list_update", {"doctype": "Insurance Claim"}, after_commit=True)
+	for claim in claims:
+		identity_map.forget("Insurance Claim", claim)
+
+	if get_insurance_settings().notify_customer_on_claim_status_change:
+		for claim in claims:
+			frappe.msgprint(_("Claim {0} has been settled via JE {1}").format(claim, journal_entry), alert=True)
+	notifications.queue_notifications(notifications.CLAIM_STATUS_CHANGED, "Insurance Claim", claims)
+
+	return claims
+
+# Larger selections are assigned by a background job
+SURVEY_ASSIGNMENT_SYNC_LIMIT = 50
+SURVEY_ASSIGNMENT_CHUNK_SIZE = 200
+
+@frappe.whitelist()
+def assign_surveyor_to_claims(claim_names, surveyor, survey_date):
+	"""
+	Bulk "Move to Survey" from the Insurance Claim list.
+	Returns [{"claim", "status": "Success" | "Failed" | "Queued", "survey" / "message"}].
+	"""
+	frappe.has_permission("Claim Survey", "create", throw=True)
+	if isinstance(claim_names, str):
+		claim_names = json.loads(claim_names)
+	claim_names = list(dict.fromkeys(claim_names or []))
+
+	if len(claim_names) > SURVEY_ASSIGNMENT_SYNC_LIMIT:
+		frappe.enqueue(
+			"insurance_erp.events.assign_surveyor_in_background",
+			queue="long",
+			timeout=1800,
+			claim_names=claim_names,
+			surveyor=surveyor,
+			survey_date=survey_date,
+			notify_user=frappe.session.user,
+		)
+		return [{"claim": claim, "status": "Queued"} for claim in claim_names]
+
+	return assign_surveyor(claim_names, surveyor, survey_date)
+
+def assign_surveyor_in_background(claim_names, surveyor, survey_date, notify_user=None):
+	"""Background job: assign in chunks, committing and publishing progress after each"""
+	results = []
+	for start in range(0, len(claim_names), SURVEY_ASSIGNMENT_CHUNK_SIZE):
+		results.extend(assign_surveyor(claim_names[start : start + SURVEY_ASSIGNMENT_CHUNK_SIZE], surveyor, survey_date))
+		frappe.db.commit()
+		frappe.publish_realtime(
+			"insurance_survey_assignment_progress",
+			{
+				"processed": len(results),
+				"total": len(claim_names),
+				"success": sum(1 for result in results if result["status"] == "Success"),
+				"failed": [result for result in results if result["status"] == "Failed"],
+			},
+			user=notify_user,
+		)
+	return results
+
+def assign_surveyor(claim_names, surveyor, survey_date):
+	"""
+	Create a Claim Survey for every Reported claim among `claim_names` and move them to
+	Survey Assigned: one locking read of the statuses, one bulk INSERT, one UPDATE.
+	"""
+	if not claim_names:
+		return []
+
+	statuses = dict(frappe.db.sql("""
+		SELECT name, claim_status FROM `tabInsurance Claim`
+		WHERE name IN %s
+		FOR UPDATE
+	""", (claim_names,)))
+
+	results, surveys = [], []
+	for claim in claim_names:
+		status = statuses.get(claim)
+		if status is None:
+			results.append({"claim": claim, "status": "Failed", "message": _("Claim not found")})
+		elif status != "Reported":
+			results.append({"claim": claim, "status": "Failed", "message": _("Claim is in {0} status").format(status)})
+		else:
+			survey = frappe.get_doc({
+				"doctype": "Claim Survey",
+				"claim": claim,
+				"surveyor": surveyor,
+				"survey_date": survey_date,
+			})
+			# Same names as a regular insert (SRV-{YYYY}-{#####})
+			survey.set_new_name()
+			surveys.append(survey)
+			results.append({"claim": claim, "status": "Success", "survey": survey.name})
+
+	if not surveys:
+		return results
+
+	timestamp, user = now(), frappe.session.user
+	fields = ["name", "claim", "surveyor", "survey_date", "creation", "modified", "owner", "modified_by", "docstatus", "idx"]
+	frappe.db.bulk_insert("Claim Survey", fields, [
+		(survey.name, survey.claim, surveyor, survey_date, timestamp, timestamp, user, user, 0, 0)
+		for survey in surveys
+	])
+
+	cases, values = [], []
+	for survey in surveys:
+		cases.append("WHEN %s THEN %s")
+		values.extend([survey.claim, survey.name])
+	claims = [survey.claim for survey in surveys]
+	frappe.db.sql("""
+		UPDATE `tabInsurance Claim`
+		SET claim_status = 'Survey Assigned', survey = CASE name {cases} END, modified = %s, modified_by = %s
+		WHERE name IN %s
+	""".format(cases=" ".join(cases)), (*values, timestamp, user, claims))
+
+	for claim in claims:
+		identity_map.forget("Insurance Claim", claim)
+	frappe.publish_realtime("list_update", {"doctype": "Insurance Claim"}, after_commit=True)
+	notifications.queue_notifications(notifications.CLAIM_STATUS_CHANGED, "Insurance Claim", claims)
+
+	return results
@@ -14,7 +14,8 @@ doc_events = {
     },
     "Journal Entry": {
         "validate": "insurance_erp.events.validate_journal_entry",
-        "on_submit": "insurance_erp.events.handle_journal_entry_submission"
+        "on_submit": "insurance_erp.events.handle_journal_entry_submission",
+        "on_cancel": "insurance_erp.events.handle_journal_entry_cancel"
     },
     "Sales Order": {
         "validate": "insurance_erp.events.validate_sales_order"
@@ -26,6 +27,19 @@ doc_events = {
 # Scheduled Tasks
 scheduler_events = {
 	"daily": [
-		"insurance_erp.insurance_erp.doctype.policy_renewal.policy_renewal.check_for_renewals"
-	]
+		"insurance_erp.insurance_erp.doctype.insurance_quote.insurance_quote.delete_expired_quotes"
+	],
+	"daily_long": [
+		"insurance_erp.insurance_erp.doctype.vehicle.vehicle.recompute_fleet_idv",
+		"insurance_erp.insurance_erp.doctype.policy_renewal.policy_renewal.check_for_renewals",
+		"insurance_erp.insurance_erp.api.fraud_scoring.score_open_claims"
+	],
+	"cron": {
+		"* * * * *": [
+			"insurance_erp.insurance_erp.notifications.send_queued_notifications"
+		],
+		"*/5 * * * *": [
+			"insurance_erp.insurance_erp.api.fraud_scoring.score_pending_claims"
+		]
+	}
 }
@@ -0,0 +1,240 @@
+# Copyright (c) 2026, Insurance Solutions Inc and contributors
+# For license information, please see license.txt
+
+"""
+Rule-based fraud scoring for Insurance Claims.
+
+The features of a batch of claims are read with one query and turned into
+arrays. Every rule maps one feature linearly onto a 0..1 score between a
+`clean` value (score 0) and a `suspicious` value (score 1), and the claim's
+fraud score is the weighted sum, 0 to 100. Rules that fire become automatic
+Fraud Indicator rows; indicators entered by hand are kept.
+
+Scores are written set-based: the automatic indicator rows of the batch are
+replaced with one DELETE and one bulk INSERT, and the scores with one UPDATE.
+
+New and changed claims (`fraud_scored_on` cleared in `InsuranceClaim.validate`)
+are scored every few minutes, all open claims nightly, as claim frequencies
+change when other claims come in.
+"""
+
+from dataclasses import dataclass
+
+import frappe
+import numpy as np
+from frappe import _
+from frappe.utils import cint, flt, getdate, now
+
+from insurance_erp.insurance_erp import identity_map
+from insurance_erp.insurance_erp.doctype.insurance_system_settings.insurance_system_settings import (
+	get_insurance_settings,
+)
+
+SCORING_CHUNK_SIZE = 5000
+
+# Claims in these states are no longer scored
+CLOSED_CLAIM_STATUSES = ("Rejected", "Settled")
+
+# Other claims of the same vehicle or customer counted within this many days before the loss
+CLAIM_FREQUENCY_DAYS = 365
+
+
+@dataclass(frozen=True)
+class FraudRule:
+	indicator: str
+	feature: str
+	clean: float
+	suspicious: float
+	weight: float
+	notes: str
+
+
+FRAUD_RULES = (
+	FraudRule("Early Claim", "days_from_policy_start", 60, 0, 30, "Loss {value:.0f} days after policy start"),
+	FraudRule("High Claim Amount", "claim_to_idv_percent", 50, 100, 30, "Claim is {value:.1f}% of the IDV"),
+	FraudRule(
+		"Prior Claims History",
+		"prior_claims",
+		0,
+		3,
+		25,
+		"{value:.0f} other claim(s) on the vehicle or customer in the year before the loss",
+	),
+	FraudRule("Delayed Reporting", "reporting_delay_days", 7, 30, 15, "Registered {value:.0f} days after the loss"),
+)
+
+# Minimum rule score for each severity, highest first
+SEVERITIES = ((2 / 3, "High"), (1 / 3, "Medium"), (0, "Low"))
+
+
+def score_pending_claims():
+	"""Scheduled every few minutes: score open claims that are new or changed since they were scored"""
+	while True:
+		claims = frappe.get_all(
+			"Insurance Claim",
+			filters={"fraud_scored_on": ("is", "not set"), "claim_status": ("not in", CLOSED_CLAIM_STATUSES)},
+			pluck="name",
+			limit=SCORING_CHUNK_SIZE,
+		)
+		if not claims:
+			break
+
+		score_claims(claims)
+		frappe.db.commit()
+		if len(claims) < SCORING_CHUNK_SIZE:
+			break
+
+
+def score_open_claims():
+	"""Nightly: score all open claims again, in keyset-paginated chunks"""
+	after = ""
+	while True:
+		claims = frappe.get_all(
+			"Insurance Claim",
+			filters={"name": (">", after), "claim_status": ("not in", CLOSED_CLAIM_STATUSES)},
+			pluck="name",
+			order_by="name",
+			limit=SCORING_CHUNK_SIZE,
+		)
+		if not claims:
+			break
+
+		score_claims(claims)
+		frappe.db.commit()
+		after = claims[-1]
+
+
+def score_claims(claims):
+	"""Score `claims` and write their automatic indicators and scores (no commit)"""
+	features = get_claim_features(claims)
+	if not features["name"]:
+		return {}
+
+	scores, rule_scores = compute_scores(features)
+	write_scores(features, scores, rule_scores)
+	return dict(zip(features["name"], scores.tolist()))
+
+
+def get_claim_features(claims):
+	"""{feature: array} for `claims` (plus their names), from one query"""
+	rows = frappe.db.sql("""
+		SELECT
+			claim.name,
+			claim.date_of_loss,
+			claim.claim_registration_date,
+			claim.claim_amount,
+			policy.policy_start_date,
+			policy.vehicle_idv,
+			GREATEST(
+				(
+					SELECT COUNT(*) FROM `tabInsurance Claim` other
+					WHERE other.vehicle = claim.vehicle AND other.name != claim.name
+						AND other.date_of_loss BETWEEN DATE_SUB(claim.date_of_loss, INTERVAL %(days)s DAY)
+							AND claim.date_of_loss
+				),
+				(
+					SELECT COUNT(*) FROM `tabInsurance Claim` other
+					WHERE other.customer = claim.customer AND other.name != claim.name
+						AND other.date_of_loss BETWEEN DATE_SUB(claim.date_of_loss, INTERVAL %(days)s DAY)
+							AND claim.date_of_loss
+				)
+			) AS prior_claims
+		FROM `tabInsurance Claim` claim
+		LEFT JOIN `tabInsurance Policy` policy ON policy.name = claim.policy
+		WHERE claim.name IN %(claims)s
+	""", {"claims": list(claims), "days": CLAIM_FREQUENCY_DAYS}, as_dict=1)
+
+	def days(rows, start, end):
+		# NaN where either date is missing, so the rule does not fire
+		return np.array([
+			(getdate(row[end]) - getdate(row[start])).days if row[start] and row[end] else np.nan
+			for row in rows
+		], dtype=float)
+
+	claim_amount = np.array([flt(row.claim_amount) for row in rows], dtype=float)
+	idv = np.array([flt(row.vehicle_idv) for row in rows], dtype=float)
+
+	return {
+		"name": [row.name for row in rows],
+		"days_from_policy_start": days(rows, "policy_start_date", "date_of_loss"),
+		"claim_to_idv_percent": np.divide(
+			claim_amount * 100, idv, out=np.full(len(rows), np.nan), where=idv > 0
+		),
+		"prior_claims": np.array([cint(row.prior_claims) for row in rows], dtype=float),
+		"reporting_delay_days": days(rows, "date_of_loss", "claim_registration_date"),
+	}
+
+
+def compute_scores(features):
+	"""Fraud scores (0..100) and {rule indicator: 0..1 rule scores} for the feature arrays"""
+	rule_scores = {}
+	for rule in FRAUD_RULES:
+		values = features[rule.feature]
+		score = (values - rule.clean) / (rule.suspicious - rule.clean)
+		rule_scores[rule.indicator] = np.nan_to_num(np.clip(score, 0, 1), nan=0.0)
+
+	scores = sum(rule.weight * rule_scores[rule.indicator] for rule in FRAUD_RULES)
+	return np.round(scores, 2), rule_scores
+
+
+def get_severity(rule_score):
+	return next(severity for minimum, severity in SEVERITIES if rule_score >= minimum)
+
+
+def write_scores(features, scores, rule_scores):
+	names = features["name"]
+	timestamp, user = now(), frappe.session.user
+
+	indicators = []
+	for rule in FRAUD_RULES:
+		values = features[rule.feature].tolist()
+		for idx in np.flatnonzero(rule_scores[rule.indicator] > 0).tolist():
+			rule_score = float(rule_scores[rule.indicator][idx])
+			indicators.append([
+				frappe.generate_hash(length=10), names[idx], "Insurance Claim", "fraud_indicators", 0,
+				rule.indicator, get_severity(rule_score), rule.notes.format(value=values[idx]),
+				round(rule_score * rule.weight, 2), 1, timestamp, timestamp, user, user,
+			])
+
+	frappe.db.sql("""
+		DELETE FROM `tabFraud Indicator`
+		WHERE parenttype = 'Insurance Claim' AND parentfield = 'fraud_indicators'
+			AND automatic = 1 AND parent IN %s
+	""", (names,))
+	if indicators:
+		frappe.db.bulk_insert(
+			"Fraud Indicator",
+			[
+				"name", "parent", "parenttype", "parentfield", "idx", "indicator", "severity", "notes",
+				"score", "automatic", "creation", "modified", "owner", "modified_by",
+			],
+			indicators,
+		)
+
+	threshold = get_insurance_settings().fraud_score_threshold
+	suspected = [name for name, score in zip(names, scores.tolist()) if threshold and score >= threshold]
+
+	frappe.db.sql("""
+		UPDATE `tabInsurance Claim`
+		SET fraud_score = CASE name {cases} END,
+			fraud_suspected = IF(name IN %s, 1, fraud_suspected),
+			fraud_scored_on = %s, modified = %s, modified_by = %s
+		WHERE name IN %s
+	""".format(cases=" ".join(["WHEN %s THEN %s"] * len(names))),
+		[value for pair in zip(names, scores.tolist()) for value in pair]
+		+ [suspected or [""], timestamp, timestamp, user, names],
+	)
+
+	for name in names:
+		identity_map.forget("Insurance Claim", name)
+	frappe.publish_realtime("list_update", {"doctype": "Insurance Claim"}, after_commit=True)
+
+
+@frappe.whitelist()
+def score_claim(claim):
+	"""Score one claim now (from the claim form)"""
+	frappe.has_permission("Insurance Claim", "write", claim, throw=True)
+	score = score_claims([claim]).get(claim)
+	if score is None:
+		frappe.throw(_("Insurance Claim {0} not found").format(claim), frappe.DoesNotExistError)
+	return score
@@ -0,0 +1,93 @@
+# Copyright (c) 2026, Insurance Solutions Inc and contributors
+# For license information, please see license.txt
+
+"""
+IDV depreciation from an Insurance Plan's depreciation slabs.
+
+Slabs are compiled into parallel arrays sorted by age (`depreciation_from`,
+`depreciation_to`, `depreciation_percent`) that live on the cached
+`PlanRating`, so the applicable slab is found by bisection instead of a scan.
+Slabs are contiguous (validated on plan save), so the slab for an age is the
+first one whose upper bound is not below it.
+"""
+
+from bisect import bisect_left
+
+import frappe
+import numpy as np
+from frappe import _
+from frappe.utils import cint, flt
+
+NO_UPPER_LIMIT = float("inf")
+
+
+def compile_depreciation_slabs(slabs):
+	"""Sorted boundary arrays for a plan's `depreciation_slabs` rows"""
+	slabs = sorted(slabs, key=lambda slab: cint(slab.from_age_months))
+	return {
+		"depreciation_from": [cint(slab.from_age_months) for slab in slabs],
+		# A To Age of 0 means the slab has no upper limit
+		"depreciation_to": [cint(slab.to_age_months) or NO_UPPER_LIMIT for slab in slabs],
+		"depreciation_percent": [flt(slab.depreciation_percent) for slab in slabs],
+	}
+
+
+def validate_depreciation_slabs(slabs):
+	"""Throw if the slabs overlap or leave a gap between them"""
+	slabs = sorted(slabs, key=lambda slab: cint(slab.from_age_months))
+	previous = None
+	for slab in slabs:
+		from_age, to_age = cint(slab.from_age_months), cint(slab.to_age_months)
+		if from_age < 0:
+			frappe.throw(_("Row #{0}: From Age (Months) cannot be negative").format(slab.idx))
+		if to_age and to_age < from_age:
+			frappe.throw(_("Row #{0}: To Age (Months) cannot be less than From Age (Months)").format(slab.idx))
+
+		if previous:
+			previous_to = cint(previous.to_age_months)
+			if not previous_to or from_age <= previous_to:
+				frappe.throw(
+					_("Depreciation slabs in rows #{0} and #{1} overlap").format(previous.idx, slab.idx),
+					title=_("Invalid Depreciation Slabs"),
+				)
+			if from_age > previous_to + 1:
+				frappe.throw(
+					_("Depreciation slabs leave a gap between {0} and {1} months (rows #{2} and #{3})").format(
+						previous_to, from_age, previous.idx, slab.idx
+					),
+					title=_("Invalid Depreciation Slabs"),
+				)
+		previous = slab
+
+
+def get_depreciation_percent(rating, age_months):
+	"""Depreciation % for a vehicle of `age_months` (0 outside the slabs)"""
+	if not rating.depreciation_from or age_months < rating.depreciation_from[0]:
+		return 0.0
+
+	idx = bisect_left(rating.depreciation_to, age_months)
+	if idx == len(rating.depreciation_to):
+		return 0.0
+	return rating.depreciation_percent[idx]
+
+
+def calculate_idv(rating, vehicle_value, age_months):
+	depreciation_percent = get_depreciation_percent(rating, age_months)
+	return flt(flt(vehicle_value) * (1 - (depreciation_percent / 100)), 2)
+
+
+def calculate_idv_bulk(rating, vehicle_values, ages_months):
+	"""Vectorized `calculate_idv` for many vehicles rated on the same plan, returns a NumPy array"""
+	values = np.asarray(vehicle_values, dtype=float)
+	ages = np.asarray(ages_months, dtype=float)
+	if not rating.depreciation_from:
+		return np.round(values, 2)
+
+	upper = np.asarray(rating.depreciation_to, dtype=float)
+	percent = np.asarray(rating.depreciation_percent, dtype=float)
+
+	idx = np.searchsorted(upper, ages, side="left")
+	in_slab = (ages >= rating.depreciation_from[0]) & (idx < len(upper))
+	depreciation_percent = np.where(in_slab, percent[np.minimum(idx, len(upper) - 1)], 0.0)
+
+	return np.round(values * (1 - (depreciation_percent / 100)), 2)
@@ -0,0 +1,85 @@
+# Copyright (c) 2026, Insurance Solutions Inc and contributors
+# For license information, please see license.txt
+
+"""
+No Claim Bonus from claims history.
+
+A vehicle's claim-free years run from its last claim's date of loss (or, with
+no claims, from the start of its first policy) to the renewal date. The NCB is
+the percentage of the highest `ncb_slabs` row of the plan whose Years Without
+Claim does not exceed them; the compiled `PlanRating` keeps the slabs sorted
+by years, so the lookup is a binary search.
+"""
+
+from bisect import bisect_right
+
+import frappe
+import numpy as np
+from frappe.utils import add_days, getdate
+
+# Claims in these states do not cost the vehicle its No Claim Bonus
+NCB_NEUTRAL_CLAIM_STATUSES = ("Rejected",)
+
+
+def get_ncb_percent(rating, claim_free_years):
+	"""NCB % for `claim_free_years` on a plan (0 below the first slab)"""
+	years = [slab[0] for slab in rating.ncb_slabs]
+	idx = bisect_right(years, claim_free_years)
+	return rating.ncb_slabs[idx - 1][1] if idx else 0.0
+
+
+def calculate_ncb_bulk(rating, claim_free_years):
+	"""Vectorized `get_ncb_percent` for many vehicles rated on the same plan, returns a NumPy array"""
+	years = np.asarray(claim_free_years, dtype=float)
+	if not rating.ncb_slabs:
+		return np.zeros(len(years))
+
+	slab_years = np.asarray([slab[0] for slab in rating.ncb_slabs], dtype=float)
+	percent = np.asarray([slab[1] for slab in rating.ncb_slabs], dtype=float)
+
+	idx = np.searchsorted(slab_years, years, side="right") - 1
+	return np.where(idx >= 0, percent[np.maximum(idx, 0)], 0.0)
+
+
+def get_claim_free_years(policies):
+	"""
+	{policy name: whole claim-free years of its vehicle at the policy's end date} for `policies`,
+	from one aggregate query over the vehicle's policies and claims.
+	"""
+	if not policies:
+		return {}
+
+	rows = frappe.db.sql("""
+		SELECT
+			policy.name,
+			policy.policy_end_date,
+			(
+				SELECT MAX(claim.date_of_loss)
+				FROM `tabInsurance Claim` claim
+				WHERE claim.vehicle = policy.vehicle
+					AND claim.date_of_loss <= policy.policy_end_date
+					AND claim.claim_status NOT IN %(neutral_statuses)s
+			) AS last_claim_date,
+			(
+				SELECT MIN(history.policy_start_date)
+				FROM `tabInsurance Policy` history
+				WHERE history.vehicle = policy.vehicle AND history.docstatus = 1
+			) AS first_policy_start
+		FROM `tabInsurance Policy` policy
+		WHERE policy.name IN %(policies)s
+	""", {"policies": list(policies), "neutral_statuses": NCB_NEUTRAL_CLAIM_STATUSES}, as_dict=1)
+
+	return {
+		row.name: get_whole_years(
+			row.last_claim_date or row.first_policy_start or row.policy_end_date,
+			add_days(row.policy_end_date, 1),
+		)
+		for row in rows
+	}
+
+
+def get_whole_years(from_date, to_date):
+	"""Completed years between two dates"""
+	from_date, to_date = getdate(from_date), getdate(to_date)
+	years = to_date.year - from_date.year - ((to_date.month, to_date.day) < (from_date.month, from_date.day))
+	return max(years, 0)
@@ -0,0 +1,176 @@
+# Copyright (c) 2026, Insurance Solutions Inc and contributors
+# For license information, please see license.txt
+
+"""
+Which Insurance Plans can be sold for a given vehicle.
+
+Active plans are kept in an interval index per `vehicle_type`: the engine CC
+bands of all plans are cut into elementary segments, each holding the plans
+that cover it, so "eligible plans for this vehicle" is one bisection. The raw
+bands are cached in Redis, one entry per vehicle type, dropped whenever a plan
+of that type changes and rebuilt from one query on the next lookup.
+"""
+
+from bisect import bisect_right
+
+import frappe
+from frappe import _
+from frappe.utils import cint, flt
+
+from insurance_erp.insurance_erp import cache, identity_map
+from insurance_erp.insurance_erp.api.plan_rating import get_plan_rating
+
+CACHE_NAMESPACE = "insurance_plan_eligibility"
+# Cached bands are versioned with random tokens rather than a database value, rebuilt daily at least
+CACHE_TTL = 24 * 60 * 60
+VEHICLE_PROFILE_FIELDS = ["engine_cc", "custom_engine_cc", "custom_vehicle_category"]
+
+
+class EligibilityIndex:
+	"""Immutable stabbing index over inclusive [engine_cc_from, engine_cc_to] bands.
+
+	A band end of 0 means no upper limit. Engine CC is an integer, so a band
+	[a, b] covers the half open segment [a, b + 1).
+	"""
+
+	__slots__ = ("boundaries", "plans")
+
+	def __init__(self, bands):
+		starts = {cc_from for cc_from, cc_to, plan in bands}
+		ends = {cc_to + 1 for cc_from, cc_to, plan in bands if cc_to}
+		boundaries = sorted(starts | ends)
+		self.boundaries = tuple(boundaries)
+		self.plans = tuple(
+			tuple(sorted(plan for cc_from, cc_to, plan in bands if cc_from <= start and (not cc_to or start <= cc_to)))
+			for start in boundaries
+		)
+
+	def lookup(self, engine_cc):
+		idx = bisect_right(self.boundaries, engine_cc) - 1
+		return self.plans[idx] if idx >= 0 else ()
+
+
+def get_eligible_plans(vehicle_type, engine_cc):
+	"""Names of active plans for `vehicle_type` whose engine CC band contains `engine_cc`"""
+	index = cache.get_versioned(
+		CACHE_NAMESPACE,
+		vehicle_type,
+		get_version=lambda key: frappe.generate_hash(length=12),
+		build=_get_bands,
+		load=EligibilityIndex,
+		ttl=CACHE_TTL,
+	)
+	return list(index.lookup(flt(engine_cc)))
+
+
+def is_plan_eligible(plan, profile):
+	"""
+	Whether `plan` covers the vehicle type and engine CC of `profile`. Unlike the index this
+	does not require the plan to be active: inactive plans are no longer offered, but orders
+	and proposals already made on them can still be saved.
+	"""
+	rating = get_plan_rating(plan)
+	if not rating:
+		return False
+
+	# Same inclusive bands as the index, [cc_from, cc_to + 1) with a 0 end meaning no upper limit
+	engine_cc = flt(profile.engine_cc)
+	return (
+		rating.vehicle_type == profile.vehicle_type
+		and rating.engine_cc_from <= engine_cc
+		and (not rating.engine_cc_to or engine_cc < rating.engine_cc_to + 1)
+	)
+
+
+def validate_plan_eligibility(plan, vehicle):
+	"""Throw if `plan` does not cover the vehicle's type and engine CC"""
+	profile = get_vehicle_profile(vehicle) if isinstance(vehicle, str) else vehicle
+	if not is_plan_eligible(plan, profile):
+		frappe.throw(
+			_("Insurance Plan {0} is not available for {1} {2} with {3} CC").format(
+				frappe.bold(plan), profile.vehicle_type, frappe.bold(profile.name), cint(profile.engine_cc)
+			),
+			title=_("Plan Not Eligible"),
+		)
+
+
+def get_vehicle_profile(vehicle):
+	"""Return the rating inputs of a Vehicle (engine CC and plan vehicle type), read once per request"""
+	return _make_profile(
+		vehicle, identity_map.get_values("Vehicle", vehicle, get_vehicle_fields(VEHICLE_PROFILE_FIELDS))
+	)
+
+
+def get_vehicle_profiles(vehicles):
+	"""Bulk `get_vehicle_profile`: {vehicle name: profile} for the vehicles that exist"""
+	vehicles = list({vehicle for vehicle in vehicles if vehicle})
+	if not vehicles:
+		return {}
+
+	rows = frappe.get_all(
+		"Vehicle", filters={"name": ["in", vehicles]}, fields=["name", *get_vehicle_fields(VEHICLE_PROFILE_FIELDS)]
+	)
+	return {row.name: _make_profile(row.name, row) for row in rows}
+
+
+def get_vehicle_fields(fields):
+	"""The `fields` that exist on Vehicle (most are custom fields that a site may not have)"""
+	meta = frappe.get_meta("Vehicle")
+	return [field for field in fields if meta.has_field(field)]
+
+
+def _make_profile(vehicle, values):
+	return frappe._dict(
+		name=vehicle,
+		engine_cc=flt(values.engine_cc or values.custom_engine_cc),
+		vehicle_type=get_plan_vehicle_type(values.custom_vehicle_category),
+	)
+
+
+def get_plan_vehicle_type(vehicle_category):
+	"""Map a Vehicle's category to the Insurance Plan `vehicle_type` (Car / Bike / Commercial)"""
+	category = (vehicle_category or "").lower()
+	if "commercial" in category:
+		return "Commercial"
+	if "two wheeler" in category or "bike" in category:
+		return "Bike"
+	return "Car"
+
+
+def clear_eligibility_cache(*vehicle_types):
+	"""
+	Drop the cached index of `vehicle_types` (now and again after commit), the next
+	lookup rebuilds it from the committed plans. Rebuilding instead of patching the
+	cached bands in place means concurrent plan saves cannot overwrite each other.
+	"""
+	for vehicle_type in set(vehicle_types) - {None, ""}:
+		cache.invalidate(CACHE_NAMESPACE, vehicle_type)
+
+
+def _get_bands(vehicle_type):
+	plans = frappe.get_all(
+		"Insurance Plan",
+		filters={"active": 1, "vehicle_type": vehicle_type},
+		fields=["name", "engine_cc_from", "engine_cc_to"],
+	)
+	return [_band(plan.name, plan) for plan in plans]
+
+
+def _band(plan, values):
+	return (cint(values.engine_cc_from), cint(values.engine_cc_to), plan)
+
+
+@frappe.whitelist()
+@frappe.validate_and_sanitize_search_inputs
+def eligible_plan_query(doctype, txt, searchfield, start, page_len, filters):
+	"""Link query for Insurance Plan limited to the plans eligible for `filters.vehicle`"""
+	vehicle = (filters or {}).get("vehicle")
+	if vehicle:
+		profile = get_vehicle_profile(vehicle)
+		plans = get_eligible_plans(profile.vehicle_type, profile.engine_cc)
+	else:
+		plans = frappe.get_all("Insurance Plan", filters={"active": 1}, pluck="name", order_by="name")
+
+	txt = (txt or "").lower()
+	plans = [plan for plan in plans if txt in plan.lower()]
+	return [[plan] for plan in plans[cint(start) : cint(start) + cint(page_len)]]
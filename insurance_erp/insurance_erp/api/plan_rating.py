@@ -0,0 +1,144 @@
+# Copyright (c) 2026, Insurance Solutions Inc and contributors
+# For license information, please see license.txt
+
+"""
+Compiled rating tables for Insurance Plans.
+
+Rating a quote only needs a handful of plan values, so instead of loading the
+full Insurance Plan document on every call the plan is compiled once into an
+immutable `PlanRating` and cached per worker and in Redis, keyed by plan name
+and `modified`. `InsurancePlan.on_update` drops the cached copy.
+"""
+
+from dataclasses import dataclass
+from types import MappingProxyType
+
+import frappe
+from frappe import _
+from frappe.utils import cint, flt
+
+from insurance_erp.insurance_erp import cache
+from insurance_erp.insurance_erp.api.idv_calculator import compile_depreciation_slabs
+
+# Bump the suffix when the payload layout changes so stale Redis copies are never loaded
+CACHE_NAMESPACE = "insurance_plan_rating:v2"
+
+
+@dataclass(frozen=True)
+class AddonRate:
+	addon: str
+	pricing_type: str
+	pricing_value: float
+	mandatory: bool
+	max_claims: int
+
+
+@dataclass(frozen=True)
+class PlanRating:
+	name: str
+	modified: str
+	active: bool
+	vehicle_type: str
+	policy_type: str
+	od_rate_type: str
+	od_rate_value: float
+	min_od_premium: float
+	max_od_premium: float
+	tp_premium_value: float
+	gst_rate: float
+	engine_cc_from: int
+	engine_cc_to: int
+	# {addon name: AddonRate}, read-only
+	addons: MappingProxyType
+	# ((years_without_claim, ncb_percentage), ...) sorted by years
+	ncb_slabs: tuple
+	# Depreciation slabs as parallel boundary arrays sorted by age, see idv_calculator
+	depreciation_from: tuple
+	depreciation_to: tuple
+	depreciation_percent: tuple
+	# ((coverage_type, limit_type, limit_value, deductible), ...) copied onto policy invoices
+	coverage_template: tuple
+
+
+def get_plan_rating(plan):
+	"""Return the compiled `PlanRating` for `plan`, or None if the plan does not exist"""
+	if not plan:
+		return None
+
+	return cache.get_versioned(
+		CACHE_NAMESPACE,
+		plan,
+		get_version=lambda name: frappe.db.get_value("Insurance Plan", name, "modified"),
+		build=_build_payload,
+		load=_load_payload,
+	)
+
+
+def get_plan_rating_or_throw(plan):
+	rating = get_plan_rating(plan)
+	if not rating:
+		frappe.throw(_("Insurance Plan {0} not found").format(plan), frappe.DoesNotExistError)
+	return rating
+
+
+def clear_plan_rating_cache(plan):
+	cache.invalidate(CACHE_NAMESPACE, plan)
+
+
+def _build_payload(plan):
+	"""Compile the plan into a plain, picklable dict (stored in Redis)"""
+	doc = frappe.get_doc("Insurance Plan", plan)
+
+	return {
+		"name": doc.name,
+		"modified": str(doc.modified),
+		"active": bool(cint(doc.active)),
+		"vehicle_type": doc.vehicle_type,
+		"policy_type": doc.policy_type,
+		"od_rate_type": doc.od_rate_type,
+		"od_rate_value": flt(doc.od_rate_value),
+		"min_od_premium": flt(doc.min_od_premium),
+		"max_od_premium": flt(doc.max_od_premium),
+		"tp_premium_value": flt(doc.tp_premium_value),
+		# An empty rate has always meant the standard 18% GST
+		"gst_rate": flt(doc.gst_rate) or 18.0,
+		"engine_cc_from": cint(doc.engine_cc_from),
+		"engine_cc_to": cint(doc.engine_cc_to),
+		"addons": [
+			{
+				"addon": row.addon,
+				"pricing_type": row.pricing_type,
+				"pricing_value": flt(row.pricing_value),
+				"mandatory": bool(cint(row.mandatory)),
+				"max_claims": cint(row.max_claims),
+			}
+			for row in doc.get("plan_addons", [])
+		],
+		"ncb_slabs": sorted(
+			(cint(row.years_without_claim), flt(row.ncb_percentage)) for row in doc.get("ncb_slabs", [])
+		),
+		**compile_depreciation_slabs(doc.get("depreciation_slabs", [])),
+		"coverage_template": _get_coverage_template(doc),
+	}
+
+
+def _get_coverage_template(doc):
+	"""Standard coverages of a policy on this plan: Own Damage (unless TP only) and Third Party"""
+	template = []
+	if doc.policy_type != "Third Party":
+		template.append(("Own Damage", "Percentage of IDV", 100.0, flt(doc.get("deductible_amount"))))
+	# Usually unlimited for TP death/injury, fixed for property
+	template.append(("Third Party Liability", "Unlimited", 0.0, 0.0))
+	return template
+
+
+def _load_payload(payload):
+	# A payload missing any PlanRating field raises KeyError here (or TypeError below) and is rebuilt
+	values = {field: payload[field] for field in PlanRating.__dataclass_fields__}
+	# Later rows win, same as the dict comprehension the calculator used to build
+	values["addons"] = MappingProxyType({row["addon"]: AddonRate(**row) for row in payload["addons"]})
+	values["ncb_slabs"] = tuple(tuple(slab) for slab in payload["ncb_slabs"])
+	for field in ("depreciation_from", "depreciation_to", "depreciation_percent"):
+		values[field] = tuple(payload[field])
+	values["coverage_template"] = tuple(tuple(row) for row in payload["coverage_template"])
+	return PlanRating(**values)
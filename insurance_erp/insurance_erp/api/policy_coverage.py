@@ -0,0 +1,92 @@
+# Copyright (c) 2026, Insurance Solutions Inc and contributors
+# For license information, please see license.txt
+
+"""
+Coverage index for Insurance Policies.
+
+A policy's frozen coverages are compiled once into a read-only
+{coverage_type: CoverageLimit} map and cached per worker and in Redis, keyed
+by policy name. The index is built on first use and dropped whenever the
+policy is saved, so claim intake checks coverage, limits and deductibles with
+a dict lookup instead of reading the coverage rows for every claim.
+
+The index combines the coverages of the policy's Insurance Plan Version with
+the policy's own `coverage_snapshot` rows, which take precedence.
+"""
+
+from dataclasses import dataclass
+from types import MappingProxyType
+
+import frappe
+from frappe.utils import flt
+
+from insurance_erp.insurance_erp import cache
+from insurance_erp.insurance_erp.doctype.insurance_plan_version.insurance_plan_version import (
+	get_plan_version_coverages,
+)
+
+CACHE_NAMESPACE = "insurance_policy_coverage"
+# One entry per policy read, so entries of policies no longer claimed against expire
+CACHE_TTL = 7 * 24 * 60 * 60
+
+
+@dataclass(frozen=True)
+class CoverageLimit:
+	coverage_type: str
+	limit_type: str
+	limit_value: float
+	deductible: float
+
+	def get_limit(self, idv):
+		"""Maximum claimable amount for a vehicle of `idv`, None if unlimited (or no limit is set)"""
+		if not flt(self.limit_value):
+			return None
+		if self.limit_type == "Fixed Amount":
+			return self.limit_value
+		if self.limit_type == "Percentage of IDV":
+			return flt(idv) * self.limit_value / 100
+		return None
+
+
+def get_policy_coverage(policy):
+	"""Read-only {coverage_type: CoverageLimit} for `policy`, None if the policy does not exist"""
+	if not policy:
+		return None
+
+	return cache.get_versioned(
+		CACHE_NAMESPACE,
+		policy,
+		get_version=lambda name: frappe.db.get_value("Insurance Policy", name, "modified"),
+		build=_build_payload,
+		load=_load_payload,
+		ttl=CACHE_TTL,
+	)
+
+
+def clear_policy_coverage_cache(policy):
+	cache.invalidate(CACHE_NAMESPACE, policy)
+
+
+def _build_payload(policy):
+	plan_version = frappe.db.get_value("Insurance Policy", policy, "plan_version")
+	rows = list(get_plan_version_coverages(plan_version)) if plan_version else []
+	rows += frappe.get_all(
+		"Policy Coverage Snapshot",
+		filters={"parent": policy, "parenttype": "Insurance Policy", "parentfield": "coverage_snapshot"},
+		fields=["coverage_type", "limit_type", "limit_value", "deductible"],
+		order_by="idx",
+	)
+	return [
+		{
+			"coverage_type": row.get("coverage_type"),
+			"limit_type": row.get("limit_type"),
+			"limit_value": flt(row.get("limit_value")),
+			"deductible": flt(row.get("deductible")),
+		}
+		for row in rows
+	]
+
+
+def _load_payload(payload):
+	# Later rows win, so policy rows override the plan version's coverages
+	return MappingProxyType({row["coverage_type"]: CoverageLimit(**row) for row in payload})
@@ -1,48 +1,65 @@
+import json
+
 import frappe
+import numpy as np
 from frappe import _
 from frappe.utils import flt
 
+from insurance_erp.insurance_erp.api.plan_eligibility import (
+    get_eligible_plans,
+    get_vehicle_profile,
+    get_vehicle_profiles,
+    is_plan_eligible,
+    validate_plan_eligibility,
+)
+from insurance_erp.insurance_erp.api.plan_rating import get_plan_rating_or_throw
+
+BREAKDOWN_FIELDS = (
+    "od_premium",
+    "od_premium_base",
+    "ncb_discount",
+    "tp_premium",
+    "addon_premium",
+    "total_net_premium",
+    "total_gst",
+    "grand_total_premium",
+)
+
 @frappe.whitelist()
 def calculate_premium(plan, vehicle, idv, addons=None, ncb_percent=0):
     """
     Calculate premium based on Insurance Plan, Vehicle, IDV, and Addons.
     """
     if isinstance(addons, str):
-        import json
         addons = json.loads(addons)
         
     if not plan or not idv:
         return {}
 
-    plan_doc = frappe.get_doc("Insurance Plan", plan)
+    rating = get_plan_rating_or_throw(plan)
     
-    # 1. Validation: Vehicle Engine CC vs Plan Limits
+    # 1. Validation: Vehicle Engine CC and Type vs Plan Limits
     if vehicle:
-        vehicle_doc = frappe.get_doc("Vehicle", vehicle)
-        cc = flt(vehicle_doc.engine_cc)
-        
-        # Only validate if Plan has limits defined
-        if plan_doc.engine_cc_from and cc < plan_doc.engine_cc_from:
-            # We just log/warning here, deciding to hard-block or return error is separate. 
-            # For calculation, we might proceed or return warning.
-            # Let's assume strict plan adherence implies we should warn.
-            pass 
-            
-        if plan_doc.engine_cc_to and cc > plan_doc.engine_cc_to:
-            pass
+        validate_plan_eligibility(rating.name, vehicle)
+
+    return compute_premium(rating, idv, addons, ncb_percent)
 
+def compute_premium(rating, idv, addons=None, ncb_percent=0):
+    """
+    Premium breakdown for a compiled PlanRating. Does not touch the database.
+    """
     # 2. OD Premium
     od_premium = 0.0
-    if plan_doc.od_rate_type == "Percentage":
-        od_premium = flt(idv) * flt(plan_doc.od_rate_value) / 100.0
+    if rating.od_rate_type == "Percentage":
+        od_premium = flt(idv) * rating.od_rate_value / 100.0
     else:
-        od_premium = flt(plan_doc.od_rate_value)
+        od_premium = rating.od_rate_value
         
     # Apply Min/Max Caps
-    if plan_doc.min_od_premium and od_premium < plan_doc.min_od_premium:
-        od_premium = plan_doc.min_od_premium
-    if plan_doc.max_od_premium and plan_doc.max_od_premium > 0 and od_premium > plan_doc.max_od_premium:
-        od_premium = plan_doc.max_od_premium
+    if rating.min_od_premium and od_premium < rating.min_od_premium:
+        od_premium = rating.min_od_premium
+    if rating.max_od_premium and rating.max_od_premium > 0 and od_premium > rating.max_od_premium:
+        od_premium = rating.max_od_premium
         
     # Apply NCB Discount (on OD only)
     ncb_discount_amount = od_premium * flt(ncb_percent) / 100.0
@@ -51,24 +68,21 @@ def calculate_premium(plan, vehicle, idv, addons=None, ncb_percent=0):
         od_premium_after_ncb = 0
     
     # 3. TP Premium
-    tp_premium = flt(plan_doc.tp_premium_value)
+    tp_premium = rating.tp_premium_value
     
     # 4. Add-ons Premium
     addon_premium_total = 0.0
     addon_details = []
     
-    # Map plan addons for quick lookup
-    plan_addon_map = {row.addon: row for row in plan_doc.plan_addons}
-    
     if addons:
         for addon_name in addons:
-            if addon_name in plan_addon_map:
-                row = plan_addon_map[addon_name]
+            if addon_name in rating.addons:
+                row = rating.addons[addon_name]
                 cost = 0.0
                 if row.pricing_type == "Flat":
-                    cost = flt(row.pricing_value)
+                    cost = row.pricing_value
                 elif row.pricing_type == "Percentage of IDV":
-                    cost = flt(idv) * flt(row.pricing_value) / 100.0
+                    cost = flt(idv) * row.pricing_value / 100.0
                 
                 addon_premium_total += cost
                 addon_details.append({
@@ -79,8 +93,7 @@ def calculate_premium(plan, vehicle, idv, addons=None, ncb_percent=0):
     # 5. Totals
     total_net = od_premium_after_ncb + tp_premium + addon_premium_total
     
-    gst_rate = flt(plan_doc.gst_rate) or 18.0
-    total_gst = total_net * gst_rate / 100.0
+    total_gst = total_net * rating.gst_rate / 100.0
     
     grand_total = total_net + total_gst
     
@@ -95,3 +108,170 @@ def calculate_premium(plan, vehicle, idv, addons=None, ncb_percent=0):
         "grand_total_premium": grand_total,
         "addon_details": addon_details
     }
+
+@frappe.whitelist()
+def calculate_premium_batch(rows):
+    """
+    Calculate premiums for many quotes in one call.
+    `rows` is a list (or JSON string) of dicts with plan, vehicle, idv, addons and ncb_percent.
+    Returns the same breakdown dict as `calculate_premium` for every row, in input order.
+    Rows whose vehicle is not eligible for the plan get {"error": message} instead.
+    """
+    if isinstance(rows, str):
+        rows = json.loads(rows)
+
+    results = [{} for row in rows]
+    profiles = get_vehicle_profiles(row.get("vehicle") for row in rows)
+
+    # Group rows by plan so each plan is compiled/fetched once
+    rows_by_plan = {}
+    for idx, row in enumerate(rows):
+        if not row.get("plan") or not row.get("idv"):
+            continue
+
+        vehicle = row.get("vehicle")
+        if vehicle and not (vehicle in profiles and is_plan_eligible(row["plan"], profiles[vehicle])):
+            results[idx] = {"error": _("Insurance Plan {0} is not available for Vehicle {1}").format(row["plan"], vehicle)}
+            continue
+
+        rows_by_plan.setdefault(row["plan"], []).append(idx)
+
+    for plan, indexes in rows_by_plan.items():
+        rating = get_plan_rating_or_throw(plan)
+        addon_lists = []
+        for idx in indexes:
+            addons = rows[idx].get("addons")
+            if isinstance(addons, str):
+                addons = json.loads(addons)
+            addon_lists.append(addons)
+
+        breakdowns = compute_premium_batch(
+            rating,
+            [rows[idx].get("idv") for idx in indexes],
+            addon_lists,
+            [rows[idx].get("ncb_percent") for idx in indexes],
+        )
+        for idx, breakdown in zip(indexes, breakdowns):
+            results[idx] = breakdown
+
+    return results
+
+def compute_premium_batch(rating, idvs, addon_lists, ncb_percents):
+    """
+    Vectorized `compute_premium` for many quotes on the same PlanRating.
+    """
+    idv = np.array([flt(value) for value in idvs], dtype=float)
+    ncb = np.array([flt(value) for value in ncb_percents], dtype=float)
+    size = len(idv)
+
+    # OD Premium with Min/Max Caps
+    if rating.od_rate_type == "Percentage":
+        od_premium = idv * rating.od_rate_value / 100.0
+    else:
+        od_premium = np.full(size, rating.od_rate_value)
+
+    if rating.min_od_premium:
+        od_premium = np.where(od_premium < rating.min_od_premium, rating.min_od_premium, od_premium)
+    if rating.max_od_premium and rating.max_od_premium > 0:
+        od_premium = np.where(od_premium > rating.max_od_premium, rating.max_od_premium, od_premium)
+
+    # NCB Discount (on OD only)
+    ncb_discount = od_premium * ncb / 100.0
+    od_premium_after_ncb = np.maximum(od_premium - ncb_discount, 0.0)
+
+    tp_premium = np.full(size, rating.tp_premium_value)
+
+    # Add-ons: (rows x plan addons) count matrix times per-row unit cost
+    addon_index = {name: col for col, name in enumerate(rating.addons)}
+    flat = np.array([row.pricing_value if row.pricing_type == "Flat" else 0.0 for row in rating.addons.values()])
+    percent = np.array(
+        [row.pricing_value if row.pricing_type == "Percentage of IDV" else 0.0 for row in rating.addons.values()]
+    )
+    unit_cost = flat[None, :] + idv[:, None] * percent[None, :] / 100.0
+
+    counts = np.zeros((size, len(addon_index)))
+    hit_rows, hit_cols = [], []
+    for row_idx, addons in enumerate(addon_lists):
+        for addon_name in addons or []:
+            if addon_name in addon_index:
+                hit_rows.append(row_idx)
+                hit_cols.append(addon_index[addon_name])
+    np.add.at(counts, (np.array(hit_rows, dtype=int), np.array(hit_cols, dtype=int)), 1)
+    addon_premium = (counts * unit_cost).sum(axis=1)
+
+    # Totals
+    total_net = od_premium_after_ncb + tp_premium + addon_premium
+    total_gst = total_net * rating.gst_rate / 100.0
+    grand_total = total_net + total_gst
+
+    columns = zip(
+        od_premium_after_ncb.tolist(),
+        od_premium.tolist(),
+        ncb_discount.tolist(),
+        tp_premium.tolist(),
+        addon_premium.tolist(),
+        total_net.tolist(),
+        total_gst.tolist(),
+        grand_total.tolist(),
+    )
+    unit_cost = unit_cost.tolist()
+
+    results = []
+    for row_idx, values in enumerate(columns):
+        addon_details = [
+            {"addon": addon_name, "premium_amount": unit_cost[row_idx][addon_index[addon_name]]}
+            for addon_name in addon_lists[row_idx] or []
+            if addon_name in addon_index
+        ]
+        results.append(dict(zip(BREAKDOWN_FIELDS, values), addon_details=addon_details))
+
+    return results
+
+@frappe.whitelist()
+def get_quote_matrix(vehicle, idv, ncb_percent=0):
+    """
+    Premium grid for every active plan the vehicle is eligible for.
+    Each plan is rated without optional add-ons, with each optional add-on on its own and with all of them.
+    Add-on premiums are additive, so any other combination can be summed from the grid.
+    """
+    if not vehicle or not idv:
+        return {}
+
+    profile = get_vehicle_profile(vehicle)
+    ratings = [get_plan_rating_or_throw(plan) for plan in get_eligible_plans(profile.vehicle_type, profile.engine_cc)]
+
+    addon_columns = sorted({
+        addon.addon for rating in ratings for addon in rating.addons.values() if not addon.mandatory
+    })
+
+    plans = []
+    for rating in ratings:
+        mandatory = [addon.addon for addon in rating.addons.values() if addon.mandatory]
+        optional = [addon for addon in addon_columns if addon in rating.addons and addon not in mandatory]
+
+        combinations = [mandatory] + [mandatory + [addon] for addon in optional]
+        if len(optional) > 1:
+            combinations.append(mandatory + optional)
+
+        breakdowns = compute_premium_batch(
+            rating, [idv] * len(combinations), combinations, [ncb_percent] * len(combinations)
+        )
+
+        plans.append({
+            "plan": rating.name,
+            "policy_type": rating.policy_type,
+            "mandatory_addons": mandatory,
+            "base": breakdowns[0],
+            "with_addon": {addon: breakdown for addon, breakdown in zip(optional, breakdowns[1:])},
+            "with_all_addons": breakdowns[-1],
+        })
+
+    return {
+        "vehicle": vehicle,
+        "vehicle_type": profile.vehicle_type,
+        "engine_cc": profile.engine_cc,
+        "idv": flt(idv),
+        "ncb_percent": flt(ncb_percent),
+        "addons": addon_columns,
+        "plans": plans,
+    }
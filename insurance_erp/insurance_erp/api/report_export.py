@@ -0,0 +1,177 @@
+# Copyright (c) 2026, Insurance Solutions Inc and contributors
+# For license information, please see license.txt
+
+"""
+Streaming CSV / XLSX export for script reports.
+
+The report's own export goes through the report view, which builds the whole
+result (and then the whole file) in memory. Reports with large results expose a
+whitelisted export method that passes a row iterator (typically keyset-paginated
+chunks) to `build_response` instead. Rows are written to a temporary file as
+they are read (csv, or openpyxl in write-only mode), which is then streamed to
+the client from disk. The file is written before the response is returned, as
+the database connection is closed once the request ends.
+
+Exports too large for a request run in a background job with `export_to_file`,
+which writes the rows straight into a private File attached to the requesting
+user and notifies them when it is ready, or when the export failed.
+"""
+
+import csv
+import os
+import tempfile
+
+import frappe
+from frappe import _
+from werkzeug.wrappers import Response
+from werkzeug.wsgi import wrap_file
+
+FILE_FORMATS = ("CSV", "Excel")
+
+CONTENT_TYPES = {
+	"CSV": "text/csv; charset=utf-8",
+	"Excel": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+
+def check_report_permission(report_name):
+	if not frappe.get_cached_doc("Report", report_name).is_permitted():
+		frappe.throw(_("You are not allowed to export {0}").format(report_name), frappe.PermissionError)
+
+
+def get_file_extension(file_format):
+	validate_file_format(file_format)
+	return "csv" if file_format == "CSV" else "xlsx"
+
+
+def validate_file_format(file_format):
+	if file_format not in FILE_FORMATS:
+		frappe.throw(_("Export format must be one of {0}").format(", ".join(FILE_FORMATS)))
+
+
+def build_response(filename, columns, rows, file_format="CSV"):
+	"""Download response for `rows` (an iterable of dicts keyed by column fieldname)"""
+	filename = f"{filename}.{get_file_extension(file_format)}"
+	path = write_to_tempfile(columns, rows, file_format, filename)
+
+	return Response(
+		iter_file(path),
+		headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+		content_type=CONTENT_TYPES[file_format],
+		direct_passthrough=True,
+	)
+
+
+def export_to_file(report_name, filename, columns, rows, file_format="CSV", user=None):
+	"""
+	Write `rows` to a new private File attached to `user` (so only they and System Managers
+	can read it), then notify them (Notification Log and a realtime "insurance_report_export_ready"
+	event). Returns the File.
+
+	If the export fails, the transaction is rolled back, the error is logged and `user` is told
+	the export failed instead; None is returned. The caller commits in both cases.
+	"""
+	filename = f"{filename}-{frappe.generate_hash(length=8)}.{get_file_extension(file_format)}"
+	path = frappe.get_site_path("private", "files", filename)
+	try:
+		write_file(path, columns, rows, file_format, report_name)
+		file = frappe.get_doc({
+			"doctype": "File",
+			"file_name": filename,
+			"file_url": f"/private/files/{filename}",
+			"file_size": os.path.getsize(path),
+			"is_private": 1,
+			"attached_to_doctype": "User" if user else None,
+			"attached_to_name": user,
+		}).insert(ignore_permissions=True)
+	except Exception:
+		frappe.db.rollback()
+		if os.path.exists(path):
+			os.remove(path)
+		frappe.log_error(title=_("{0} export failed").format(report_name))
+		if user:
+			notify_export_failed(report_name, user)
+		return None
+
+	if user:
+		notify_export_ready(report_name, file, user)
+	return file
+
+
+def notify_export_ready(report_name, file, user):
+	subject = _("Your {0} export is ready: {1}").format(report_name, file.file_name)
+	frappe.get_doc({
+		"doctype": "Notification Log",
+		"for_user": user,
+		"type": "Alert",
+		"subject": subject,
+		"document_type": "File",
+		"document_name": file.name,
+	}).insert(ignore_permissions=True)
+	frappe.publish_realtime(
+		"insurance_report_export_ready",
+		{"report": report_name, "file_url": file.file_url, "file_name": file.file_name},
+		user=user,
+		after_commit=True,
+	)
+
+
+def notify_export_failed(report_name, user):
+	frappe.get_doc({
+		"doctype": "Notification Log",
+		"for_user": user,
+		"type": "Alert",
+		"subject": _("Your {0} export failed. Please try again or contact your System Manager.").format(report_name),
+	}).insert(ignore_permissions=True)
+	frappe.publish_realtime(
+		"insurance_report_export_failed",
+		{"report": report_name},
+		user=user,
+		after_commit=True,
+	)
+
+
+def write_file(path, columns, rows, file_format="CSV", sheet_title=None):
+	"""Write `rows` to `path` as CSV or XLSX without keeping them in memory"""
+	if file_format == "CSV":
+		with open(path, "w", newline="", encoding="utf-8") as file:
+			writer = csv.writer(file)
+			writer.writerow([column["label"] for column in columns])
+			for row in rows:
+				writer.writerow(get_row_values(columns, row))
+	else:
+		write_xlsx(path, columns, rows, sheet_title)
+
+
+def write_xlsx(path, columns, rows, sheet_title=None):
+	"""Write `rows` to an XLSX file at `path` without keeping them in memory"""
+	from openpyxl import Workbook
+
+	workbook = Workbook(write_only=True)
+	sheet = workbook.create_sheet((sheet_title or "Sheet1")[:31])
+	sheet.append([column["label"] for column in columns])
+	for row in rows:
+		sheet.append(get_row_values(columns, row))
+	workbook.save(path)
+
+
+def write_to_tempfile(columns, rows, file_format, filename):
+	fd, path = tempfile.mkstemp(suffix=os.path.splitext(filename)[1])
+	os.close(fd)
+	try:
+		write_file(path, columns, rows, file_format, os.path.splitext(filename)[0])
+	except Exception:
+		os.remove(path)
+		raise
+	return path
+
+
+def iter_file(path):
+	"""Stream a temporary file from disk and delete it afterwards"""
+	file = open(path, "rb")
+	os.remove(path)  # the open handle keeps the data readable until it is closed
+	return wrap_file(frappe.local.request.environ, file)
+
+
+def get_row_values(columns, row):
+	return [row.get(column["fieldname"]) for column in columns]
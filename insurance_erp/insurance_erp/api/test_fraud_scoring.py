@@ -0,0 +1,37 @@
+# Copyright (c) 2026, Insurance Solutions Inc and Contributors
+# See license.txt
+
+import numpy as np
+from frappe.tests.utils import FrappeTestCase
+
+from insurance_erp.insurance_erp.api.fraud_scoring import FRAUD_RULES, compute_scores, get_severity
+
+
+def make_features(**values):
+	features = {
+		"name": ["CLM-1", "CLM-2", "CLM-3"],
+		"days_from_policy_start": [400, 0, np.nan],
+		"claim_to_idv_percent": [10, 100, 75],
+		"prior_claims": [0, 5, 1],
+		"reporting_delay_days": [1, 60, 18.5],
+	}
+	features.update(values)
+	return {key: value if key == "name" else np.array(value, dtype=float) for key, value in features.items()}
+
+
+class TestFraudScoring(FrappeTestCase):
+	def test_scores(self):
+		scores, rule_scores = compute_scores(make_features())
+
+		# Clean claim, every rule at its suspicious end, and a claim partly across the ranges
+		self.assertEqual(scores[0], 0)
+		self.assertEqual(scores[1], sum(rule.weight for rule in FRAUD_RULES))
+		self.assertAlmostEqual(scores[2], 30 * 0.5 + 25 / 3 + 15 * 0.5, places=2)
+
+		# A missing date does not fire its rule
+		self.assertEqual(rule_scores["Early Claim"][2], 0)
+
+	def test_severity(self):
+		self.assertEqual(get_severity(1), "High")
+		self.assertEqual(get_severity(0.5), "Medium")
+		self.assertEqual(get_severity(0.1), "Low")
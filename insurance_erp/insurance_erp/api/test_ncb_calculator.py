@@ -0,0 +1,22 @@
+# Copyright (c) 2026, Insurance Solutions Inc and Contributors
+# See license.txt
+
+from frappe.tests.utils import FrappeTestCase
+
+from insurance_erp.insurance_erp.api.ncb_calculator import calculate_ncb_bulk, get_ncb_percent
+from insurance_erp.insurance_erp.api.test_premium_calculator import make_rating
+
+
+class TestNCBCalculator(FrappeTestCase):
+	def test_bulk_matches_scalar(self):
+		rating = make_rating()
+		years = [0, 1, 2, 3, 4, 10, 1.5]
+		expected = [0.0, 20.0, 25.0, 35.0, 35.0, 35.0, 20.0]
+
+		self.assertEqual([get_ncb_percent(rating, value) for value in years], expected)
+		self.assertEqual(calculate_ncb_bulk(rating, years).tolist(), expected)
+
+	def test_plan_without_slabs(self):
+		rating = make_rating(ncb_slabs=())
+		self.assertEqual(get_ncb_percent(rating, 5), 0.0)
+		self.assertEqual(calculate_ncb_bulk(rating, [0, 5]).tolist(), [0.0, 0.0])
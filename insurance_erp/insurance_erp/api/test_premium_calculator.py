@@ -0,0 +1,134 @@
+# Copyright (c) 2026, Insurance Solutions Inc and Contributors
+# See license.txt
+
+import json
+from types import MappingProxyType
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from insurance_erp.insurance_erp.api.plan_eligibility import is_plan_eligible
+from insurance_erp.insurance_erp.api.plan_rating import AddonRate, PlanRating, _load_payload
+from insurance_erp.insurance_erp.api.premium_calculator import (
+	BREAKDOWN_FIELDS,
+	calculate_premium,
+	calculate_premium_batch,
+	compute_premium,
+	compute_premium_batch,
+)
+
+
+def make_rating(name="_Test Plan", **values):
+	rating = {
+		"name": name,
+		"modified": "2026-01-01 00:00:00",
+		"active": True,
+		"vehicle_type": "Car",
+		"policy_type": "Comprehensive",
+		"od_rate_type": "Percentage",
+		"od_rate_value": 2.5,
+		"min_od_premium": 3000.0,
+		"max_od_premium": 40000.0,
+		"tp_premium_value": 2094.0,
+		"gst_rate": 18.0,
+		"engine_cc_from": 0,
+		"engine_cc_to": 0,
+		"addons": MappingProxyType(
+			{
+				"Zero Depreciation": AddonRate("Zero Depreciation", "Percentage of IDV", 0.4, False, 2),
+				"Roadside Assistance": AddonRate("Roadside Assistance", "Flat", 499.0, False, 0),
+				"Engine Protect": AddonRate("Engine Protect", "Percentage of IDV", 0.15, True, 1),
+			}
+		),
+		"ncb_slabs": ((1, 20.0), (2, 25.0), (3, 35.0)),
+		"depreciation_from": (),
+		"depreciation_to": (),
+		"depreciation_percent": (),
+		"coverage_template": (),
+	}
+	rating.update(values)
+	return PlanRating(**rating)
+
+
+QUOTES = [
+	# idv, addons, ncb_percent
+	(500000, [], 0),
+	(500000, ["Zero Depreciation", "Roadside Assistance"], 20),
+	(50000, ["Engine Protect"], 0),  # below min OD cap
+	(5000000, ["Zero Depreciation"], 50),  # above max OD cap
+	(750000, ["Roadside Assistance", "Roadside Assistance"], 35),  # duplicate addon
+	(750000, ["Not In Plan", "Engine Protect"], 25),  # unknown addon is ignored
+	(320000.75, None, "45"),
+]
+
+
+class TestPremiumCalculator(FrappeTestCase):
+	def assertBreakdownEqual(self, expected, actual):
+		for field in BREAKDOWN_FIELDS:
+			self.assertAlmostEqual(expected[field], actual[field], places=6, msg=field)
+
+		self.assertEqual(len(expected["addon_details"]), len(actual["addon_details"]))
+		for expected_addon, actual_addon in zip(expected["addon_details"], actual["addon_details"]):
+			self.assertEqual(expected_addon["addon"], actual_addon["addon"])
+			self.assertAlmostEqual(expected_addon["premium_amount"], actual_addon["premium_amount"], places=6)
+
+	def test_batch_matches_scalar(self):
+		for rating in (make_rating(), make_rating(od_rate_type="Fixed", od_rate_value=4500.0, max_od_premium=0)):
+			results = compute_premium_batch(
+				rating,
+				[quote[0] for quote in QUOTES],
+				[quote[1] for quote in QUOTES],
+				[quote[2] for quote in QUOTES],
+			)
+
+			self.assertEqual(len(results), len(QUOTES))
+			for (idv, addons, ncb_percent), result in zip(QUOTES, results):
+				self.assertBreakdownEqual(compute_premium(rating, idv, addons, ncb_percent), result)
+
+	def test_batch_endpoint_matches_scalar_endpoint(self):
+		ratings = {
+			"_Test Plan": make_rating(),
+			"_Test Fixed Plan": make_rating("_Test Fixed Plan", od_rate_type="Fixed", od_rate_value=4500.0),
+		}
+		rows = [
+			{"plan": plan, "vehicle": None, "idv": idv, "addons": addons, "ncb_percent": ncb_percent}
+			for plan in ratings
+			for idv, addons, ncb_percent in QUOTES
+		]
+		rows.append({"plan": "_Test Plan", "vehicle": None, "idv": 0})
+
+		with patch(
+			"insurance_erp.insurance_erp.api.premium_calculator.get_plan_rating_or_throw",
+			side_effect=ratings.get,
+		):
+			results = calculate_premium_batch(json.dumps(rows))
+
+			self.assertEqual(len(results), len(rows))
+			self.assertEqual(results[-1], {})
+			for row, result in zip(rows[:-1], results):
+				expected = calculate_premium(
+					row["plan"], row["vehicle"], row["idv"], row["addons"], row["ncb_percent"]
+				)
+				self.assertBreakdownEqual(expected, result)
+
+	def test_outdated_rating_payload_is_rejected(self):
+		rating = make_rating()
+		payload = {
+			**rating.__dict__,
+			"addons": [addon.__dict__ for addon in rating.addons.values()],
+		}
+		self.assertEqual(_load_payload(payload), rating)
+
+		# Cached before depreciation slabs were compiled: rebuilt by cache.get_versioned
+		for field in ("depreciation_from", "depreciation_to", "depreciation_percent"):
+			payload.pop(field)
+		self.assertRaises(KeyError, _load_payload, payload)
+
+	def test_plan_eligibility_ignores_active_flag(self):
+		rating = make_rating(active=False, engine_cc_from=800, engine_cc_to=1500)
+		with patch("insurance_erp.insurance_erp.api.plan_eligibility.get_plan_rating", return_value=rating):
+			# Existing documents on a deactivated plan still validate
+			self.assertTrue(is_plan_eligible(rating.name, frappe._dict(vehicle_type="Car", engine_cc=1500)))
+			self.assertFalse(is_plan_eligible(rating.name, frappe._dict(vehicle_type="Car", engine_cc=1600)))
+			self.assertFalse(is_plan_eligible(rating.name, frappe._dict(vehicle_type="Bike", engine_cc=1000)))
@@ -0,0 +1,78 @@
+# Copyright (c) 2026, Insurance Solutions Inc and contributors
+# For license information, please see license.txt
+
+"""
+Two level (worker memory + Redis) cache for compiled, read-only structures.
+
+Entries are stored under a namespace and key together with a version token
+(usually the source document's `modified`). Every key has two Redis keys of its
+own: its current version, and its payload stored with the version it was built
+for. A save on one worker drops both, which invalidates the copies held in
+memory by all the others, and namespaces with many keys can give them a TTL.
+"""
+
+import frappe
+
+# {(site, namespace, key): (version, value)}
+_worker_cache = {}
+
+
+def get_versioned(namespace, key, get_version, build, load=None, ttl=None):
+	"""Return the cached value for `key`, building it on a miss.
+
+	:param get_version: callable(key) returning the current version token from the database.
+	:param build: callable(key) returning a picklable payload to store in Redis.
+	:param load: optional callable(payload) turning the payload into the in-memory value.
+		Payloads it rejects with a KeyError or TypeError (an outdated layout) are rebuilt.
+	:param ttl: optional seconds after which the key's version and payload expire from Redis.
+	"""
+	cache = frappe.cache()
+	version = cache.get_value(_version_key(namespace, key))
+	if version is None:
+		version = get_version(key)
+		if version is None:
+			return None
+		version = str(version)
+		cache.set_value(_version_key(namespace, key), version, expires_in_sec=ttl)
+
+	local_key = (frappe.local.site, namespace, key)
+	hit = _worker_cache.get(local_key)
+	if hit and hit[0] == version:
+		return hit[1]
+
+	payload = None
+	stored = cache.get_value(_payload_key(namespace, key))
+	if stored and stored[0] == version:
+		payload = stored[1]
+		try:
+			value = load(payload) if load else payload
+		except (KeyError, TypeError):
+			# Stored by code using an older payload layout (namespace not bumped), build it again
+			payload = None
+
+	if payload is None:
+		payload = build(key)
+		cache.set_value(_payload_key(namespace, key), (version, payload), expires_in_sec=ttl)
+		value = load(payload) if load else payload
+
+	_worker_cache[local_key] = (version, value)
+	return value
+
+
+def invalidate(namespace, key):
+	"""Drop `key` from Redis and from this worker, now and again after commit."""
+	_invalidate(namespace, key)
+	frappe.db.after_commit.add(lambda: _invalidate(namespace, key))
+
+
+def _invalidate(namespace, key):
+	frappe.cache().delete_value([_version_key(namespace, key), _payload_key(namespace, key)])
+	_worker_cache.pop((frappe.local.site, namespace, key), None)
+
+
+def _version_key(namespace, key):
+	return f"{namespace}:version:{key}"
+
+
+def _payload_key(namespace, key):
+	return f"{namespace}:payload:{key}"
@@ -3,12 +3,31 @@
 
 frappe.ui.form.on('Insurance Claim', {
     refresh: function (frm) {
+        if (!frm.is_new() && !['Rejected', 'Settled'].includes(frm.doc.claim_status)) {
+            frm.add_custom_button(__('Score Fraud Risk'), function () {
+                frappe.call({
+                    method: "insurance_erp.insurance_erp.api.fraud_scoring.score_claim",
+                    args: {
+                        claim: frm.doc.name
+                    },
+                    callback: function () {
+                        frm.reload_doc();
+                    }
+                });
+            }, __('Actions'));
+        }
+
         if (frm.doc.claim_status === 'Approved' && !frm.doc.settlement_journal_entry) {
             frm.add_custom_button(__('Create Settlement JE'), function () {
                 frappe.call({
                     method: "insurance_erp.insurance_erp.doctype.insurance_claim.insurance_claim.create_settlement_je",
                     args: {
                         claim_name: frm.doc.name
+                    },
+                    callback: function (r) {
+                        if (r.message) {
+                            frappe.set_route("Form", "Journal Entry", r.message);
+                        }
                     }
                 });
             }, __('Actions'));
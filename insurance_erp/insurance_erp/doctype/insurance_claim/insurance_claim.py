@@ -4,9 +4,25 @@
 import frappe
 from frappe import _
 from frappe.model.document import Document
-from frappe.utils import getdate, flt
+from frappe.utils import getdate, flt, cint, nowdate
 import json
 
+from insurance_erp.insurance_erp import identity_map, notifications
+from insurance_erp.insurance_erp.api.plan_rating import get_plan_rating
+from insurance_erp.insurance_erp.api.policy_coverage import get_policy_coverage
+from insurance_erp.insurance_erp.doctype.insurance_claim_counter.insurance_claim_counter import (
+	apply_claim_delta,
+	get_claim_contribution,
+	get_counter,
+)
+from insurance_erp.insurance_erp.doctype.insurance_system_settings.insurance_system_settings import get_insurance_settings
+
+# Policy columns read by the validate chain, fetched together once per request
+POLICY_FIELDS = ["status", "policy_start_date", "policy_end_date", "vehicle_idv"]
+
+# Claim fields the fraud score is computed from, see api/fraud_scoring.py
+FRAUD_SCORING_FIELDS = ["policy", "vehicle", "customer", "date_of_loss", "claim_registration_date", "claim_amount"]
+
 class InsuranceClaim(Document):
 	def validate(self):
 		"""Validate claim details before submission"""
@@ -15,6 +31,8 @@ class InsuranceClaim(Document):
 		self.validate_dates()
 		self.validate_coverage()
 		self.validate_limits()
+		self.validate_claim_counters()
+		self.reset_fraud_score()
 		
 		if self.docstatus == 1:
 			self.validate_settlement_data()
@@ -35,13 +53,13 @@ class InsuranceClaim(Document):
 
 	def validate_policy_status(self):
 		"""Ensure claim is only filed against an Active policy"""
-		policy = frappe.get_doc("Insurance Policy", self.policy)
+		policy = self.get_policy()
 		if policy.status != "Active":
 			frappe.throw(_("Claims can only be filed against Active policies. Current policy status: {0}").format(policy.status))
 
 	def validate_dates(self):
 		"""Ensure claim dates are valid w.r.t policy period"""
-		policy = frappe.get_doc("Insurance Policy", self.policy)
+		policy = self.get_policy()
 		
 		# Loss date within policy period
 		if getdate(self.date_of_loss) < getdate(policy.policy_start_date) or \
@@ -55,24 +73,246 @@ class InsuranceClaim(Document):
 			frappe.throw(_("Loss Date cannot be after Claim Date"))
 
 	def validate_coverage(self):
-		"""Verify that the nature of loss is covered by the policy snapshot"""
-		policy = frappe.get_doc("Insurance Policy", self.policy)
-		
-		# Check coverage_snapshot table on policy
-		found = False
-		for row in policy.get("coverage_snapshot", []):
-			if row.coverage_type == self.nature_of_loss:
-				found = True
-				break
-		
-		if not found:
-			frappe.msgprint(_("Warning: Nature of Loss '{0}' might not be explicitly listed in policy coverage snapshot.").format(self.nature_of_loss))
+		"""Verify the loss is covered by the policy, within its limit, and apply its deductible"""
+		coverages = get_policy_coverage(self.policy) or {}
+		coverage = coverages.get(self.nature_of_loss) or coverages.get(self.coverage_type)
+
+		if not coverage:
+			if not coverages:
+				# Policies issued without a coverage snapshot cannot be checked
+				frappe.msgprint(_("Warning: Policy {0} has no coverage snapshot, coverage for '{1}' could not be verified.").format(
+					self.policy, self.nature_of_loss
+				))
+				return
+			frappe.throw(_("Nature of Loss '{0}' is not covered by Policy {1}").format(
+				self.nature_of_loss, frappe.bold(self.policy)
+			), title=_("Not Covered"))
+
+		limit = coverage.get_limit(self.get_policy().vehicle_idv)
+		if limit is not None and flt(self.claim_amount) > limit:
+			frappe.throw(_("Claimed amount ({0}) exceeds the {1} coverage limit of {2}").format(
+				self.claim_amount, coverage.coverage_type, limit
+			))
+
+		if not self.deductible_applied:
+			self.deductible_applied = coverage.deductible
 
 	def validate_limits(self):
 		"""Ensure claimed amount doesn't exceed IDV or specific plan limits"""
-		policy = frappe.get_doc("Insurance Policy", self.policy)
+		policy = self.get_policy()
 		
 		if flt(self.claim_amount) > flt(policy.vehicle_idv):
 			frappe.throw(_("Claimed amount ({0}) exceeds the Insured Declared Value (IDV) of {1}").format(
 				self.claim_amount, policy.vehicle_idv
 			))
+
+	def validate_claim_counters(self):
+		"""Enforce per-policy and per-add-on claim limits against the materialized claim counters"""
+		after = get_claim_contribution(self, get_claimed_addon(self))
+		if not after:
+			return
+
+		previous = self.get_doc_before_save()
+		before = get_claim_contribution(previous, get_claimed_addon(previous)) if previous else {}
+
+		for (policy, addon), (count, claimed, approved) in after.items():
+			old_count, old_claimed, old_approved = before.get((policy, addon), (0, 0.0, 0.0))
+			# Only a save that adds to the totals is checked, so claims on a policy that is already
+			# over a since tightened limit can still be approved or edited
+			adds_count, adds_claimed = count > old_count, claimed > old_claimed
+			if not (adds_count or adds_claimed):
+				continue
+
+			# Locked until commit, so concurrent claims on the policy cannot both pass the limit
+			counter = get_counter(policy, addon, for_update=True)
+			total_count = cint(counter.claim_count) - old_count + count
+			total_claimed = flt(counter.claimed_amount) - old_claimed + claimed
+
+			if addon:
+				max_claims = get_plan_rating(self.insurance_plan).addons[addon].max_claims
+				if adds_count and max_claims and total_count > max_claims:
+					frappe.throw(_("Add-on {0} allows at most {1} claim(s) per policy").format(
+						frappe.bold(addon), max_claims
+					), title=_("Claim Limit Exceeded"))
+				continue
+
+			settings = get_insurance_settings()
+			max_claims = settings.max_claims_per_policy
+			if adds_count and max_claims and total_count > max_claims:
+				frappe.throw(_("Policy {0} allows at most {1} claim(s)").format(
+					frappe.bold(policy), max_claims
+				), title=_("Claim Limit Exceeded"))
+
+			max_percent = settings.max_claim_percent_of_idv
+			if adds_claimed and max_percent:
+				limit = flt(self.get_policy().vehicle_idv) * max_percent / 100
+				if total_claimed > limit:
+					frappe.throw(_("Total claimed amount {0} on Policy {1} would exceed {2}% of IDV ({3})").format(
+						total_claimed, frappe.bold(policy), max_percent, limit
+					), title=_("Claim Limit Exceeded"))
+
+	def reset_fraud_score(self):
+		"""Queue new claims, and claims whose scoring inputs changed, for fraud scoring"""
+		if any(self.has_value_changed(field) for field in FRAUD_SCORING_FIELDS):
+			self.fraud_scored_on = None
+
+	def on_update(self):
+		self.update_claim_counters()
+		self.notify_status_change()
+
+	def on_trash(self):
+		apply_claim_delta(get_claim_contribution(self, get_claimed_addon(self)), {})
+
+	def update_claim_counters(self):
+		"""Apply this save's change in count / claimed / approved amounts to the claim counters"""
+		previous = self.get_doc_before_save()
+		apply_claim_delta(
+			get_claim_contribution(previous, get_claimed_addon(previous)) if previous else {},
+			get_claim_contribution(self, get_claimed_addon(self)),
+		)
+
+	def notify_status_change(self):
+		previous = self.get_doc_before_save()
+		if previous and previous.claim_status != self.claim_status:
+			notifications.queue_notifications(notifications.CLAIM_STATUS_CHANGED, self.doctype, [self.name])
+
+	def get_policy(self):
+		"""Policy values needed for validation, read once per request"""
+		return identity_map.get_values("Insurance Policy", self.policy, POLICY_FIELDS)
+
+
+def on_doctype_update():
+	# Last claim of a vehicle (NCB claims history)
+	frappe.db.add_index("Insurance Claim", ["vehicle", "date_of_loss"])
+	# Claims Summary report, filtered by status and paginated by registration date
+	frappe.db.add_index("Insurance Claim", ["claim_status", "claim_registration_date"])
+	# Claim frequency per customer (fraud scoring) and the Fraud Detection report's order
+	frappe.db.add_index("Insurance Claim", ["customer", "date_of_loss"])
+	frappe.db.add_index("Insurance Claim", ["fraud_score"])
+
+
+def get_claimed_addon(claim):
+	"""The plan add-on a claim is filed under (its nature of loss), if any"""
+	if not claim or not claim.nature_of_loss:
+		return None
+
+	rating = get_plan_rating(claim.insurance_plan)
+	if rating and claim.nature_of_loss in rating.addons:
+		return claim.nature_of_loss
+
+
+# Claims paid by one payout Journal Entry at most
+SETTLEMENT_BATCH_SIZE = 500
+
+
+@frappe.whitelist()
+def create_settlement_je(claim_name):
+	"""Draft settlement Journal Entry for a single Approved claim"""
+	return create_settlement_batch([claim_name])
+
+
+@frappe.whitelist()
+def create_settlement_batch(claim_names=None, posting_date=None):
+	"""
+	Draft one Journal Entry paying `claim_names`, or every Approved claim that is not
+	settled or part of another Journal Entry yet (up to `SETTLEMENT_BATCH_SIZE`).
+
+	Each claim gets a debit line on the claim expense account linking it (the custom
+	`insurance_claim` field, as `reference_type` only offers accounting doctypes), the payout
+	account is credited with the total. Submitting the Journal Entry marks all of its
+	claims Settled in one UPDATE (`events.settle_claims`).
+	"""
+	frappe.has_permission("Journal Entry", "create", throw=True)
+	if isinstance(claim_names, str):
+		claim_names = json.loads(claim_names)
+
+	claims = get_settleable_claims(claim_names)
+	if claim_names:
+		missing = set(claim_names) - {claim.name for claim in claims}
+		if missing:
+			frappe.throw(
+				_("Claims {0} are not Approved, already settled or part of another Journal Entry").format(
+					", ".join(sorted(missing))
+				)
+			)
+	if not claims:
+		frappe.throw(_("There are no Approved claims to settle"))
+
+	company, expense_account, payout_account = get_settlement_accounts()
+	accounts = []
+	total = 0
+	for claim in claims:
+		amount = get_settlement_amount(claim)
+		if amount <= 0:
+			frappe.throw(_("Claim {0} has no amount to settle").format(claim.name))
+
+		total += amount
+		accounts.append({
+			"account": expense_account,
+			"debit_in_account_currency": amount,
+			"insurance_claim": claim.name,
+			"user_remark": _("Settlement of claim {0}").format(claim.name),
+		})
+	accounts.append({"account": payout_account, "credit_in_account_currency": total})
+
+	je = frappe.get_doc({
+		"doctype": "Journal Entry",
+		"voucher_type": "Journal Entry",
+		"company": company,
+		"posting_date": posting_date or nowdate(),
+		"user_remark": _("Settlement of {0} insurance claims").format(len(claims)),
+		"accounts": accounts,
+	})
+	je.insert()
+	return je.name
+
+
+def get_settleable_claims(claim_names=None):
+	"""Approved claims with no settlement Journal Entry, submitted or draft, in one query"""
+	conditions = ""
+	values = {"limit": SETTLEMENT_BATCH_SIZE}
+	if claim_names:
+		conditions = "AND claim.name IN %(claim_names)s"
+		values.update(claim_names=list(claim_names), limit=len(claim_names))
+
+	return frappe.db.sql(f"""
+		SELECT claim.name, claim.approved_amount, claim.settlement_amount, claim.deductible_applied
+		FROM `tabInsurance Claim` claim
+		WHERE claim.claim_status = 'Approved'
+			AND IFNULL(claim.settlement_journal_entry, '') = ''
+			{conditions}
+			AND NOT EXISTS (
+				SELECT 1 FROM `tabJournal Entry Account` jea
+				WHERE jea.insurance_claim = claim.name
+					AND jea.docstatus < 2
+			)
+		ORDER BY claim.name
+		LIMIT %(limit)s
+	""", values, as_dict=True)
+
+
+def get_settlement_amount(claim):
+	"""Amount paid out for a claim: its settlement amount, else approved amount less deductible"""
+	return flt(claim.settlement_amount) or flt(claim.approved_amount) - flt(claim.deductible_applied)
+
+
+def get_settlement_accounts():
+	"""(company, claim expense account, payout account) from Insurance System Settings"""
+	settings = get_insurance_settings()
+	company = (
+		settings.settlement_company
+		or frappe.defaults.get_user_default("Company")
+		or frappe.db.get_single_value("Global Defaults", "default_company")
+	)
+	if not settings.claim_expense_account:
+		frappe.throw(_("Set the Claim Expense Account in Insurance System Settings"))
+
+	payout_account = settings.claim_payout_account
+	if not payout_account:
+		payout_account = frappe.db.get_value("Account", {"account_type": "Bank", "company": company, "is_group": 0})
+	if not payout_account:
+		payout_account = frappe.db.get_value("Account", {"account_type": "Cash", "company": company, "is_group": 0})
+	if not payout_account:
+		frappe.throw(_("Set the Claim Payout Account in Insurance System Settings"))
+
+	return company, settings.claim_expense_account, payout_account
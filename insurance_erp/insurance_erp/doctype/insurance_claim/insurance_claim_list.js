@@ -1,18 +1,18 @@
 frappe.listview_settings['Insurance Claim'] = {
-    add_fields: ["status", "customer", "vehicle"],
+    add_fields: ["claim_status", "customer", "vehicle"],
     get_indicator: function (doc) {
-        if (doc.status === "Reported") {
-            return [__("Reported"), "blue", "status,=,Reported"];
-        } else if (doc.status === "Survey Assigned") {
-            return [__("Survey Assigned"), "orange", "status,=,Survey Assigned"];
-        } else if (doc.status === "Survey Completed") {
-            return [__("Survey Completed"), "green", "status,=,Survey Completed"];
-        } else if (doc.status === "Approved") {
-            return [__("Approved"), "green", "status,=,Approved"];
-        } else if (doc.status === "Rejected") {
-            return [__("Rejected"), "red", "status,=,Rejected"];
-        } else if (doc.status === "Settled") {
-            return [__("Settled"), "blue", "status,=,Settled"];
+        if (doc.claim_status === "Reported") {
+            return [__("Reported"), "blue", "claim_status,=,Reported"];
+        } else if (doc.claim_status === "Survey Assigned") {
+            return [__("Survey Assigned"), "orange", "claim_status,=,Survey Assigned"];
+        } else if (doc.claim_status === "Survey Completed") {
+            return [__("Survey Completed"), "green", "claim_status,=,Survey Completed"];
+        } else if (doc.claim_status === "Approved") {
+            return [__("Approved"), "green", "claim_status,=,Approved"];
+        } else if (doc.claim_status === "Rejected") {
+            return [__("Rejected"), "red", "claim_status,=,Rejected"];
+        } else if (doc.claim_status === "Settled") {
+            return [__("Settled"), "blue", "claim_status,=,Settled"];
         }
     },
     onload: function (listview) {
@@ -23,7 +23,7 @@ frappe.listview_settings['Insurance Claim'] = {
             }
 
             // Filter for only 'Reported' claims
-            let valid_claims = selected_claims.filter(d => d.status === 'Reported').map(d => d.name);
+            let valid_claims = selected_claims.filter(d => d.claim_status === 'Reported').map(d => d.name);
             if (valid_claims.length === 0) {
                 frappe.throw(__("Only claims in 'Reported' status can be moved to Survey"));
             }
@@ -63,11 +63,20 @@ frappe.listview_settings['Insurance Claim'] = {
                         },
                         callback: function (r) {
                             if (r.message) {
-                                let success_count = r.message.filter(res => res.status === "Success").length;
-                                frappe.show_alert({
-                                    message: __("{0} Claims successfully moved to Survey").format(success_count),
-                                    indicator: "green"
-                                });
+                                let queued_count = r.message.filter(res => res.status === "Queued").length;
+                                if (queued_count) {
+                                    frappe.show_alert({
+                                        message: __("Assigning {0} claims in the background", [queued_count]),
+                                        indicator: "blue"
+                                    });
+                                } else {
+                                    let success_count = r.message.filter(res => res.status === "Success").length;
+                                    frappe.show_alert({
+                                        message: __("{0} Claims successfully moved to Survey", [success_count]),
+                                        indicator: "green"
+                                    });
+                                    show_failed_assignments(r.message.filter(res => res.status === "Failed"));
+                                }
                                 listview.refresh();
                                 d.hide();
                             }
@@ -77,5 +86,50 @@ frappe.listview_settings['Insurance Claim'] = {
             });
             d.show();
         });
+
+        listview.page.add_inner_button(__("Create Settlement JE"), function () {
+            let approved_claims = listview.get_checked_items()
+                .filter(d => d.claim_status === 'Approved')
+                .map(d => d.name);
+
+            // Without a selection, the batch covers all Approved claims not yet settled
+            let message = approved_claims.length
+                ? __("Create one settlement Journal Entry for the {0} selected Approved claims?", [approved_claims.length])
+                : __("Create one settlement Journal Entry for all Approved claims not yet settled?");
+
+            frappe.confirm(message, function () {
+                frappe.call({
+                    method: "insurance_erp.insurance_erp.doctype.insurance_claim.insurance_claim.create_settlement_batch",
+                    args: {
+                        claim_names: approved_claims.length ? approved_claims : null
+                    },
+                    freeze: true,
+                    callback: function (r) {
+                        if (r.message) {
+                            frappe.set_route("Form", "Journal Entry", r.message);
+                        }
+                    }
+                });
+            });
+        });
+
+        frappe.realtime.on("insurance_survey_assignment_progress", function (data) {
+            frappe.show_progress(__("Assigning Surveyor"), data.processed, data.total,
+                __("{0} claims moved to Survey", [data.success]));
+            if (data.processed >= data.total) {
+                frappe.hide_progress();
+                listview.refresh();
+                show_failed_assignments(data.failed);
+            }
+        });
     }
 };
+
+function show_failed_assignments(failed) {
+    if (!failed || !failed.length) return;
+    frappe.msgprint({
+        title: __("Claims Not Moved to Survey"),
+        message: failed.map(res => `<b>${res.claim}</b>: ${res.message}`).join("<br>"),
+        indicator: "orange"
+    });
+}
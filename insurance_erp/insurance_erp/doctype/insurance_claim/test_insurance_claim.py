@@ -0,0 +1,186 @@
+# Copyright (c) 2026, Insurance Solutions Inc and Contributors
+# See license.txt
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from frappe.utils import add_days, add_years, today
+
+from insurance_erp.insurance_erp import identity_map
+from insurance_erp.insurance_erp.api.policy_coverage import CoverageLimit, clear_policy_coverage_cache
+from insurance_erp.insurance_erp.doctype.insurance_claim.insurance_claim import create_settlement_batch
+from insurance_erp.insurance_erp.doctype.insurance_claim_counter.insurance_claim_counter import apply_claim_delta
+from insurance_erp.insurance_erp.doctype.insurance_system_settings.insurance_system_settings import (
+	clear_insurance_settings_cache,
+)
+from insurance_erp.setup_fields import setup_all_custom_fields
+
+
+def make_policy(policy_number="_T-POL-CLAIM-0001", **values):
+	"""Insert a bare Active policy row (controllers and links are not needed here)"""
+	if frappe.db.exists("Insurance Policy", policy_number):
+		frappe.delete_doc("Insurance Policy", policy_number, force=True, ignore_permissions=True)
+
+	policy = frappe.get_doc(
+		{
+			"doctype": "Insurance Policy",
+			"name": policy_number,
+			"policy_number": policy_number,
+			"customer": "_Test Customer",
+			"vehicle": "_Test Vehicle",
+			"insurance_plan": "_Test Plan",
+			"insurance_proposal": "_Test Proposal",
+			"status": "Active",
+			"policy_date": add_days(today(), -30),
+			"policy_start_date": add_days(today(), -30),
+			"policy_end_date": add_years(add_days(today(), -30), 1),
+			"vehicle_idv": 500000,
+			"coverage_snapshot": [
+				{"coverage_type": "Accident", "limit_type": "Percentage of IDV", "limit_value": 10, "deductible": 1000},
+			],
+			**values,
+		}
+	)
+	policy.db_insert()
+	for row in policy.coverage_snapshot:
+		row.db_insert()
+	clear_policy_coverage_cache(policy.name)
+	return policy
+
+
+def make_claim(policy, **values):
+	return frappe.get_doc(
+		{
+			"doctype": "Insurance Claim",
+			"policy": policy.name,
+			"customer": policy.customer,
+			"vehicle": policy.vehicle,
+			"policy_number": policy.policy_number,
+			"insurance_plan": policy.insurance_plan,
+			"claim_registration_date": today(),
+			"date_of_loss": add_days(today(), -2),
+			"nature_of_loss": "Accident",
+			"coverage_type": "Accident",
+			"claim_amount": 25000,
+			"claim_status": "Reported",
+			**values,
+		}
+	)
+
+
+class TestInsuranceClaim(FrappeTestCase):
+	def setUp(self):
+		identity_map.clear()
+
+	def test_identity_map_fetches_each_record_once(self):
+		identity_map.get_values("User", "Administrator", ["email", "first_name"])
+
+		identity_map.clear()
+		with self.assertQueryCount(1):
+			for _i in range(3):
+				identity_map.get_values("User", "Administrator", ["email", "first_name"])
+			# Subsets of already fetched columns are served from the map
+			identity_map.get_value("User", "Administrator", "email")
+
+		# Only the missing column is fetched
+		with self.assertQueryCount(1):
+			identity_map.get_values("User", "Administrator", ["email", "last_name"])
+
+	def test_validate_chain_reads_policy_once(self):
+		claim = make_claim(make_policy())
+
+		# Warm up meta caches so only data queries are counted
+		claim.validate_policy_status()
+		claim.validate_coverage()
+		identity_map.clear()
+
+		# Policy columns once (coverage comes from the cached index), instead of four full policy loads
+		with self.assertQueryCount(1):
+			claim.validate_policy_status()
+			claim.validate_dates()
+			claim.validate_coverage()
+			claim.validate_limits()
+
+	def test_coverage_limit_and_deductible(self):
+		policy = make_policy()
+
+		claim = make_claim(policy, claim_amount=40000)
+		claim.validate_coverage()
+		self.assertEqual(claim.deductible_applied, 1000)
+
+		# 10% of an IDV of 5,00,000
+		claim = make_claim(policy, claim_amount=60000)
+		self.assertRaises(frappe.ValidationError, claim.validate_coverage)
+
+		claim = make_claim(policy, nature_of_loss="Theft", coverage_type="Theft")
+		self.assertRaises(frappe.ValidationError, claim.validate_coverage)
+
+	def test_empty_coverage_limit_is_unlimited(self):
+		for limit_type in ("Fixed Amount", "Percentage of IDV"):
+			self.assertIsNone(CoverageLimit("Accident", limit_type, 0, 0).get_limit(500000))
+		self.assertEqual(CoverageLimit("Accident", "Fixed Amount", 50000, 0).get_limit(500000), 50000)
+
+		policy = make_policy(
+			coverage_snapshot=[
+				{"coverage_type": "Accident", "limit_type": "Fixed Amount", "limit_value": 0, "deductible": 0},
+				{"coverage_type": "Theft", "limit_type": "Percentage of IDV", "limit_value": None, "deductible": 0},
+			]
+		)
+
+		for coverage_type in ("Accident", "Theft"):
+			claim = make_claim(
+				policy, nature_of_loss=coverage_type, coverage_type=coverage_type, claim_amount=400000
+			)
+			claim.validate_coverage()
+
+	def test_settlement_journal_entry(self):
+		# Settlement lines link their claim through the custom Journal Entry Account field
+		setup_all_custom_fields()
+		frappe.db.set_single_value(
+			"Insurance System Settings",
+			{
+				"settlement_company": "_Test Company",
+				"claim_expense_account": "_Test Account Cost for Goods Sold - _TC",
+				"claim_payout_account": "_Test Bank - _TC",
+			},
+		)
+		clear_insurance_settings_cache()
+
+		if frappe.db.exists("Insurance Claim", "_T-CLAIM-SETTLE-0001"):
+			frappe.delete_doc("Insurance Claim", "_T-CLAIM-SETTLE-0001", force=True, ignore_permissions=True)
+		claim = make_claim(
+			make_policy(),
+			name="_T-CLAIM-SETTLE-0001",
+			claim_status="Approved",
+			approved_amount=20000,
+			deductible_applied=1000,
+		)
+		claim.db_insert()
+
+		je = frappe.get_doc("Journal Entry", create_settlement_batch([claim.name]))
+		claim_rows = [row for row in je.accounts if row.insurance_claim == claim.name]
+		self.assertEqual(len(claim_rows), 1)
+		self.assertEqual(claim_rows[0].debit_in_account_currency, 19000)
+		self.assertEqual(je.total_credit, 19000)
+
+		# The claim is part of a draft entry now and cannot be paid twice
+		self.assertRaises(frappe.ValidationError, create_settlement_batch, [claim.name])
+
+	def test_claim_limits_only_checked_when_adding(self):
+		policy = make_policy()
+		frappe.db.delete("Insurance Claim Counter", {"policy": policy.name})
+		frappe.db.set_single_value("Insurance System Settings", "max_claims_per_policy", 1)
+		clear_insurance_settings_cache()
+
+		if frappe.db.exists("Insurance Claim", "_T-CLAIM-LIMIT-0001"):
+			frappe.delete_doc("Insurance Claim", "_T-CLAIM-LIMIT-0001", force=True, ignore_permissions=True)
+		make_claim(policy, name="_T-CLAIM-LIMIT-0001").db_insert()
+		# Two claims counted, over the limit set after they were filed
+		apply_claim_delta({}, {(policy.name, None): (2, 50000.0, 0.0)})
+
+		claim = frappe.get_doc("Insurance Claim", "_T-CLAIM-LIMIT-0001")
+		claim.load_doc_before_save()
+		claim.claim_status = "Approved"
+		claim.approved_amount = 20000
+		claim.validate_claim_counters()
+
+		self.assertRaises(frappe.ValidationError, make_claim(policy).validate_claim_counters)
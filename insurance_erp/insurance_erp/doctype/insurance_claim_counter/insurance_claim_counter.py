@@ -0,0 +1,179 @@
+# Copyright (c) 2026, Insurance Solutions Inc and contributors
+# For license information, please see license.txt
+
+"""
+Materialized claim totals per policy and per policy add-on.
+
+Rows are keyed by name (`<policy>` or `<policy>::<addon>`) and only ever
+changed with atomic `INSERT ... ON DUPLICATE KEY UPDATE` deltas computed by
+Insurance Claim, so a limit check is a single primary key lookup.
+"""
+
+import frappe
+from frappe.model.document import Document
+from frappe.utils import flt, now
+
+# Claims in these states no longer count towards the limits
+INACTIVE_CLAIM_STATUSES = ("Rejected",)
+APPROVED_CLAIM_STATUSES = ("Approved", "Settled")
+
+
+class InsuranceClaimCounter(Document):
+	pass
+
+
+def get_counter_name(policy, addon=None):
+	return f"{policy}::{addon}" if addon else policy
+
+
+def get_counter(policy, addon=None, for_update=False):
+	"""
+	Current totals as frappe._dict(claim_count, claimed_amount, approved_amount).
+
+	With `for_update` the row is created empty if missing and locked until the
+	transaction ends (SELECT ... FOR UPDATE), serializing limit checks per counter.
+	"""
+	if for_update:
+		_insert_empty_counter(policy, addon)
+
+	counter = frappe.db.get_value(
+		"Insurance Claim Counter",
+		get_counter_name(policy, addon),
+		["claim_count", "claimed_amount", "approved_amount"],
+		as_dict=True,
+		for_update=for_update,
+	)
+	return counter or frappe._dict(claim_count=0, claimed_amount=0.0, approved_amount=0.0)
+
+
+def get_claim_contribution(claim, addon=None):
+	"""What one claim adds to its counters: {(policy, addon): (count, claimed, approved)}"""
+	if not claim or not claim.policy:
+		return {}
+	if claim.claim_status in INACTIVE_CLAIM_STATUSES:
+		return {}
+
+	values = (
+		1,
+		flt(claim.claim_amount),
+		flt(claim.approved_amount) if claim.claim_status in APPROVED_CLAIM_STATUSES else 0.0,
+	)
+	contribution = {(claim.policy, None): values}
+	if addon:
+		contribution[(claim.policy, addon)] = values
+	return contribution
+
+
+def apply_claim_delta(before, after):
+	"""Move the counters from the `before` contribution to the `after` one"""
+	for key in set(before) | set(after):
+		old = before.get(key, (0, 0.0, 0.0))
+		new = after.get(key, (0, 0.0, 0.0))
+		delta = tuple(new[i] - old[i] for i in range(3))
+		if any(delta):
+			_increment(key[0], key[1], *delta)
+
+
+def _insert_empty_counter(policy, addon):
+	"""Create the counter row with zero totals unless it exists, so that it can be locked"""
+	timestamp = now()
+	frappe.db.sql(
+		"""
+		INSERT IGNORE INTO `tabInsurance Claim Counter`
+			(name, policy, addon, claim_count, claimed_amount, approved_amount,
+			creation, modified, owner, modified_by, docstatus, idx)
+		VALUES (%(name)s, %(policy)s, %(addon)s, 0, 0, 0, %(timestamp)s, %(timestamp)s, %(user)s, %(user)s, 0, 0)
+	""",
+		{
+			"name": get_counter_name(policy, addon),
+			"policy": policy,
+			"addon": addon,
+			"timestamp": timestamp,
+			"user": frappe.session.user,
+		},
+	)
+
+
+def _increment(policy, addon, claim_count, claimed_amount, approved_amount):
+	timestamp = now()
+	frappe.db.sql(
+		"""
+		INSERT INTO `tabInsurance Claim Counter`
+			(name, policy, addon, claim_count, claimed_amount, approved_amount,
+			creation, modified, owner, modified_by, docstatus, idx)
+		VALUES (%(name)s, %(policy)s, %(addon)s, %(claim_count)s, %(claimed_amount)s, %(approved_amount)s,
+			%(timestamp)s, %(timestamp)s, %(user)s, %(user)s, 0, 0)
+		ON DUPLICATE KEY UPDATE
+			claim_count = claim_count + VALUES(claim_count),
+			claimed_amount = claimed_amount + VALUES(claimed_amount),
+			approved_amount = approved_amount + VALUES(approved_amount),
+			modified = VALUES(modified),
+			modified_by = VALUES(modified_by)
+	""",
+		{
+			"name": get_counter_name(policy, addon),
+			"policy": policy,
+			"addon": addon,
+			"claim_count": claim_count,
+			"claimed_amount": claimed_amount,
+			"approved_amount": approved_amount,
+			"timestamp": timestamp,
+			"user": frappe.session.user,
+		},
+	)
+
+
+@frappe.whitelist()
+def rebuild_claim_counters():
+	"""Recompute every counter from the claims table"""
+	frappe.only_for("System Manager")
+
+	timestamp = now()
+	params = {
+		"timestamp": timestamp,
+		"user": frappe.session.user,
+		"inactive": INACTIVE_CLAIM_STATUSES,
+		"approved": APPROVED_CLAIM_STATUSES,
+	}
+
+	frappe.db.sql("DELETE FROM `tabInsurance Claim Counter`")
+
+	# Policy level
+	frappe.db.sql(
+		"""
+		INSERT INTO `tabInsurance Claim Counter`
+			(name, policy, addon, claim_count, claimed_amount, approved_amount,
+			creation, modified, owner, modified_by, docstatus, idx)
+		SELECT
+			c.policy, c.policy, NULL, COUNT(*), SUM(c.claim_amount),
+			SUM(CASE WHEN c.claim_status IN %(approved)s THEN c.approved_amount ELSE 0 END),
+			%(timestamp)s, %(timestamp)s, %(user)s, %(user)s, 0, 0
+		FROM `tabInsurance Claim` c
+		WHERE c.claim_status NOT IN %(inactive)s AND IFNULL(c.policy, '') != ''
+		GROUP BY c.policy
+	""",
+		params,
+	)
+
+	# Add-on level: claims whose nature of loss is an add-on of the claim's plan
+	frappe.db.sql(
+		"""
+		INSERT INTO `tabInsurance Claim Counter`
+			(name, policy, addon, claim_count, claimed_amount, approved_amount,
+			creation, modified, owner, modified_by, docstatus, idx)
+		SELECT
+			CONCAT(c.policy, '::', c.nature_of_loss), c.policy, c.nature_of_loss, COUNT(*), SUM(c.claim_amount),
+			SUM(CASE WHEN c.claim_status IN %(approved)s THEN c.approved_amount ELSE 0 END),
+			%(timestamp)s, %(timestamp)s, %(user)s, %(user)s, 0, 0
+		FROM `tabInsurance Claim` c
+		WHERE c.claim_status NOT IN %(inactive)s AND IFNULL(c.policy, '') != ''
+			AND EXISTS (
+				SELECT 1 FROM `tabPlan Addons` pa
+				WHERE pa.parenttype = 'Insurance Plan' AND pa.parent = c.insurance_plan AND pa.addon = c.nature_of_loss
+			)
+		GROUP BY c.policy, c.nature_of_loss
+	""",
+		params,
+	)
+
+	return frappe.db.count("Insurance Claim Counter")
@@ -0,0 +1,59 @@
+# Copyright (c) 2026, Insurance Solutions Inc and Contributors
+# See license.txt
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from insurance_erp.insurance_erp.doctype.insurance_claim.test_insurance_claim import make_claim, make_policy
+from insurance_erp.insurance_erp.doctype.insurance_claim_counter.insurance_claim_counter import (
+	apply_claim_delta,
+	get_counter,
+	rebuild_claim_counters,
+)
+
+POLICY = "_T-POL-COUNTER-0001"
+
+
+class TestInsuranceClaimCounter(FrappeTestCase):
+	def setUp(self):
+		frappe.db.delete("Insurance Claim Counter", {"policy": POLICY})
+
+	def assertCounterEqual(self, expected, addon=None):
+		counter = get_counter(POLICY, addon)
+		self.assertEqual(
+			(counter.claim_count, counter.claimed_amount, counter.approved_amount), expected, msg=addon
+		)
+
+	def test_apply_claim_delta(self):
+		reported = {(POLICY, None): (1, 25000.0, 0.0), (POLICY, "Zero Depreciation"): (1, 25000.0, 0.0)}
+		apply_claim_delta({}, reported)
+		apply_claim_delta({}, {(POLICY, None): (1, 10000.0, 0.0)})
+		self.assertCounterEqual((2, 35000.0, 0.0))
+		self.assertCounterEqual((1, 25000.0, 0.0), "Zero Depreciation")
+
+		# Approval only moves the approved amount
+		approved = {key: (1, 25000.0, 20000.0) for key in reported}
+		apply_claim_delta(reported, approved)
+		self.assertCounterEqual((2, 35000.0, 20000.0))
+		self.assertCounterEqual((1, 25000.0, 20000.0), "Zero Depreciation")
+
+		# Rejection or deletion takes the claim out again
+		apply_claim_delta(approved, {})
+		self.assertCounterEqual((1, 10000.0, 0.0))
+		self.assertCounterEqual((0, 0.0, 0.0), "Zero Depreciation")
+
+	def test_rebuild_claim_counters(self):
+		policy = make_policy(POLICY)
+		for name, values in (
+			("_T-CLAIM-COUNTER-1", {"claim_amount": 30000, "claim_status": "Approved", "approved_amount": 25000}),
+			("_T-CLAIM-COUNTER-2", {"claim_amount": 15000, "claim_status": "Reported"}),
+			("_T-CLAIM-COUNTER-3", {"claim_amount": 40000, "claim_status": "Rejected"}),
+		):
+			if frappe.db.exists("Insurance Claim", name):
+				frappe.delete_doc("Insurance Claim", name, force=True, ignore_permissions=True)
+			make_claim(policy, name=name, **values).db_insert()
+
+		# Stale totals are replaced, rejected claims do not count
+		apply_claim_delta({}, {(POLICY, None): (7, 1.0, 1.0)})
+		rebuild_claim_counters()
+		self.assertCounterEqual((2, 45000.0, 25000.0))
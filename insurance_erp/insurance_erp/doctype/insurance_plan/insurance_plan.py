@@ -1,5 +1,25 @@
 import frappe
 from frappe.model.document import Document
 
+from insurance_erp.insurance_erp.api.idv_calculator import validate_depreciation_slabs
+from insurance_erp.insurance_erp.api.plan_eligibility import clear_eligibility_cache
+from insurance_erp.insurance_erp.api.plan_rating import clear_plan_rating_cache
+
 class InsurancePlan(Document):
-    pass
+    def validate(self):
+        validate_depreciation_slabs(self.get("depreciation_slabs", []))
+
+    def on_update(self):
+        clear_plan_rating_cache(self.name)
+
+        previous = self.get_doc_before_save()
+        clear_eligibility_cache(self.vehicle_type, previous.vehicle_type if previous else None)
+
+    def on_trash(self):
+        clear_plan_rating_cache(self.name)
+        clear_eligibility_cache(self.vehicle_type)
+
+    def after_rename(self, old_name, new_name, merge=False):
+        clear_plan_rating_cache(old_name)
+        clear_plan_rating_cache(new_name)
+        clear_eligibility_cache(self.vehicle_type)
@@ -0,0 +1,115 @@
+# Copyright (c) 2026, Insurance Solutions Inc and contributors
+# For license information, please see license.txt
+
+"""
+Content-addressed, immutable copies of Insurance Plans.
+
+A policy used to carry a full JSON dump of its plan and a copy of every plan
+coverage row. Instead, the plan is serialized canonically (sorted keys, no
+record metadata), hashed with SHA-256 and stored once as an Insurance Plan
+Version named by that hash; policies only keep the hash. Since a version can
+never change, decoded versions are kept in a per-process LRU cache without
+any invalidation.
+"""
+
+import hashlib
+import json
+from functools import lru_cache
+
+import frappe
+from frappe import _
+from frappe.model.document import Document
+
+# Record metadata that does not describe the plan itself
+META_FIELDS = frozenset(
+	(
+		"name",
+		"owner",
+		"creation",
+		"modified",
+		"modified_by",
+		"docstatus",
+		"idx",
+		"parent",
+		"parentfield",
+		"parenttype",
+		"doctype",
+		"_user_tags",
+		"_comments",
+		"_assign",
+		"_liked_by",
+		"_seen",
+		"__onload",
+		"__last_sync_on",
+	)
+)
+
+
+class InsurancePlanVersion(Document):
+	def autoname(self):
+		self.name = get_content_hash(self.plan_json)
+
+	def validate(self):
+		if not self.is_new():
+			frappe.throw(_("Insurance Plan Versions cannot be changed"))
+
+
+def canonicalize_plan(plan):
+	"""Canonical JSON for a plan document, `as_dict()` or legacy `plan_snapshot_json`"""
+	if isinstance(plan, str):
+		plan = json.loads(plan)
+	elif not isinstance(plan, dict):
+		plan = plan.as_dict()
+
+	# Round trip through frappe's encoder so dates, decimals etc. match the stored JSON
+	plan = json.loads(frappe.as_json(plan))
+	content = _strip_meta(plan)
+	content["insurance_plan"] = plan["name"]
+	return json.dumps(content, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+
+
+def get_content_hash(plan_json):
+	return hashlib.sha256(plan_json.encode()).hexdigest()
+
+
+def get_or_create_plan_version(plan):
+	"""Name of the Insurance Plan Version holding `plan`'s current content, created if new"""
+	plan_json = canonicalize_plan(plan)
+	name = get_content_hash(plan_json)
+	if not frappe.db.exists("Insurance Plan Version", name):
+		version = frappe.get_doc(
+			{
+				"doctype": "Insurance Plan Version",
+				"insurance_plan": json.loads(plan_json)["insurance_plan"],
+				"plan_json": plan_json,
+			}
+		)
+		# Another request may insert the same content concurrently, which is fine
+		version.insert(ignore_permissions=True, ignore_if_duplicate=True)
+	return name
+
+
+def get_plan_version(name):
+	"""Decoded plan content of a version. Treat it as read-only."""
+	return _load_plan_version(frappe.local.site, name)
+
+
+def get_plan_version_coverages(name):
+	"""The plan's `coverage_types` rows as frozen in the version"""
+	return get_plan_version(name).get("coverage_types") or []
+
+
+@lru_cache(maxsize=256)
+def _load_plan_version(site, name):
+	plan_json = frappe.db.get_value("Insurance Plan Version", name, "plan_json")
+	if plan_json is None:
+		frappe.throw(_("Insurance Plan Version {0} not found").format(name), frappe.DoesNotExistError)
+	return frappe._dict(json.loads(plan_json))
+
+
+def _strip_meta(value):
+	if isinstance(value, dict):
+		return {key: _strip_meta(val) for key, val in value.items() if key not in META_FIELDS}
+	if isinstance(value, list):
+		return [_strip_meta(val) for val in value]
+	return value
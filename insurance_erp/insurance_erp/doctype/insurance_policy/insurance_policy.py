@@ -6,6 +6,12 @@ from frappe import _
 from frappe.model.document import Document
 from frappe.utils import flt
 
+from insurance_erp.insurance_erp import identity_map
+from insurance_erp.insurance_erp.api.policy_coverage import clear_policy_coverage_cache
+from insurance_erp.insurance_erp.doctype.insurance_plan_version.insurance_plan_version import (
+	get_or_create_plan_version,
+)
+
 class InsurancePolicy(Document):
 	def before_insert(self):
 		"""Capture snapshots before the policy is created"""
@@ -16,25 +22,26 @@ class InsurancePolicy(Document):
 		self.calculate_outstanding()
 		self.update_status()
 
+	def on_update(self):
+		# Policies are saved as drafts, their coverage rows or plan version may change on any save
+		clear_policy_coverage_cache(self.name)
+
+	def on_update_after_submit(self):
+		clear_policy_coverage_cache(self.name)
+
+	def on_cancel(self):
+		clear_policy_coverage_cache(self.name)
+
+	def on_trash(self):
+		clear_policy_coverage_cache(self.name)
+
 	def freeze_snapshots(self):
-		"""Freeze the Insurance Plan and its coverages at the time of policy creation"""
+		"""Point the policy at an immutable version of its Insurance Plan (coverages included)"""
 		if not self.insurance_plan:
 			return
 
-		plan = frappe.get_doc("Insurance Plan", self.insurance_plan)
-		
-		# Freeze Plan JSON
-		self.plan_snapshot_json = frappe.as_json(plan.as_dict())
-		
-		# Freeze Coverage Snapshot Table
-		self.set("coverage_snapshot", [])
-		for coverage in plan.get("coverage_types", []):
-			self.append("coverage_snapshot", {
-				"coverage_type": coverage.coverage_type,
-				"limit_type": coverage.limit_type,
-				"limit_value": coverage.limit_value,
-				"deductible": coverage.deductible
-			})
+		plan = identity_map.get_doc("Insurance Plan", self.insurance_plan)
+		self.plan_version = get_or_create_plan_version(plan)
 
 	def validate_mandatory_policy_data(self):
 		"""Ensure critical policy fields are populated"""
@@ -51,3 +58,10 @@ class InsurancePolicy(Document):
 		"""Update status to Active if fully paid"""
 		if flt(self.outstanding_amount) <= 0 and self.status == "Pending Payment":
 			self.status = "Active"
+
+
+def on_doctype_update():
+	# Active policy of a vehicle (fleet IDV job, claims)
+	frappe.db.add_index("Insurance Policy", ["vehicle", "status"])
+	# Renewal window scan, keyset-paginated by (policy_end_date, name)
+	frappe.db.add_index("Insurance Policy", ["status", "policy_end_date"])
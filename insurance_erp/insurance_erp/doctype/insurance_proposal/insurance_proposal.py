@@ -1,15 +1,46 @@
 # Copyright (c) 2026, Insurance Solutions Inc and contributors
 # For license information, please see license.txt
 
+import json
+
 import frappe
 from frappe import _, bold
 from frappe.model.document import Document
-from frappe.utils import getdate, today, date_diff, flt
+from frappe.utils import getdate, today, date_diff, flt, now
+
+from insurance_erp.insurance_erp import identity_map
+from insurance_erp.insurance_erp.api import plan_eligibility
+from insurance_erp.insurance_erp.api.idv_calculator import calculate_idv
+from insurance_erp.insurance_erp.api.plan_rating import get_plan_rating_or_throw
+from insurance_erp.insurance_erp.doctype.insurance_plan_version.insurance_plan_version import (
+	get_or_create_plan_version,
+)
+from insurance_erp.insurance_erp.doctype.insurance_quote.insurance_quote import get_quoted_premium
+from insurance_erp.insurance_erp.doctype.policy_number_block.policy_number_block import next_policy_number
+
+BULK_CONVERSION_CHUNK_SIZE = 500
+
+# Proposal columns needed to build a policy
+PROPOSAL_FIELDS = [
+	"name",
+	"customer",
+	"insurance_plan",
+	"vehicle",
+	"calculated_idv",
+	"policy_duration_from",
+	"policy_duration_to",
+	"own_damage_premium",
+	"third_party_premium",
+	"addon_premium",
+	"tax_amount",
+	"total_premium_payable",
+]
 
 class InsuranceProposal(Document):
 	def validate(self):
 		"""Validate proposal before submission"""
 		self.validate_mandatory_vehicle_data()
+		self.validate_plan_eligibility()
 		self.calculate_vehicle_age()
 		self.calculate_idv()
 		self.calculate_premium_breakdown()
@@ -20,8 +51,6 @@ class InsuranceProposal(Document):
 		if not self.vehicle:
 			frappe.throw(_("Please select a Vehicle first."))
 
-		vehicle = frappe.get_doc("Vehicle", self.vehicle)
-		
 		# List of mandatory fields derived from PDF standards
 		mandatory_fields = {
 			"license_plate": "Registration Number",
@@ -40,6 +69,14 @@ class InsuranceProposal(Document):
 			"vehicle_value": "Vehicle Value"
 		}
 
+		# One query for everything the validate chain reads from the vehicle. Custom fields not
+		# created on this site are left out of it and reported missing below.
+		vehicle = identity_map.get_values(
+			"Vehicle",
+			self.vehicle,
+			plan_eligibility.get_vehicle_fields(list(mandatory_fields) + plan_eligibility.VEHICLE_PROFILE_FIELDS),
+		)
+
 		missing = []
 		for field, label in mandatory_fields.items():
 			if not vehicle.get(field):
@@ -55,9 +92,14 @@ class InsuranceProposal(Document):
 		# Sync vehicle value for snapshot
 		self.vehicle_value_snapshot = vehicle.vehicle_value
 
+	def validate_plan_eligibility(self):
+		"""Ensure the plan covers the vehicle's type and engine CC"""
+		if self.insurance_plan:
+			plan_eligibility.validate_plan_eligibility(self.insurance_plan, self.vehicle)
+
 	def calculate_vehicle_age(self):
 		"""Derive vehicle age from manufacturing year"""
-		vehicle = frappe.get_doc("Vehicle", self.vehicle)
+		vehicle = identity_map.get_values("Vehicle", self.vehicle, ["custom_manufacturing_year"])
 		current_year = getdate(today()).year
 		self.vehicle_age = flt(current_year - vehicle.custom_manufacturing_year, 2)
 		if self.vehicle_age < 0:
@@ -68,22 +110,16 @@ class InsuranceProposal(Document):
 		if not self.insurance_plan:
 			return
 
-		plan = frappe.get_doc("Insurance Plan", self.insurance_plan)
+		rating = get_plan_rating_or_throw(self.insurance_plan)
 		vehicle_value = self.vehicle_value_snapshot or 0
 		
-		# Find applicable depreciation percent from slabs
+		# Applicable depreciation percent from the plan's compiled slabs
 		age_months = self.vehicle_age * 12
-		depreciation_percent = 0
-		
-		for slab in plan.get("depreciation_slabs", []):
-			if age_months >= slab.from_age_months and age_months <= (slab.to_age_months or 999):
-				depreciation_percent = slab.depreciation_percent
-				break
-		
-		self.calculated_idv = flt(vehicle_value * (1 - (depreciation_percent / 100)), 2)
+		self.calculated_idv = calculate_idv(rating, vehicle_value, age_months)
 
 	def calculate_premium_breakdown(self):
 		"""Sum OD, TP, and Add-ons for total premium payable"""
+		self.apply_quote()
 		self.total_premium_payable = flt(
 			(self.own_damage_premium or 0) + 
 			(self.third_party_premium or 0) + 
@@ -92,6 +128,24 @@ class InsuranceProposal(Document):
 			2
 		)
 
+	def apply_quote(self):
+		"""Take the premium from the linked quote while it is valid for this proposal"""
+		if not self.insurance_quote:
+			return
+
+		quoted = get_quoted_premium(
+			self.insurance_quote, self.insurance_plan, self.vehicle, self.calculated_idv, self.no_claim_bonus_percent
+		)
+		if not quoted:
+			frappe.msgprint(_("Quote has expired or no longer matches this proposal and was removed"), alert=True)
+			self.insurance_quote = None
+			return
+
+		self.own_damage_premium = quoted.get("od_premium")
+		self.third_party_premium = quoted.get("tp_premium")
+		self.addon_premium = quoted.get("addon_premium")
+		self.tax_amount = quoted.get("total_gst")
+
 	def validate_dates(self):
 		if not self.policy_duration_from or not self.policy_duration_to:
 			frappe.throw(_("Policy Duration From and To are mandatory"))
@@ -120,6 +174,14 @@ def create_policy_from_proposal(proposal_name):
 	if not payment_exists:
 		frappe.throw(_("No submitted Payment Entry found for Proposal {0}. Please record payment first.").format(proposal_name))
 	
+	policy = make_policy(proposal)
+	policy.insert(ignore_permissions=True)
+	frappe.db.commit()
+	
+	return policy.name
+
+def make_policy(proposal):
+	"""Unsaved Insurance Policy for an approved proposal (document or `PROPOSAL_FIELDS` row)"""
 	policy = frappe.new_doc("Insurance Policy")
 	policy.customer = proposal.customer
 	policy.insurance_proposal = proposal.name
@@ -129,11 +191,8 @@ def create_policy_from_proposal(proposal_name):
 	policy.policy_start_date = proposal.policy_duration_from
 	policy.policy_end_date = proposal.policy_duration_to
 	
-	# Fix: Generate Policy Number from Settings
-	settings = frappe.get_single("Insurance System Settings")
-	series = settings.policy_naming_series or "POL-.YYYY.-"
-	from frappe.model.naming import make_autoname
-	policy.policy_number = make_autoname(series)
+	# Policy number from this worker's reserved block of the settings series
+	policy.policy_number = next_policy_number()
 
 	# Freeze Premium Snapshot
 	policy.own_damage_premium = proposal.own_damage_premium
@@ -141,24 +200,136 @@ def create_policy_from_proposal(proposal_name):
 	policy.addon_premium = proposal.addon_premium
 	policy.tax_amount = proposal.tax_amount
 	policy.total_premium_payable = proposal.total_premium_payable
-	# Copy Coverages from Plan
-	if proposal.insurance_plan:
-		plan = frappe.get_doc("Insurance Plan", proposal.insurance_plan)
-		for item in plan.coverage_types:
-			policy.append("coverage_snapshot", {
-				"coverage_type": item.coverage_type,
-				"limit_type": item.limit_type,
-				"limit_value": item.limit_value,
-				"deductible": item.deductible
-			})
+	# Plan coverages come from the plan version frozen in InsurancePolicy.before_insert
 	
 	# Set directly to Active as payment is done
 	policy.status = "Active"
-	
-	policy.insert(ignore_permissions=True)
-	frappe.db.commit()
-	
-	return policy.name
+	return policy
+
+@frappe.whitelist()
+def enqueue_bulk_policy_conversion(proposals=None):
+	"""Convert the given (default: all) approved and paid proposals to policies in the background"""
+	frappe.only_for(["System Manager", "Insurance Manager"])
+	if isinstance(proposals, str):
+		proposals = json.loads(proposals)
+
+	frappe.enqueue(
+		"insurance_erp.insurance_erp.doctype.insurance_proposal.insurance_proposal.convert_proposals_to_policies",
+		queue="long",
+		timeout=3600,
+		job_id="insurance_bulk_policy_conversion",
+		deduplicate=True,
+		proposals=proposals,
+		notify_user=frappe.session.user,
+	)
+
+def convert_proposals_to_policies(proposals=None, chunk_size=BULK_CONVERSION_CHUNK_SIZE, notify_user=None):
+	"""
+	Bulk version of `create_policy_from_proposal`.
+
+	Approved proposals are read once up front. Per chunk, existing policies and
+	submitted payments are looked up with one query each, policies are built and
+	validated in memory (one plan version per plan) and written with a single
+	bulk INSERT, then the chunk is committed. Proposals that cannot be converted
+	are reported with the reason instead of stopping the run.
+	"""
+	filters = {"docstatus": 1, "status": "Approved"}
+	if proposals:
+		filters["name"] = ["in", proposals]
+	snapshot = frappe.get_all("Insurance Proposal", filters=filters, fields=PROPOSAL_FIELDS, order_by="name")
+
+	report = {"total": len(snapshot), "created": 0, "errors": []}
+	plan_versions = {}
+
+	for start in range(0, len(snapshot), chunk_size):
+		chunk = snapshot[start : start + chunk_size]
+		names = [proposal.name for proposal in chunk]
+
+		converted = set(
+			frappe.get_all("Insurance Policy", filters={"insurance_proposal": ["in", names]}, pluck="insurance_proposal")
+		)
+		paid = set(
+			frappe.get_all("Payment Entry", filters={"reference_no": ["in", names], "docstatus": 1}, pluck="reference_no")
+		)
+
+		policies, chunk_errors = [], []
+		known_plans = set(plan_versions)
+		for proposal in chunk:
+			if proposal.name in converted:
+				chunk_errors.append({"proposal": proposal.name, "error": _("A policy already exists for this proposal")})
+				continue
+			if proposal.name not in paid:
+				chunk_errors.append({"proposal": proposal.name, "error": _("No submitted Payment Entry found")})
+				continue
+
+			try:
+				policies.append(make_bulk_policy(proposal, plan_versions))
+			except Exception as e:
+				frappe.clear_messages()
+				chunk_errors.append({"proposal": proposal.name, "error": str(e)})
+
+		try:
+			insert_policies(policies)
+			frappe.db.commit()
+			report["created"] += len(policies)
+		except Exception as e:
+			frappe.db.rollback()
+			# Plan versions created in this chunk were rolled back with it, later chunks look them up again
+			for plan in set(plan_versions) - known_plans:
+				del plan_versions[plan]
+			chunk_errors.extend({"proposal": policy.insurance_proposal, "error": str(e)} for policy in policies)
+
+		report["errors"].extend(chunk_errors)
+		frappe.publish_realtime(
+			"insurance_bulk_policy_conversion",
+			{"processed": start + len(chunk), **report},
+			user=notify_user,
+		)
+
+	if not snapshot:
+		# Nothing to convert, the client still waits for a final event to close its progress bar
+		frappe.publish_realtime("insurance_bulk_policy_conversion", {"processed": 0, **report}, user=notify_user)
+
+	return report
+
+def make_bulk_policy(proposal, plan_versions):
+	"""Policy built and validated in memory, with the plan version resolved once per plan"""
+	policy = make_policy(proposal)
+	if policy.insurance_plan not in plan_versions:
+		plan = identity_map.get_doc("Insurance Plan", policy.insurance_plan)
+		plan_versions[policy.insurance_plan] = get_or_create_plan_version(plan)
+	policy.plan_version = plan_versions[policy.insurance_plan]
+
+	policy.name = policy.policy_number
+	policy.validate()
+	return policy
+
+def insert_policies(policies):
+	"""Write policies (and any coverage rows) with one bulk INSERT per table"""
+	if not policies:
+		return
+
+	timestamp, user = now(), frappe.session.user
+	children = []
+	for policy in policies:
+		policy.update({"creation": timestamp, "modified": timestamp, "owner": user, "modified_by": user})
+		policy.set_new_name(set_child_names=True)
+		policy.set_parent_in_children()
+		for child in policy.get_all_children():
+			child.update({"creation": timestamp, "modified": timestamp, "owner": user, "modified_by": user})
+			children.append(child)
+
+	_bulk_insert(policies)
+	if children:
+		_bulk_insert(children)
+
+def _bulk_insert(docs):
+	fields = list(docs[0].get_valid_dict(convert_dates_to_str=True))
+	values = []
+	for doc in docs:
+		row = doc.get_valid_dict(convert_dates_to_str=True)
+		values.append([row.get(field) for field in fields])
+	frappe.db.bulk_insert(docs[0].doctype, fields, values)
 
 @frappe.whitelist()
 def create_proposal_payment_entry(proposal_name):
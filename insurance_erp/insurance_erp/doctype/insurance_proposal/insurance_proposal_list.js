@@ -0,0 +1,43 @@
+frappe.listview_settings['Insurance Proposal'] = {
+    add_fields: ["status", "customer", "vehicle"],
+    onload: function (listview) {
+        listview.page.add_inner_button(__("Convert to Policies"), function () {
+            let selected = listview.get_checked_items()
+                .filter(d => d.status === 'Approved' && d.docstatus === 1)
+                .map(d => d.name);
+
+            let message = selected.length
+                ? __("Convert {0} selected approved proposals to policies?", [selected.length])
+                : __("Convert all approved and paid proposals to policies?");
+
+            frappe.confirm(message, function () {
+                frappe.call({
+                    method: "insurance_erp.insurance_erp.doctype.insurance_proposal.insurance_proposal.enqueue_bulk_policy_conversion",
+                    args: { proposals: selected.length ? selected : null },
+                    callback: function () {
+                        frappe.show_alert({
+                            message: __("Policy conversion started in the background"),
+                            indicator: "blue"
+                        });
+                    }
+                });
+            });
+        });
+
+        frappe.realtime.on("insurance_bulk_policy_conversion", function (data) {
+            frappe.show_progress(__("Converting Proposals"), data.processed, data.total,
+                __("{0} policies created, {1} errors", [data.created, data.errors.length]));
+            if (data.processed >= data.total) {
+                frappe.hide_progress();
+                listview.refresh();
+                if (data.errors.length) {
+                    frappe.msgprint({
+                        title: __("Proposals Not Converted"),
+                        message: data.errors.map(e => `<b>${e.proposal}</b>: ${e.error}`).join("<br>"),
+                        indicator: "orange"
+                    });
+                }
+            }
+        });
+    }
+};
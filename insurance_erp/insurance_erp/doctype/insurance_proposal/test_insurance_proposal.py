@@ -1,9 +1,24 @@
 # Copyright (c) 2026, DharmendraInsurance Solutions Inc and Contributors
 # See license.txt
 
-# import frappe
+from unittest.mock import patch
+
+import frappe
 from frappe.tests.utils import FrappeTestCase
 
+from insurance_erp.insurance_erp.doctype.insurance_proposal.insurance_proposal import (
+	convert_proposals_to_policies,
+)
+
 
 class TestInsuranceProposal(FrappeTestCase):
-	pass
+	def test_empty_conversion_reports_completion(self):
+		with patch.object(frappe, "publish_realtime") as publish_realtime:
+			report = convert_proposals_to_policies(["_T-PROP-MISSING"], notify_user="Administrator")
+
+		self.assertEqual(report, {"total": 0, "created": 0, "errors": []})
+		publish_realtime.assert_called_once_with(
+			"insurance_bulk_policy_conversion",
+			{"processed": 0, "total": 0, "created": 0, "errors": []},
+			user="Administrator",
+		)
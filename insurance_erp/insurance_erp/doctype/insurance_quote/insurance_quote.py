@@ -0,0 +1,185 @@
+# Copyright (c) 2026, Insurance Solutions Inc and contributors
+# For license information, please see license.txt
+
+"""
+Persisted premium quotes.
+
+`create_quote` rates a plan once and stores the inputs, the full breakdown,
+the plan version and an expiry. The caller gets back a signed quote id
+(`<name>.<hmac>`), which Sales Orders and Insurance Proposals carry in their
+`insurance_quote` field. While the quote is valid and its inputs match the
+document, the stored breakdown is reused instead of re-rating, so the premium
+does not move between quote and bind.
+"""
+
+import hashlib
+import hmac
+import json
+from collections import OrderedDict
+
+import frappe
+from frappe import _
+from frappe.model.document import Document
+from frappe.utils import add_days, flt, get_datetime, now_datetime
+from frappe.utils.password import get_encryption_key
+
+from insurance_erp.insurance_erp import identity_map
+from insurance_erp.insurance_erp.api.plan_rating import get_plan_rating_or_throw
+from insurance_erp.insurance_erp.api.premium_calculator import calculate_premium
+from insurance_erp.insurance_erp.doctype.insurance_plan_version.insurance_plan_version import (
+	get_or_create_plan_version,
+)
+from insurance_erp.insurance_erp.doctype.insurance_system_settings.insurance_system_settings import (
+	get_insurance_settings,
+)
+
+DEFAULT_QUOTE_VALIDITY_DAYS = 7
+# Expired quotes are kept this long for reference before they are deleted
+EXPIRED_QUOTE_RETENTION_DAYS = 30
+
+# Plan versions remembered per worker, least recently used are dropped first
+PLAN_VERSION_CACHE_SIZE = 256
+# {(site, plan, plan modified): Insurance Plan Version name}, committed versions only
+_plan_versions = OrderedDict()
+
+
+class InsuranceQuote(Document):
+	pass
+
+
+@frappe.whitelist()
+def create_quote(plan, vehicle, idv, addons=None, ncb_percent=0):
+	"""
+	Rate the plan and store the result, returns the breakdown with `quote_id` and `valid_till`.
+	An unexpired quote for the same inputs and plan version is returned again instead.
+	"""
+	frappe.only_for(["System Manager", "Insurance Manager", "Insurance Agent"])
+	if isinstance(addons, str):
+		addons = json.loads(addons)
+	addons = sorted(addons or [])
+
+	# Rated first: a plan version is only created for plans that can be quoted
+	result = calculate_premium(plan, vehicle, idv, addons, ncb_percent)
+	if not result:
+		return {}
+
+	plan_version = get_current_plan_version(plan)
+	quote = get_matching_quote(plan, plan_version, vehicle, idv, ncb_percent, addons)
+	if quote:
+		return {**json.loads(quote.result_json), "quote_id": sign_quote_id(quote.name), "valid_till": quote.valid_till}
+
+	validity_days = get_insurance_settings().quote_validity_days or DEFAULT_QUOTE_VALIDITY_DAYS
+	quote = frappe.get_doc(
+		{
+			"doctype": "Insurance Quote",
+			"insurance_plan": plan,
+			"plan_version": plan_version,
+			"vehicle": vehicle,
+			"idv": flt(idv),
+			"ncb_percent": flt(ncb_percent),
+			"addons": json.dumps(addons),
+			"valid_till": add_days(now_datetime(), validity_days),
+			"grand_total_premium": result.get("grand_total_premium"),
+			"result_json": json.dumps(result),
+		}
+	).insert(ignore_permissions=True)
+
+	return {**result, "quote_id": sign_quote_id(quote.name), "valid_till": quote.valid_till}
+
+
+def get_matching_quote(plan, plan_version, vehicle, idv, ncb_percent, addons):
+	"""Latest unexpired quote made for exactly these inputs on this plan version, if any"""
+	quotes = frappe.get_all(
+		"Insurance Quote",
+		filters={
+			"insurance_plan": plan,
+			"plan_version": plan_version,
+			"vehicle": vehicle or ("is", "not set"),
+			"idv": flt(idv),
+			"ncb_percent": flt(ncb_percent),
+			"addons": json.dumps(addons),
+			"valid_till": (">", now_datetime()),
+		},
+		fields=["name", "valid_till", "result_json"],
+		order_by="valid_till desc",
+		limit=1,
+	)
+	return quotes[0] if quotes else None
+
+
+def get_quoted_premium(quote_id, plan, vehicle, idv, ncb_percent=0, addons=None):
+	"""
+	The stored breakdown of a quote if it is unexpired and was made for these inputs, else None.
+	`addons=None` skips the add-on comparison (for documents that do not list add-ons).
+	Throws if the quote id was not issued by this site.
+	"""
+	name = verify_quote_id(quote_id)
+	quote = frappe.db.get_value(
+		"Insurance Quote",
+		name,
+		["insurance_plan", "vehicle", "idv", "ncb_percent", "addons", "valid_till", "result_json"],
+		as_dict=True,
+	)
+	if not quote or get_datetime(quote.valid_till) < now_datetime():
+		return None
+
+	matches = (
+		quote.insurance_plan == plan
+		and (quote.vehicle or None) == (vehicle or None)
+		and flt(quote.idv, 2) == flt(idv, 2)
+		and flt(quote.ncb_percent) == flt(ncb_percent)
+		and (addons is None or json.loads(quote.addons or "[]") == sorted(addons))
+	)
+	return json.loads(quote.result_json) if matches else None
+
+
+def sign_quote_id(name):
+	return f"{name}.{_get_signature(name)}"
+
+
+def verify_quote_id(quote_id):
+	"""Quote name from a signed quote id"""
+	name, _sep, signature = (quote_id or "").rpartition(".")
+	if not name or not hmac.compare_digest(signature, _get_signature(name)):
+		frappe.throw(_("Invalid quote id {0}").format(quote_id), title=_("Invalid Quote"))
+	return name
+
+
+def get_current_plan_version(plan):
+	"""
+	Insurance Plan Version of the plan's current content. A plan's version only changes
+	when the plan is saved (new `modified`), so remembered names need no invalidation.
+	"""
+	rating = get_plan_rating_or_throw(plan)
+	key = (frappe.local.site, plan, rating.modified)
+	if key in _plan_versions:
+		_plan_versions.move_to_end(key)
+		return _plan_versions[key]
+
+	name = get_or_create_plan_version(identity_map.get_doc("Insurance Plan", plan))
+	# The version may have been inserted by this transaction, remembered only once it is committed
+	frappe.db.after_commit.add(lambda: _remember_plan_version(key, name))
+	return name
+
+
+def _remember_plan_version(key, name):
+	_plan_versions[key] = name
+	_plan_versions.move_to_end(key)
+	while len(_plan_versions) > PLAN_VERSION_CACHE_SIZE:
+		_plan_versions.popitem(last=False)
+
+
+def on_doctype_update():
+	# Reusing an unexpired quote for the same inputs (`get_matching_quote`)
+	frappe.db.add_index("Insurance Quote", ["insurance_plan", "vehicle", "valid_till"])
+
+
+def delete_expired_quotes():
+	"""Daily: drop quotes that expired more than `EXPIRED_QUOTE_RETENTION_DAYS` ago"""
+	frappe.db.delete(
+		"Insurance Quote", {"valid_till": ("<", add_days(now_datetime(), -EXPIRED_QUOTE_RETENTION_DAYS))}
+	)
+
+
+def _get_signature(name):
+	return hmac.new(get_encryption_key().encode(), f"quote:{name}".encode(), hashlib.sha256).hexdigest()[:32]
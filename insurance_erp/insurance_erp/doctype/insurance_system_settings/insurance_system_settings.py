@@ -1,6 +1,68 @@
+from dataclasses import dataclass, fields
+
 import frappe
 from frappe.model.document import Document
+from frappe.utils import cint, flt
+
+from insurance_erp.insurance_erp import cache
+
+CACHE_NAMESPACE = "insurance_system_settings"
+CACHE_KEY = "Insurance System Settings"
 
 class InsuranceSystemSettings(Document):
-    pass
-    
\ No newline at end of file
+    def on_update(self):
+        clear_insurance_settings_cache()
+
+@dataclass(frozen=True)
+class InsuranceSettings:
+    """Typed, read-only view of Insurance System Settings (secrets are not included)"""
+    policy_naming_series: str
+    grace_period: int
+    policy_number_block_size: int
+    quote_validity_days: int
+    max_claims_per_policy: int
+    max_claim_percent_of_idv: float
+    require_survey_before_approval: bool
+    require_verification_before_approval: bool
+    block_approval_on_fraud_suspected: bool
+    fraud_score_threshold: float
+    notify_customer_on_policy_activation: bool
+    notify_customer_on_claim_status_change: bool
+    notification_email_template: str
+    settlement_company: str
+    claim_expense_account: str
+    claim_payout_account: str
+    enable_vehicle_rc_verification: bool
+    rc_verification_provider: str
+    cashfree_client_id: str
+    cashfree_environment: str
+    rc_api_timeout: int
+
+_CONVERTERS = {int: cint, float: flt, bool: lambda value: bool(cint(value)), str: lambda value: value or None}
+
+def get_insurance_settings():
+    """
+    Insurance System Settings, cached per worker and in Redis.
+    Use this instead of `frappe.get_single` in doc events and other hot paths;
+    the cache is dropped whenever the settings are saved.
+    """
+    return cache.get_versioned(
+        CACHE_NAMESPACE,
+        CACHE_KEY,
+        get_version=lambda key: frappe.generate_hash(length=12),
+        build=_build_payload,
+        load=_load_payload,
+    )
+
+def clear_insurance_settings_cache():
+    cache.invalidate(CACHE_NAMESPACE, CACHE_KEY)
+
+def _build_payload(key):
+    doc = frappe.get_single("Insurance System Settings")
+    return {field.name: doc.get(field.name) for field in fields(InsuranceSettings)}
+
+def _load_payload(payload):
+    # Fields added since the payload was cached load as empty values
+    return InsuranceSettings(
+        **{field.name: _CONVERTERS[field.type](payload.get(field.name)) for field in fields(InsuranceSettings)}
+    )
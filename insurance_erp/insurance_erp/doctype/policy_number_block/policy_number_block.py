@@ -0,0 +1,138 @@
+# Copyright (c) 2026, Insurance Solutions Inc and contributors
+# For license information, please see license.txt
+
+"""
+Block-reserved policy numbers.
+
+`make_autoname` increments `tabSeries` inside the issuing transaction, so the
+row lock on the series is held until that transaction commits and concurrent
+issuance serializes on it. Instead, each worker reserves a block of numbers
+in a short transaction on a separate connection (one `UPDATE` with
+`LAST_INSERT_ID`), records the block here, and hands the numbers out from
+memory.
+
+Numbers still in a worker's pool when it stops, or used by a transaction
+that rolled back, are never issued. `get_policy_number_gaps` lists them.
+"""
+
+import os
+import socket
+import threading
+
+import frappe
+from frappe.model.document import Document
+from frappe.model.naming import NamingSeries
+from frappe.utils import cint, now
+
+from insurance_erp.insurance_erp.doctype.insurance_system_settings.insurance_system_settings import get_insurance_settings
+
+DEFAULT_POLICY_NAMING_SERIES = "POL-.YYYY.-.#####"
+DEFAULT_BLOCK_SIZE = 50
+
+# {(site, prefix): [next number, last number]}
+_pools = {}
+_pool_lock = threading.Lock()
+
+
+class PolicyNumberBlock(Document):
+	pass
+
+
+def next_policy_number(series=None):
+	"""Next policy number for `series` (default: the Insurance System Settings naming series)"""
+	series = series or get_insurance_settings().policy_naming_series or DEFAULT_POLICY_NAMING_SERIES
+	if "#" not in series:
+		series += ".#####"
+
+	prefix = NamingSeries(series).get_prefix()
+	digits = series.count("#")
+	key = (frappe.local.site, prefix)
+
+	with _pool_lock:
+		pool = _pools.get(key)
+		if not pool or pool[0] > pool[1]:
+			pool = _pools[key] = list(reserve_block(prefix, digits))
+		number = pool[0]
+		pool[0] += 1
+
+	return prefix + str(number).zfill(digits)
+
+
+def reserve_block(prefix, digits, size=None):
+	"""Reserve the next `size` numbers of `prefix` in its own transaction, returns (first, last)"""
+	size = cint(size) or get_insurance_settings().policy_number_block_size or DEFAULT_BLOCK_SIZE
+
+	db = _get_series_connection()
+	try:
+		db.sql("INSERT IGNORE INTO `tabSeries` (name, current) VALUES (%s, 0)", prefix)
+		db.sql(
+			"UPDATE `tabSeries` SET current = LAST_INSERT_ID(current + %s) WHERE name = %s", (size, prefix)
+		)
+		last = cint(db.sql("SELECT LAST_INSERT_ID()")[0][0])
+		first = last - size + 1
+
+		timestamp = now()
+		db.sql(
+			"""
+			INSERT INTO `tabPolicy Number Block`
+				(name, series_prefix, first_number, last_number, digits, reserved_on, reserved_by,
+				creation, modified, owner, modified_by, docstatus, idx)
+			VALUES (%(name)s, %(prefix)s, %(first)s, %(last)s, %(digits)s, %(timestamp)s, %(reserved_by)s,
+				%(timestamp)s, %(timestamp)s, %(user)s, %(user)s, 0, 0)
+		""",
+			{
+				"name": frappe.generate_hash(length=10),
+				"prefix": prefix,
+				"first": first,
+				"last": last,
+				"digits": digits,
+				"timestamp": timestamp,
+				"reserved_by": f"{socket.gethostname()}:{os.getpid()}",
+				"user": frappe.session.user,
+			},
+		)
+		db.commit()
+	except Exception:
+		db.rollback()
+		raise
+	finally:
+		db.close()
+
+	return first, last
+
+
+@frappe.whitelist()
+def get_policy_number_gaps(block):
+	"""Numbers of a reserved block that no Insurance Policy or policy Sales Invoice carries"""
+	frappe.has_permission("Policy Number Block", "read", block, throw=True)
+
+	block = frappe.get_doc("Policy Number Block", block)
+	numbers = [
+		block.series_prefix + str(number).zfill(block.digits)
+		for number in range(block.first_number, block.last_number + 1)
+	]
+	if not numbers:
+		return []
+
+	issued = set(frappe.get_all("Insurance Policy", filters={"policy_number": ["in", numbers]}, pluck="policy_number"))
+	if frappe.get_meta("Sales Invoice").has_field("policy_number"):
+		issued.update(
+			frappe.get_all("Sales Invoice", filters={"policy_number": ["in", numbers]}, pluck="policy_number")
+		)
+
+	return [number for number in numbers if number not in issued]
+
+
+def _get_series_connection():
+	"""A new connection to the site database, independent of the request's transaction"""
+	from frappe.database import get_db
+
+	conf = frappe.conf
+	return get_db(
+		socket=conf.db_socket,
+		host=conf.db_host,
+		port=conf.db_port,
+		user=conf.db_user or conf.db_name,
+		password=conf.db_password,
+		cur_db_name=conf.db_name,
+	)
@@ -1,40 +1,240 @@
+import json
+
 import frappe
+from frappe import _
 from frappe.model.document import Document
-from frappe.utils import add_days, getdate
+from frappe.utils import add_days, add_years, cint, flt, getdate, now_datetime, today
+
+from insurance_erp.insurance_erp.api.idv_calculator import calculate_idv_bulk
+from insurance_erp.insurance_erp.api.ncb_calculator import calculate_ncb_bulk, get_claim_free_years
+from insurance_erp.insurance_erp.api.plan_rating import get_plan_rating
+from insurance_erp.insurance_erp.api.premium_calculator import compute_premium_batch
+from insurance_erp.insurance_erp.doctype.insurance_system_settings.insurance_system_settings import get_insurance_settings
+
+# Policies expiring within this many days get a renewal proposal
+RENEWAL_LEAD_DAYS = 30
+RENEWAL_CHUNK_SIZE = 500
+RENEWAL_CHECKPOINT = "insurance_renewal_checkpoint"
+
+# Policy columns needed to build a renewal proposal
+RENEWAL_POLICY_FIELDS = ["name", "customer", "vehicle", "insurance_plan", "policy_end_date", "insurance_proposal"]
 
 class PolicyRenewal(Document):
     pass
 
-def check_for_renewals():
-    """Daily job to check for expiring policies"""
-    # Expiry in 30 days
-    target_date = add_days(frappe.utils.today(), 30)
-    
-    expiring_policies = frappe.get_all("Insurance Policy", 
-        filters={
-            "policy_end_date": target_date,
-            "status": "Active"
-        },
-        fields=["name", "customer", "vehicle", "insurance_plan"]
+def on_doctype_update():
+    # Anti-join of the renewal scan
+    frappe.db.add_index("Policy Renewal", ["insurance_policy"])
+
+@frappe.whitelist()
+def enqueue_renewal_check():
+    """Resume today's renewal scan, or run it again if it already finished"""
+    frappe.only_for("System Manager")
+    frappe.enqueue(
+        "insurance_erp.insurance_erp.doctype.policy_renewal.policy_renewal.check_for_renewals",
+        queue="long",
+        timeout=3600,
+        job_id="insurance_policy_renewal_check",
+        deduplicate=True,
+        restart=True,
     )
-    
-    for p in expiring_policies:
-        create_renewal_proposal(p)
 
-def create_renewal_proposal(policy_data):
-    if frappe.db.exists("Insurance Proposal", {"amended_from": policy_data.name}):
-        # Already created logic (simplistic check)
-        return
+def check_for_renewals(chunk_size=RENEWAL_CHUNK_SIZE, restart=False):
+    """
+    Daily job: queue renewal proposals for Active policies that expire within the next
+    `RENEWAL_LEAD_DAYS` days, or expired no longer ago than the grace period.
+
+    Scanning the whole window instead of one expiry date means a missed day is picked
+    up by the next run. Policies are read in keyset-paginated chunks by
+    (policy_end_date, name) from the (status, policy_end_date) index, and policies
+    that already have a Policy Renewal are excluded by an anti-join in the same query.
+    Each chunk is handed to a background job and a checkpoint is stored, so a crashed
+    run resumes where it stopped on the same day. A run that already finished today
+    is only repeated with `restart`.
+    """
+    checkpoint = get_renewal_checkpoint()
+    if checkpoint.get("run_date") == today() and checkpoint.get("finished") and not restart:
+        return checkpoint
+
+    if checkpoint.get("run_date") != today() or checkpoint.get("finished"):
+        checkpoint = {"run_date": today(), "after_date": "", "after": "", "queued": 0, "finished": 0}
+
+    window_start = add_days(today(), -cint(get_insurance_settings().grace_period))
+    window_end = add_days(today(), RENEWAL_LEAD_DAYS)
+
+    while True:
+        policies = get_renewal_chunk(
+            window_start, window_end, checkpoint["after_date"], checkpoint["after"], chunk_size
+        )
+        if not policies:
+            break
+
+        names = [policy.name for policy in policies]
+        frappe.enqueue(
+            "insurance_erp.insurance_erp.doctype.policy_renewal.policy_renewal.create_renewal_proposals",
+            queue="long",
+            timeout=1800,
+            job_id=f"insurance_policy_renewal::{names[0]}",
+            deduplicate=True,
+            enqueue_after_commit=True,
+            policies=names,
+        )
+
+        checkpoint["after_date"] = str(policies[-1].policy_end_date)
+        checkpoint["after"] = policies[-1].name
+        checkpoint["queued"] += len(policies)
+        set_renewal_checkpoint(checkpoint)
+        frappe.db.commit()
+
+    checkpoint["finished"] = 1
+    checkpoint["finished_on"] = str(now_datetime())
+    set_renewal_checkpoint(checkpoint)
+    frappe.db.commit()
+    return checkpoint
+
+def get_renewal_chunk(window_start, window_end, after_date, after, chunk_size):
+    """Next `chunk_size` Active policies expiring in the window after (`after_date`, `after`) without a renewal"""
+    return frappe.db.sql("""
+        SELECT policy.name, policy.policy_end_date
+        FROM `tabInsurance Policy` policy
+        WHERE policy.status = 'Active'
+            AND policy.policy_end_date BETWEEN %(scan_start)s AND %(window_end)s
+            AND (
+                policy.policy_end_date > %(after_date)s
+                OR (policy.policy_end_date = %(after_date)s AND policy.name > %(after)s)
+            )
+            AND NOT EXISTS (
+                SELECT 1 FROM `tabPolicy Renewal` renewal
+                WHERE renewal.insurance_policy = policy.name
+            )
+        ORDER BY policy.policy_end_date, policy.name
+        LIMIT %(chunk_size)s
+    """, {
+        "scan_start": max(str(window_start), after_date or ""),
+        "window_end": window_end,
+        "after_date": after_date or "0001-01-01",
+        "after": after or "",
+        "chunk_size": cint(chunk_size),
+    }, as_dict=1)
+
+def create_renewal_proposals(policies):
+    """
+    Background job: a pre-rated renewal proposal and Policy Renewal for each of `policies`.
+    Policies renewed in the meantime (e.g. by an earlier attempt of this job) are skipped.
+    Failures are logged per policy without stopping the chunk, which is committed once.
+    """
+    rows = frappe.db.sql("""
+        SELECT {fields}, proposal.agent, vehicle.vehicle_value, vehicle.custom_manufacturing_year
+        FROM `tabInsurance Policy` policy
+        LEFT JOIN `tabInsurance Proposal` proposal ON proposal.name = policy.insurance_proposal
+        LEFT JOIN `tabVehicle` vehicle ON vehicle.name = policy.vehicle
+        WHERE policy.name IN %(policies)s
+            AND NOT EXISTS (
+                SELECT 1 FROM `tabPolicy Renewal` renewal
+                WHERE renewal.insurance_policy = policy.name
+            )
+        ORDER BY policy.policy_end_date, policy.name
+    """.format(fields=", ".join(f"policy.{field}" for field in RENEWAL_POLICY_FIELDS)),
+        {"policies": policies}, as_dict=1)
+
+    ratings = rate_renewals(rows)
+
+    created = []
+    for policy in rows:
+        try:
+            frappe.db.savepoint("renewal_proposal")
+            created.append(create_renewal_proposal(policy, ratings.get(policy.name)))
+        except frappe.DuplicateEntryError:
+            # Renewed by a concurrent job for an overlapping chunk
+            frappe.db.rollback(save_point="renewal_proposal")
+        except Exception:
+            frappe.db.rollback(save_point="renewal_proposal")
+            frappe.clear_messages()
+            frappe.log_error(title=_("Renewal proposal failed for policy {0}").format(policy.name))
+
+    frappe.db.commit()
+    return created
+
+def rate_renewals(policies):
+    """
+    Renewal NCB and premium for policy rows (with vehicle value and manufacturing year).
+
+    Claim-free years come from one aggregate query for all rows. Per plan, the IDV,
+    the NCB slab and the premium (with the plan's mandatory add-ons) are computed
+    vectorized, the same way the proposal and the rating engine compute them one by one.
+    Returns {policy name: {"claim_free_years", "ncb_percent", "premium"}}.
+    """
+    claim_free_years = get_claim_free_years([policy.name for policy in policies])
+    current_year = getdate(today()).year
+
+    by_plan = {}
+    for policy in policies:
+        if policy.insurance_plan and policy.vehicle_value and policy.custom_manufacturing_year:
+            by_plan.setdefault(policy.insurance_plan, []).append(policy)
+
+    ratings = {}
+    for plan, plan_policies in by_plan.items():
+        rating = get_plan_rating(plan)
+        if not rating:
+            continue
+
+        years = [claim_free_years.get(policy.name, 0) for policy in plan_policies]
+        ages_months = [flt(current_year - cint(policy.custom_manufacturing_year), 2) * 12 for policy in plan_policies]
+        idvs = calculate_idv_bulk(rating, [flt(policy.vehicle_value) for policy in plan_policies], ages_months)
+        ncb_percents = calculate_ncb_bulk(rating, years).tolist()
+
+        mandatory = [addon.addon for addon in rating.addons.values() if addon.mandatory]
+        premiums = compute_premium_batch(
+            rating, idvs.tolist(), [mandatory] * len(plan_policies), ncb_percents
+        )
+
+        for policy, policy_years, ncb_percent, premium in zip(plan_policies, years, ncb_percents, premiums):
+            ratings[policy.name] = {
+                "claim_free_years": policy_years,
+                "ncb_percent": ncb_percent,
+                "premium": premium,
+            }
+
+    return ratings
+
+def create_renewal_proposal(policy, rating=None):
+    """
+    Draft renewal proposal for a `RENEWAL_POLICY_FIELDS` row, recorded in a Policy Renewal.
+    `rating` (from `rate_renewals`) fills in the NCB and premium.
+    """
+    start_date = add_days(policy.policy_end_date, 1)
 
-    # Create new Proposal
     proposal = frappe.new_doc("Insurance Proposal")
-    proposal.customer = policy_data.customer
-    proposal.vehicle = policy_data.vehicle
-    proposal.insurance_plan = policy_data.insurance_plan
-    proposal.proposal_date = frappe.utils.today()
-    proposal.policy_duration_from = add_days(policy_data.policy_end_date, 1) if hasattr(policy_data, 'policy_end_date') else frappe.utils.today()
-    # proposal.policy_duration_to = ... (Need to calculate based on plan)
-    
-    # Just a stub for now
-    proposal.save(ignore_permissions=True)
-    frappe.log_error(f"Created Renewal Proposal {proposal.name}", "Renewal Job")
+    # One renewal per policy term, so the proposal number is derived from the policy
+    proposal.proposal_number = f"REN-{policy.name}"
+    proposal.customer = policy.customer
+    proposal.agent = policy.agent or "Administrator"
+    proposal.vehicle = policy.vehicle
+    proposal.insurance_plan = policy.insurance_plan
+    proposal.proposal_date = today()
+    proposal.policy_duration_from = start_date
+    proposal.policy_duration_to = add_days(add_years(start_date, 1), -1)
+    if rating:
+        premium = rating["premium"]
+        proposal.claim_free_years = rating["claim_free_years"]
+        proposal.no_claim_bonus_percent = rating["ncb_percent"]
+        proposal.own_damage_premium = flt(premium["od_premium"], 2)
+        proposal.third_party_premium = flt(premium["tp_premium"], 2)
+        proposal.addon_premium = flt(premium["addon_premium"], 2)
+        proposal.tax_amount = flt(premium["total_gst"], 2)
+    proposal.insert(ignore_permissions=True)
+
+    frappe.get_doc({
+        "doctype": "Policy Renewal",
+        "insurance_policy": policy.name,
+        "renewal_proposal": proposal.name,
+        "status": "Proposal Created",
+    }).insert(ignore_permissions=True)
+
+    return proposal.name
+
+def get_renewal_checkpoint():
+    return json.loads(frappe.db.get_global(RENEWAL_CHECKPOINT) or "{}")
+
+def set_renewal_checkpoint(checkpoint):
+    frappe.db.set_global(RENEWAL_CHECKPOINT, json.dumps(checkpoint))
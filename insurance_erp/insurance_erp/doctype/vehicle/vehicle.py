@@ -1,4 +1,138 @@
+import json
+
+import frappe
 from frappe.model.document import Document
+from frappe.utils import cint, flt, getdate, now_datetime, today
+
+from insurance_erp.insurance_erp.api.idv_calculator import calculate_idv_bulk
+from insurance_erp.insurance_erp.api.plan_rating import get_plan_rating
+
+FLEET_IDV_CHUNK_SIZE = 5000
+FLEET_IDV_CHECKPOINT = "insurance_fleet_idv_checkpoint"
 
 class Vehicle(Document):
     pass
+
+@frappe.whitelist()
+def enqueue_fleet_idv_recompute():
+    """Resume today's fleet IDV recomputation, or run it again if it already finished"""
+    frappe.only_for("System Manager")
+    frappe.enqueue(
+        "insurance_erp.insurance_erp.doctype.vehicle.vehicle.recompute_fleet_idv",
+        queue="long",
+        timeout=3600,
+        job_id="insurance_fleet_idv_recompute",
+        deduplicate=True,
+        restart=True,
+    )
+
+def recompute_fleet_idv(chunk_size=FLEET_IDV_CHUNK_SIZE, restart=False):
+    """
+    Nightly job: refresh `custom_vehicle_idv` for every Vehicle from the depreciation
+    slabs of the plan on its active policy.
+
+    Vehicles are streamed in keyset-paginated chunks (by name). After each chunk the
+    changed IDVs are written with one UPDATE, the transaction is committed and a
+    checkpoint is stored, so a crashed run resumes where it stopped on the same day.
+    A run that already finished today is only repeated with `restart`.
+    """
+    checkpoint = get_fleet_idv_checkpoint()
+    if checkpoint.get("run_date") == today() and checkpoint.get("finished") and not restart:
+        return checkpoint
+
+    if checkpoint.get("run_date") != today() or checkpoint.get("finished"):
+        checkpoint = {"run_date": today(), "after": "", "processed": 0, "updated": 0, "finished": 0}
+
+    current_year = getdate(today()).year
+
+    while True:
+        vehicles = get_fleet_idv_chunk(checkpoint["after"], chunk_size)
+        if not vehicles:
+            break
+
+        changed = compute_fleet_idv_changes(vehicles, current_year)
+        update_vehicle_idvs(changed)
+
+        checkpoint["after"] = vehicles[-1].name
+        checkpoint["processed"] += len(vehicles)
+        checkpoint["updated"] += len(changed)
+        set_fleet_idv_checkpoint(checkpoint)
+        frappe.db.commit()
+
+        frappe.publish_realtime("insurance_fleet_idv_progress", checkpoint)
+
+    checkpoint["finished"] = 1
+    checkpoint["finished_on"] = str(now_datetime())
+    set_fleet_idv_checkpoint(checkpoint)
+    frappe.db.commit()
+
+    frappe.publish_realtime("insurance_fleet_idv_progress", checkpoint)
+    return checkpoint
+
+def get_fleet_idv_chunk(after, chunk_size):
+    """Next `chunk_size` vehicles after `after` with the plan of their latest active policy"""
+    return frappe.db.sql("""
+        SELECT
+            v.name,
+            v.vehicle_value,
+            v.custom_manufacturing_year,
+            v.custom_vehicle_idv,
+            (
+                SELECT p.insurance_plan
+                FROM `tabInsurance Policy` p
+                WHERE p.vehicle = v.name AND p.status = 'Active'
+                ORDER BY p.policy_end_date DESC
+                LIMIT 1
+            ) AS insurance_plan
+        FROM `tabVehicle` v
+        WHERE v.name > %(after)s
+        ORDER BY v.name
+        LIMIT %(chunk_size)s
+    """, {"after": after or "", "chunk_size": cint(chunk_size)}, as_dict=1)
+
+def compute_fleet_idv_changes(vehicles, current_year):
+    """
+    Depreciated IDV for a chunk of vehicles, vectorized per plan.
+    Returns {vehicle name: new IDV} for the vehicles whose IDV changed.
+    """
+    by_plan = {}
+    for vehicle in vehicles:
+        if vehicle.insurance_plan and vehicle.vehicle_value and vehicle.custom_manufacturing_year:
+            by_plan.setdefault(vehicle.insurance_plan, []).append(vehicle)
+
+    changed = {}
+    for plan, plan_vehicles in by_plan.items():
+        rating = get_plan_rating(plan)
+        if not rating:
+            continue
+
+        ages_months = [max(current_year - cint(v.custom_manufacturing_year), 0) * 12 for v in plan_vehicles]
+        idvs = calculate_idv_bulk(rating, [flt(v.vehicle_value) for v in plan_vehicles], ages_months)
+
+        for vehicle, idv in zip(plan_vehicles, idvs.tolist()):
+            if abs(flt(vehicle.custom_vehicle_idv) - idv) >= 0.01:
+                changed[vehicle.name] = idv
+
+    return changed
+
+def update_vehicle_idvs(idvs):
+    """Write {vehicle name: IDV} with a single UPDATE ... CASE statement"""
+    if not idvs:
+        return
+
+    cases, values = [], []
+    for name, idv in idvs.items():
+        cases.append("WHEN %s THEN %s")
+        values.extend([name, idv])
+
+    frappe.db.sql("""
+        UPDATE `tabVehicle`
+        SET custom_vehicle_idv = CASE name {cases} END
+        WHERE name IN ({names})
+    """.format(cases=" ".join(cases), names=", ".join(["%s"] * len(idvs))), values + list(idvs))
+
+def get_fleet_idv_checkpoint():
+    return json.loads(frappe.db.get_global(FLEET_IDV_CHECKPOINT) or "{}")
+
+def set_fleet_idv_checkpoint(checkpoint):
+    frappe.db.set_global(FLEET_IDV_CHECKPOINT, json.dumps(checkpoint))
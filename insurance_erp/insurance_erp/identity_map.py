@@ -0,0 +1,73 @@
+# Copyright (c) 2026, Insurance Solutions Inc and contributors
+# For license information, please see license.txt
+
+"""
+Request-scoped identity map for documents read during validation.
+
+Controller validate chains and doc events read the same linked records
+(the claim's policy, the proposal's vehicle, ...) several times per request.
+These helpers fetch each (doctype, name) at most once per request and, where
+only a few columns are needed, fetch only those columns. The map lives on
+`frappe.local`, so it is dropped at the end of every request or job.
+
+Only use it for reads. Call `forget` after writing to a record through
+`db_set` / `frappe.db.set_value` in the same request.
+"""
+
+import frappe
+
+
+def get_doc(doctype, name):
+	"""Full document, loaded once per request. Treat it as read-only."""
+	entry = _get_entry(doctype, name)
+	if entry.get("doc") is None:
+		entry["doc"] = frappe.get_doc(doctype, name)
+	return entry["doc"]
+
+
+def get_values(doctype, name, fields):
+	"""frappe._dict of `fields` for a record; columns already fetched in this request are reused"""
+	entry = _get_entry(doctype, name)
+	if entry.get("doc") is not None:
+		return frappe._dict({field: entry["doc"].get(field) for field in fields})
+
+	values = entry.setdefault("values", frappe._dict())
+	missing = [field for field in fields if field not in values]
+	if missing:
+		row = frappe.db.get_value(doctype, name, missing, as_dict=True)
+		if row is None:
+			frappe.throw(
+				frappe._("{0} {1} not found").format(frappe._(doctype), name), frappe.DoesNotExistError
+			)
+		values.update(row)
+
+	return frappe._dict({field: values[field] for field in fields})
+
+
+def get_value(doctype, name, field):
+	return get_values(doctype, name, [field])[field]
+
+
+def forget(doctype, name=None):
+	"""Drop one record (or every record of `doctype`) from the map"""
+	identity_map = _get_map()
+	if name:
+		identity_map.pop((doctype, name), None)
+	else:
+		for key in [key for key in identity_map if key[0] == doctype]:
+			identity_map.pop(key)
+
+
+def clear():
+	frappe.local.insurance_identity_map = {}
+
+
+def _get_entry(doctype, name):
+	return _get_map().setdefault((doctype, name), {})
+
+
+def _get_map():
+	identity_map = getattr(frappe.local, "insurance_identity_map", None)
+	if identity_map is None:
+		identity_map = frappe.local.insurance_identity_map = {}
+	return identity_map
@@ -0,0 +1,151 @@
+# Copyright (c) 2026, Insurance Solutions Inc and contributors
+# For license information, please see license.txt
+
+"""
+Background pipeline for customer notifications.
+
+Doc events only push a small (event, doctype, name) entry onto a Redis list
+once their transaction commits. A scheduled job drains the list at most
+`NOTIFICATIONS_PER_RUN` entries a minute, loads the referenced records and
+customer emails with one query per doctype, renders the email template
+(compiled once per template name + modified) and queues the emails.
+
+Events:
+- "policy_activated" for a policy Sales Invoice that became Active
+- "claim_status_changed" for an Insurance Claim whose status changed
+"""
+
+import json
+
+import frappe
+
+from insurance_erp.insurance_erp.doctype.insurance_system_settings.insurance_system_settings import (
+	get_insurance_settings,
+)
+
+QUEUE_KEY = "insurance_notification_queue"
+NOTIFICATIONS_PER_RUN = 200
+
+POLICY_ACTIVATED = "policy_activated"
+CLAIM_STATUS_CHANGED = "claim_status_changed"
+
+# Notification setting that enables each event
+EVENT_SETTINGS = {
+	POLICY_ACTIVATED: "notify_customer_on_policy_activation",
+	CLAIM_STATUS_CHANGED: "notify_customer_on_claim_status_change",
+}
+
+# {(site, template): (modified, subject template, body template)}
+_compiled_templates = {}
+
+
+def queue_notifications(event, doctype, names):
+	"""Queue `event` for each of `names`, once the current transaction commits"""
+	settings = get_insurance_settings()
+	if not names or not settings.notification_email_template or not getattr(settings, EVENT_SETTINGS[event]):
+		return
+
+	entries = [json.dumps({"event": event, "doctype": doctype, "name": name}) for name in names]
+	frappe.db.after_commit.add(lambda: _push(entries))
+
+
+def _push(entries):
+	cache = frappe.cache()
+	for entry in entries:
+		cache.rpush(QUEUE_KEY, entry)
+
+
+def send_queued_notifications():
+	"""
+	Scheduled every minute: send up to `NOTIFICATIONS_PER_RUN` queued notifications.
+	The batch is only removed from the queue once it has been processed, so nothing is lost
+	while the email template is missing or if the worker dies (it is sent again instead).
+	"""
+	settings = get_insurance_settings()
+	template = settings.notification_email_template and get_compiled_template(settings.notification_email_template)
+	if not template:
+		return
+
+	cache = frappe.cache()
+	entries = cache.lrange(QUEUE_KEY, 0, NOTIFICATIONS_PER_RUN - 1)
+	if not entries:
+		return
+
+	send_batch(template, entries)
+	# New entries are pushed onto the other end, so this drops exactly the processed batch
+	cache.ltrim(QUEUE_KEY, len(entries), -1)
+
+
+def send_batch(template, entries):
+	by_doctype = {}
+	for entry in entries:
+		entry = json.loads(frappe.safe_decode(entry))
+		by_doctype.setdefault(entry["doctype"], []).append(entry)
+
+	for doctype, doctype_entries in by_doctype.items():
+		records = get_records(doctype, {entry["name"] for entry in doctype_entries})
+		emails = get_customer_emails({record.customer for record in records.values() if record.customer})
+
+		for entry in doctype_entries:
+			record = records.get(entry["name"])
+			recipient = record and emails.get(record.customer)
+			if not recipient:
+				continue
+
+			try:
+				send_notification(template, entry["event"], record, recipient)
+			except Exception:
+				frappe.log_error(title=f"Insurance notification failed: {doctype} {entry['name']}")
+
+
+def send_notification(template, event, record, recipient):
+	_modified, subject, body = template
+	context = {"doc": record, "event": event}
+	frappe.sendmail(
+		recipients=[recipient],
+		subject=subject.render(context),
+		message=body.render(context),
+		reference_doctype=record.doctype,
+		reference_name=record.name,
+	)
+
+
+def get_records(doctype, names):
+	"""{name: row} with all columns, in one query"""
+	rows = frappe.get_all(doctype, filters={"name": ["in", list(names)]}, fields=["*"])
+	for row in rows:
+		row.doctype = doctype
+	return {row.name: row for row in rows}
+
+
+def get_customer_emails(customers):
+	if not customers:
+		return {}
+	rows = frappe.get_all(
+		"Customer", filters={"name": ["in", list(customers)]}, fields=["name", "email_id"]
+	)
+	return {row.name: row.email_id for row in rows if row.email_id}
+
+
+def get_compiled_template(name):
+	"""(modified, subject template, body template) for an Email Template, compiled once per version"""
+	modified = frappe.db.get_value("Email Template", name, "modified")
+	if not modified:
+		return None
+
+	key = (frappe.local.site, name)
+	compiled = _compiled_templates.get(key)
+	if compiled and compiled[0] == modified:
+		return compiled
+
+	template = frappe.db.get_value(
+		"Email Template", name, ["subject", "response", "response_html", "use_html"], as_dict=True
+	)
+	jenv = frappe.get_jenv()
+	body = template.response_html if template.use_html else template.response
+	compiled = _compiled_templates[key] = (
+		modified,
+		jenv.from_string(template.subject or ""),
+		jenv.from_string(body or ""),
+	)
+	return compiled
@@ -0,0 +1,118 @@
+// Copyright (c) 2026, Insurance Solutions Inc and contributors
+// For license information, please see license.txt
+
+frappe.query_reports["Active Policies"] = {
+    filters: [
+        {
+            fieldname: "customer",
+            label: __("Customer"),
+            fieldtype: "Link",
+            options: "Customer",
+            on_change: reset_page
+        },
+        {
+            fieldname: "vehicle",
+            label: __("Vehicle"),
+            fieldtype: "Link",
+            options: "Vehicle",
+            on_change: reset_page
+        },
+        {
+            fieldname: "insurance_plan",
+            label: __("Insurance Plan"),
+            fieldtype: "Link",
+            options: "Insurance Plan",
+            on_change: reset_page
+        },
+        {
+            fieldname: "from_date",
+            label: __("End Date From"),
+            fieldtype: "Date",
+            on_change: reset_page
+        },
+        {
+            fieldname: "to_date",
+            label: __("End Date To"),
+            fieldtype: "Date",
+            on_change: reset_page
+        },
+        // Keyset of the last row shown, set by "Next Page"
+        {
+            fieldname: "after_date",
+            fieldtype: "Date",
+            hidden: 1
+        },
+        {
+            fieldname: "after_policy",
+            fieldtype: "Data",
+            hidden: 1
+        }
+    ],
+
+    onload: function (report) {
+        report.page.add_inner_button(__("First Page"), function () {
+            set_page(null, null);
+        });
+
+        report.page.add_inner_button(__("Next Page"), function () {
+            let data = (frappe.query_report.data || []).filter(row => row.policy_number);
+            if (!data.length) {
+                frappe.show_alert({ message: __("No more policies"), indicator: "orange" });
+                return;
+            }
+            let last = data[data.length - 1];
+            set_page(last.policy_end_date, last.policy_number);
+        });
+
+        ["CSV", "Excel"].forEach(file_format => {
+            report.page.add_inner_button(__(file_format), function () {
+                frappe.call({
+                    method: "insurance_erp.insurance_erp.report.active_policies.active_policies.enqueue_export",
+                    args: {
+                        filters: frappe.query_report.get_filter_values(),
+                        file_format: file_format
+                    },
+                    callback: function () {
+                        frappe.show_alert({
+                            message: __("Exporting in the background, you will be notified when the file is ready"),
+                            indicator: "blue"
+                        });
+                    }
+                });
+            }, __("Export All"));
+        });
+
+        frappe.realtime.on("insurance_report_export_ready", function (data) {
+            if (data.report !== "Active Policies") return;
+            frappe.msgprint({
+                title: __("Export Ready"),
+                message: `<a href="${encodeURI(data.file_url)}" target="_blank">${frappe.utils.escape_html(data.file_name)}</a>`,
+                indicator: "green"
+            });
+        });
+
+        frappe.realtime.on("insurance_report_export_failed", function (data) {
+            if (data.report !== "Active Policies") return;
+            frappe.msgprint({
+                title: __("Export Failed"),
+                message: __("The export could not be created. Please try again or contact your System Manager."),
+                indicator: "red"
+            });
+        });
+    }
+};
+
+function set_page(after_date, after_policy) {
+    frappe.query_report.get_filter("after_date").set_input(after_date);
+    frappe.query_report.get_filter("after_policy").set_input(after_policy);
+    frappe.query_report.refresh();
+}
+
+function reset_page() {
+    let after_policy = frappe.query_report.get_filter("after_policy");
+    if (after_policy && after_policy.get_value()) {
+        frappe.query_report.get_filter("after_date").set_input(null);
+        after_policy.set_input(null);
+    }
+    frappe.query_report.refresh();
+}
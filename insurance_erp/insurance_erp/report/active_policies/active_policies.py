@@ -1,64 +1,168 @@
 # Copyright (c) 2026, Insurance Solutions Inc
 # Active Policies Report
 
+import json
+
 import frappe
+from frappe import _
+from frappe.utils import cint
+
+from insurance_erp.insurance_erp.api import report_export
+
+REPORT_NAME = "Active Policies"
+PAGE_LENGTH = 500
+EXPORT_CHUNK_SIZE = 5000
+
+COLUMNS = [
+	{
+		"fieldname": "policy_number",
+		"label": "Policy Number",
+		"fieldtype": "Data",
+		"width": 150
+	},
+	{
+		"fieldname": "customer",
+		"label": "Customer",
+		"fieldtype": "Link",
+		"options": "Customer",
+		"width": 180
+	},
+	{
+		"fieldname": "vehicle",
+		"label": "Vehicle",
+		"fieldtype": "Link",
+		"options": "Vehicle",
+		"width": 150
+	},
+	{
+		"fieldname": "insurance_plan",
+		"label": "Plan",
+		"fieldtype": "Link",
+		"options": "Insurance Plan",
+		"width": 120
+	},
+	{
+		"fieldname": "policy_start_date",
+		"label": "Start Date",
+		"fieldtype": "Date",
+		"width": 100
+	},
+	{
+		"fieldname": "policy_end_date",
+		"label": "End Date",
+		"fieldtype": "Date",
+		"width": 100
+	},
+	{
+		"fieldname": "total_premium_payable",
+		"label": "Total Premium",
+		"fieldtype": "Currency",
+		"width": 120
+	},
+	{
+		"fieldname": "status",
+		"label": "Status",
+		"fieldtype": "Data",
+		"width": 100
+	}
+]
+
+# The only filters accepted, all compared for equality except the end date range
+FILTER_CONDITIONS = {
+	"customer": "customer = %(customer)s",
+	"vehicle": "vehicle = %(vehicle)s",
+	"insurance_plan": "insurance_plan = %(insurance_plan)s",
+	"from_date": "policy_end_date >= %(from_date)s",
+	"to_date": "policy_end_date <= %(to_date)s",
+}
 
 def execute(filters=None):
-	columns = [
-		{
-			"fieldname": "policy_number",
-			"label": "Policy Number",
-			"fieldtype": "Data",
-			"width": 150
-		},
-		{
-			"fieldname": "customer",
-			"label": "Customer",
-			"fieldtype": "Link",
-			"options": "Customer",
-			"width": 180
-		},
-		{
-			"fieldname": "vehicle",
-			"label": "Vehicle",
-			"fieldtype": "Link",
-			"options": "Vehicle",
-			"width": 150
-		},
-		{
-			"fieldname": "policy_start_date",
-			"label": "Start Date",
-			"fieldtype": "Date",
-			"width": 100
-		},
-		{
-			"fieldname": "policy_end_date",
-			"label": "End Date",
-			"fieldtype": "Date",
-			"width": 100
-		},
-		{
-			"fieldname": "total_premium_payable",
-			"label": "Total Premium",
-			"fieldtype": "Currency",
-			"width": 120
-		},
-		{
-			"fieldname": "status",
-			"label": "Status",
-			"fieldtype": "Data",
-			"width": 100
-		}
-	]
-	
-	active_filters = {"status": "Active"}
-	if filters:
-		active_filters.update(filters)
-
-	data = frappe.get_all("Insurance Policy",
-		filters=active_filters,
-		fields=["name as policy_number", "customer", "vehicle", "policy_start_date", "policy_end_date", "total_premium_payable", "status"],
-		order_by="policy_end_date"
+	"""
+	One page of Active policies by end date. The next page starts after the last row
+	shown (the `after_date` / `after_policy` filters set by the "Next Page" button).
+	"""
+	filters = frappe._dict(filters or {})
+	data = get_policies(filters, filters.after_date, filters.after_policy, PAGE_LENGTH + 1)
+
+	message = None
+	if len(data) > PAGE_LENGTH:
+		data = data[:PAGE_LENGTH]
+		message = _("Showing {0} policies. Use Next Page for more, or Export for all of them.").format(PAGE_LENGTH)
+
+	return COLUMNS, data, message
+
+def get_policies(filters, after_date=None, after_policy=None, limit=PAGE_LENGTH):
+	"""
+	Active policies matching `filters` after the keyset (`after_date`, `after_policy`),
+	in (policy_end_date, name) order, read from the (status, policy_end_date) index.
+	"""
+	conditions = ["status = 'Active'"]
+	conditions += [condition for key, condition in FILTER_CONDITIONS.items() if filters.get(key)]
+	values = {key: filters.get(key) for key in FILTER_CONDITIONS}
+
+	if after_date and after_policy:
+		conditions.append("""(
+			policy_end_date > %(after_date)s
+			OR (policy_end_date = %(after_date)s AND name > %(after_policy)s)
+		)""")
+		values.update(after_date=after_date, after_policy=after_policy)
+
+	values["limit"] = cint(limit)
+
+	return frappe.db.sql("""
+		SELECT
+			name AS policy_number,
+			customer,
+			vehicle,
+			insurance_plan,
+			policy_start_date,
+			policy_end_date,
+			total_premium_payable,
+			status
+		FROM `tabInsurance Policy`
+		WHERE {conditions}
+		ORDER BY policy_end_date, name
+		LIMIT %(limit)s
+	""".format(conditions=" AND ".join(conditions)), values, as_dict=1)
+
+def iter_policies(filters, chunk_size=EXPORT_CHUNK_SIZE):
+	"""All Active policies matching `filters`, read in keyset-paginated chunks"""
+	after_date = after_policy = None
+	while True:
+		chunk = get_policies(filters, after_date, after_policy, chunk_size)
+		yield from chunk
+		if len(chunk) < chunk_size:
+			break
+		after_date, after_policy = chunk[-1].policy_end_date, chunk[-1].policy_number
+
+@frappe.whitelist()
+def enqueue_export(filters=None, file_format="CSV"):
+	"""Export every Active policy matching `filters` to a file in the background, the user is notified when it is ready"""
+	report_export.check_report_permission(REPORT_NAME)
+	report_export.validate_file_format(file_format)
+	if isinstance(filters, str):
+		filters = json.loads(filters)
+
+	filters = {key: value for key, value in (filters or {}).items() if key in FILTER_CONDITIONS and value}
+
+	frappe.enqueue(
+		"insurance_erp.insurance_erp.report.active_policies.active_policies.export_in_background",
+		queue="long",
+		timeout=3600,
+		filters=filters,
+		file_format=file_format,
+		user=frappe.session.user,
+	)
+
+def export_in_background(filters, file_format, user):
+	"""Background job: the user gets a Notification Log with the File, or one saying the export failed"""
+	file = report_export.export_to_file(
+		REPORT_NAME,
+		"active_policies",
+		COLUMNS,
+		iter_policies(frappe._dict(filters)),
+		file_format,
+		user,
 	)
-	
-	return columns, data
+	frappe.db.commit()
+	return file.name if file else None
@@ -0,0 +1,93 @@
+// Copyright (c) 2026, Insurance Solutions Inc and contributors
+// For license information, please see license.txt
+
+frappe.query_reports["Claims Summary"] = {
+    filters: [
+        {
+            fieldname: "claim_status",
+            label: __("Claim Status"),
+            fieldtype: "Select",
+            options: "\nReported\nSurvey Assigned\nSurvey Completed\nVerification Assigned\nAgent Verified\nApproved\nRejected\nSettled",
+            on_change: reset_page
+        },
+        {
+            fieldname: "from_date",
+            label: __("From Date"),
+            fieldtype: "Date",
+            on_change: reset_page
+        },
+        {
+            fieldname: "to_date",
+            label: __("To Date"),
+            fieldtype: "Date",
+            on_change: reset_page
+        },
+        {
+            fieldname: "insurance_plan",
+            label: __("Insurance Plan"),
+            fieldtype: "Link",
+            options: "Insurance Plan",
+            on_change: reset_page
+        },
+        {
+            fieldname: "customer",
+            label: __("Customer"),
+            fieldtype: "Link",
+            options: "Customer",
+            on_change: reset_page
+        },
+        // Keyset of the last row shown, set by "Next Page"
+        {
+            fieldname: "after_date",
+            fieldtype: "Date",
+            hidden: 1
+        },
+        {
+            fieldname: "after_claim",
+            fieldtype: "Data",
+            hidden: 1
+        }
+    ],
+
+    onload: function (report) {
+        report.page.add_inner_button(__("First Page"), function () {
+            set_page(null, null);
+        });
+
+        report.page.add_inner_button(__("Next Page"), function () {
+            let data = (frappe.query_report.data || []).filter(row => row.name);
+            if (!data.length) {
+                frappe.show_alert({ message: __("No more claims"), indicator: "orange" });
+                return;
+            }
+            let last = data[data.length - 1];
+            set_page(last.claim_registration_date, last.name);
+        });
+
+        ["CSV", "Excel"].forEach(file_format => {
+            report.page.add_inner_button(__(file_format), function () {
+                let filters = frappe.query_report.get_filter_values();
+                window.open("/api/method/insurance_erp.insurance_erp.report.claims_summary.claims_summary.export?" + $.param({
+                    filters: JSON.stringify(filters),
+                    file_format: file_format
+                }));
+            }, __("Export All"));
+        });
+    }
+};
+
+function set_page(after_date, after_claim) {
+    // Set both without refreshing in between, then refresh once
+    frappe.query_report.get_filter("after_date").set_input(after_date);
+    frappe.query_report.get_filter("after_claim").set_input(after_claim);
+    frappe.query_report.refresh();
+}
+
+function reset_page() {
+    let after_claim = frappe.query_report.get_filter("after_claim");
+    if (after_claim && after_claim.get_value()) {
+        frappe.query_report.get_filter("after_date").set_input(null);
+        after_claim.set_input(null);
+    }
+    frappe.query_report.refresh();
+}
@@ -1,80 +1,170 @@
 # Copyright (c) 2026, Insurance Solutions Inc
 # Claims Summary Report
 
+import json
+
 import frappe
+from frappe import _
+from frappe.utils import cint
+
+from insurance_erp.insurance_erp.api import report_export
+
+REPORT_NAME = "Claims Summary"
+PAGE_LENGTH = 500
+EXPORT_CHUNK_SIZE = 5000
+
+COLUMNS = [
+	{
+		"fieldname": "name",
+		"label": "Claim",
+		"fieldtype": "Link",
+		"options": "Insurance Claim",
+		"width": 150
+	},
+	{
+		"fieldname": "claim_number",
+		"label": "Claim Number",
+		"fieldtype": "Data",
+		"width": 150
+	},
+	{
+		"fieldname": "claim_registration_date",
+		"label": "Registered On",
+		"fieldtype": "Date",
+		"width": 110
+	},
+	{
+		"fieldname": "customer",
+		"label": "Customer",
+		"fieldtype": "Link",
+		"options": "Customer",
+		"width": 150
+	},
+	{
+		"fieldname": "policy_number",
+		"label": "Policy",
+		"fieldtype": "Data",
+		"width": 120
+	},
+	{
+		"fieldname": "insurance_plan",
+		"label": "Plan",
+		"fieldtype": "Link",
+		"options": "Insurance Plan",
+		"width": 120
+	},
+	{
+		"fieldname": "date_of_loss",
+		"label": "Date of Loss",
+		"fieldtype": "Date",
+		"width": 100
+	},
+	{
+		"fieldname": "coverage_type",
+		"label": "Coverage",
+		"fieldtype": "Data",
+		"width": 120
+	},
+	{
+		"fieldname": "claim_amount",
+		"label": "Claim Amount",
+		"fieldtype": "Currency",
+		"width": 120
+	},
+	{
+		"fieldname": "approved_amount",
+		"label": "Approved Amount",
+		"fieldtype": "Currency",
+		"width": 120
+	},
+	{
+		"fieldname": "claim_status",
+		"label": "Status",
+		"fieldtype": "Data",
+		"width": 100
+	}
+]
+
+# Optional filters, all compared for equality except the date range
+FILTER_CONDITIONS = {
+	"claim_status": "claim_status = %(claim_status)s",
+	"from_date": "claim_registration_date >= %(from_date)s",
+	"to_date": "claim_registration_date <= %(to_date)s",
+	"insurance_plan": "insurance_plan = %(insurance_plan)s",
+	"customer": "customer = %(customer)s",
+}
 
 def execute(filters=None):
-	columns = [
-		{
-			"fieldname": "claim_number",
-			"label": "Claim Number",
-			"fieldtype": "Data",
-			"width": 150
-		},
-		{
-			"fieldname": "customer",
-			"label": "Customer",
-			"fieldtype": "Link",
-			"options": "Customer",
-			"width": 150
-		},
-		{
-			"fieldname": "policy_number",
-			"label": "Policy",
-			"fieldtype": "Data",
-			"width": 120
-		},
-		{
-			"fieldname": "date_of_loss",
-			"label": "Date of Loss",
-			"fieldtype": "Date",
-			"width": 100
-		},
-		{
-			"fieldname": "coverage_type",
-			"label": "Coverage",
-			"fieldtype": "Data",
-			"width": 120
-		},
-		{
-			"fieldname": "claim_amount",
-			"label": "Claim Amount",
-			"fieldtype": "Currency",
-			"width": 120
-		},
-		{
-			"fieldname": "approved_amount",
-			"label": "Approved Amount",
-			"fieldtype": "Currency",
-			"width": 120
-		},
-		{
-			"fieldname": "claim_status",
-			"label": "Status",
-			"fieldtype": "Data",
-			"width": 100
-		}
-	]
-	
-	conditions = []
-	if filters and filters.get("claim_status"):
-		conditions.append(f"claim_status = '{filters.get('claim_status')}'")
-	
-	where_clause = " AND " + " AND ".join(conditions) if conditions else ""
-	
-	data = frappe.db.sql(f"""
-		SELECT 
+	"""
+	One page of claims, newest first. The next page starts after the last row shown
+	(the `after_date` / `after_claim` filters set by the "Next Page" button).
+	"""
+	filters = frappe._dict(filters or {})
+	data = get_claims(filters, filters.after_date, filters.after_claim, PAGE_LENGTH + 1)
+
+	message = None
+	if len(data) > PAGE_LENGTH:
+		data = data[:PAGE_LENGTH]
+		message = _("Showing {0} claims. Use Next Page for more, or Export for all of them.").format(PAGE_LENGTH)
+
+	return COLUMNS, data, message
+
+def get_claims(filters, after_date=None, after_claim=None, limit=PAGE_LENGTH):
+	"""
+	Claims matching `filters` after the keyset (`after_date`, `after_claim`), in
+	(claim_registration_date, name) descending order. With a status filter the
+	(claim_status, claim_registration_date) index serves both the filter and the order.
+	"""
+	conditions = [condition for key, condition in FILTER_CONDITIONS.items() if filters.get(key)]
+	values = {key: filters.get(key) for key in FILTER_CONDITIONS}
+
+	if after_date and after_claim:
+		conditions.append("""(
+			claim_registration_date < %(after_date)s
+			OR (claim_registration_date = %(after_date)s AND name < %(after_claim)s)
+		)""")
+		values.update(after_date=after_date, after_claim=after_claim)
+
+	values["limit"] = cint(limit)
+
+	return frappe.db.sql("""
+		SELECT
+			name,
 			claim_number,
+			claim_registration_date,
 			customer,
 			policy_number,
+			insurance_plan,
 			date_of_loss,
 			coverage_type,
 			claim_amount,
 			approved_amount,
 			claim_status
 		FROM `tabInsurance Claim`
-		WHERE 1=1 {where_clause}
-		ORDER BY claim_registration_date DESC
-	""", as_dict=1)
-	
-	return columns, data
+		{where}
+		ORDER BY claim_registration_date DESC, name DESC
+		LIMIT %(limit)s
+	""".format(where="WHERE " + " AND ".join(conditions) if conditions else ""), values, as_dict=1)
+
+def iter_claims(filters, chunk_size=EXPORT_CHUNK_SIZE):
+	"""All claims matching `filters`, read in keyset-paginated chunks"""
+	after_date = after_claim = None
+	while True:
+		chunk = get_claims(filters, after_date, after_claim, chunk_size)
+		yield from chunk
+		if len(chunk) < chunk_size:
+			break
+		after_date, after_claim = chunk[-1].claim_registration_date, chunk[-1].name
+
+@frappe.whitelist()
+def export(filters=None, file_format="CSV"):
+	"""Download every claim matching `filters` (ignoring the page) as CSV or Excel"""
+	report_export.check_report_permission(REPORT_NAME)
+	if isinstance(filters, str):
+		filters = json.loads(filters)
+
+	filters = frappe._dict(filters or {})
+	filters.pop("after_date", None)
+	filters.pop("after_claim", None)
+
+	return report_export.build_response("claims_summary", COLUMNS, iter_claims(filters), file_format)
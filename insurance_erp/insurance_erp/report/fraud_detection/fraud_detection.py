@@ -2,16 +2,43 @@
 # Fraud Detection Report
 
 import frappe
+from frappe import _
+from frappe.utils import flt
+
+from insurance_erp.insurance_erp.api.fraud_scoring import CLOSED_CLAIM_STATUSES
+
+# Highest scores first, served by the fraud_score index
+ROW_LIMIT = 1000
 
 def execute(filters=None):
+	filters = frappe._dict(filters or {})
 	columns = [
 		{
-			"fieldname": "claim_number",
-			"label": "Claim Number",
+			"fieldname": "claim",
+			"label": "Claim",
 			"fieldtype": "Link",
 			"options": "Insurance Claim",
 			"width": 150
 		},
+		{
+			"fieldname": "fraud_score",
+			"label": "Fraud Score",
+			"fieldtype": "Float",
+			"precision": 2,
+			"width": 100
+		},
+		{
+			"fieldname": "indicators",
+			"label": "Indicators",
+			"fieldtype": "Data",
+			"width": 300
+		},
+		{
+			"fieldname": "fraud_suspected",
+			"label": "Suspected",
+			"fieldtype": "Check",
+			"width": 90
+		},
 		{
 			"fieldname": "customer",
 			"label": "Customer",
@@ -45,18 +72,55 @@ def execute(filters=None):
 			"width": 150
 		}
 	]
-	
+
+	conditions = ["(fraud_score >= %(min_score)s OR fraud_suspected = 1)"]
+	values = {"min_score": flt(filters.min_score) or 0.01, "limit": ROW_LIMIT + 1}
+	if filters.claim_status:
+		conditions.append("claim_status = %(claim_status)s")
+		values["claim_status"] = filters.claim_status
+	elif not filters.include_closed:
+		conditions.append("claim_status NOT IN %(closed_statuses)s")
+		values["closed_statuses"] = CLOSED_CLAIM_STATUSES
+
 	data = frappe.db.sql("""
-		SELECT 
-			claim_number,
+		SELECT
+			name AS claim,
+			fraud_score,
+			fraud_suspected,
 			customer,
 			policy_number,
 			claim_amount,
 			claim_status,
 			verification
 		FROM `tabInsurance Claim`
-		WHERE fraud_suspected = 1
-		ORDER BY claim_registration_date DESC
-	""", as_dict=1)
-	
-	return columns, data
+		WHERE {conditions}
+		ORDER BY fraud_score DESC, name
+		LIMIT %(limit)s
+	""".format(conditions=" AND ".join(conditions)), values, as_dict=1)
+
+	message = None
+	if len(data) > ROW_LIMIT:
+		data = data[:ROW_LIMIT]
+		message = _("Showing the {0} highest scored claims. Raise the Minimum Score to narrow the list.").format(ROW_LIMIT)
+
+	indicators = get_indicators([row.claim for row in data])
+	for row in data:
+		row.indicators = ", ".join(indicators.get(row.claim, []))
+
+	return columns, data, message
+
+def get_indicators(claims):
+	"""{claim: ["Indicator (Severity)", ...]} in one query, highest scored first"""
+	if not claims:
+		return {}
+
+	rows = frappe.get_all(
+		"Fraud Indicator",
+		filters={"parenttype": "Insurance Claim", "parent": ["in", claims]},
+		fields=["parent", "indicator", "severity"],
+		order_by="score desc, idx",
+	)
+	indicators = {}
+	for row in rows:
+		indicators.setdefault(row.parent, []).append(f"{_(row.indicator)} ({_(row.severity)})")
+	return indicators
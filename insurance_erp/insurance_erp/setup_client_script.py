@@ -13,14 +13,27 @@ frappe.ui.form.on('Sales Order', {
         });
         
         frm.set_query("insurance_plan", function() {
+            // Only plans whose vehicle type and engine CC band fit the selected vehicle
             return {
+                query: "insurance_erp.insurance_erp.api.plan_eligibility.eligible_plan_query",
                 filters: {
-                    active: 1
+                    vehicle: frm.doc.vehicle
                 }
             };
         });
     },
     
+    refresh: function(frm) {
+        if (frm.doc.is_insurance_proposal && frm.doc.docstatus === 0) {
+            frm.add_custom_button(__("Compare Plans"), function() {
+                frm.trigger('show_quote_matrix');
+            });
+            frm.add_custom_button(__("Get Quote"), function() {
+                frm.trigger('create_quote');
+            });
+        }
+    },
+
     is_insurance_proposal: function(frm) {
         frm.toggle_reqd("insurance_plan", frm.doc.is_insurance_proposal);
         frm.toggle_reqd("vehicle", frm.doc.is_insurance_proposal);
@@ -54,54 +67,154 @@ frappe.ui.form.on('Sales Order', {
     },
     
     calculate_premium: function(frm) {
-        if (!frm.doc.is_insurance_proposal || !frm.doc.insurance_plan || !frm.doc.idv) return;
+        // Inputs changed, so the previous quote no longer applies. Edits only preview the
+        // premium (nothing is stored), bursts of edits make one call.
+        if (frm.doc.insurance_quote) {
+            frm.set_value("insurance_quote", null);
+        }
+        preview_premium(frm);
+    },
 
-        let addons = [];
-        if (frm.doc.proposal_addons) {
-            addons = frm.doc.proposal_addons.map(row => row.addon);
+    create_quote: function(frm) {
+        if (!frm.doc.insurance_plan || !frm.doc.idv) {
+            frappe.msgprint(__("Please set Insurance Plan and IDV to get a quote"));
+            return;
         }
 
         frappe.call({
-            method: "insurance_erp.insurance_erp.api.premium_calculator.calculate_premium",
+            // Stored as a quote (or an unexpired one for the same inputs is reused),
+            // so the server keeps this premium on save while it is valid
+            method: "insurance_erp.insurance_erp.doctype.insurance_quote.insurance_quote.create_quote",
+            args: get_premium_args(frm),
+            freeze: true,
+            callback: function(r) {
+                if (r.message && r.message.quote_id) {
+                    set_premium(frm, r.message);
+                    frm.set_value("insurance_quote", r.message.quote_id);
+                    frappe.show_alert({
+                        message: __("Quote valid till {0}", [frappe.datetime.str_to_user(r.message.valid_till)]),
+                        indicator: "green"
+                    });
+                }
+            }
+        });
+    },
+
+    show_quote_matrix: function(frm) {
+        if (!frm.doc.vehicle || !frm.doc.idv) {
+            frappe.msgprint(__("Please set Vehicle and IDV to compare plans"));
+            return;
+        }
+
+        frappe.call({
+            method: "insurance_erp.insurance_erp.api.premium_calculator.get_quote_matrix",
             args: {
-                plan: frm.doc.insurance_plan,
                 vehicle: frm.doc.vehicle,
                 idv: frm.doc.idv,
-                addons: JSON.stringify(addons),
                 ncb_percent: frm.doc.ncb_percent
             },
+            freeze: true,
             callback: function(r) {
-                if (r.message) {
-                    frm.set_value("od_premium", r.message.od_premium);
-                    frm.set_value("tp_premium", r.message.tp_premium);
-                    frm.set_value("addon_premium", r.message.addon_premium);
-                    frm.set_value("total_net_premium", r.message.total_net_premium);
-                    frm.set_value("total_gst", r.message.total_gst);
-                    frm.set_value("grand_total_premium", r.message.grand_total_premium);
-                    
-                    if (r.message.addon_details) {
-                        r.message.addon_details.forEach(det => {
-                            let row = (frm.doc.proposal_addons || []).find(d => d.addon === det.addon);
-                            if (row) {
-                                frappe.model.set_value(row.doctype, row.name, "premium_amount", det.premium_amount);
-                            }
-                        });
-                        frm.refresh_field("proposal_addons");
-                    }
-                    
-                    // Update Item Rate logic in Client Script for immediate feedback
-                    // Find the plan item
-                    let items = frm.doc.items || [];
-                    let plan_item = items.find(i => i.item_code === frm.doc.insurance_plan);
-                    if (plan_item) {
-                        frappe.model.set_value(plan_item.doctype, plan_item.name, "rate", r.message.total_net_premium);
-                    }
+                let matrix = r.message;
+                if (!matrix || !matrix.plans || !matrix.plans.length) {
+                    frappe.msgprint(__("No active plan matches this vehicle"));
+                    return;
                 }
+
+                let money = value => format_currency(value, frm.doc.currency);
+                let header = [__("Plan"), __("Policy Type"), __("Base Premium")]
+                    .concat(matrix.addons.map(addon => __("+ {0}", [addon])))
+                    .concat([__("All Add-ons")]);
+
+                let rows = matrix.plans.map(plan => {
+                    let cells = [
+                        `<a class="select-plan" data-plan="${encodeURIComponent(plan.plan)}">${frappe.utils.escape_html(plan.plan)}</a>`,
+                        frappe.utils.escape_html(plan.policy_type || ""),
+                        money(plan.base.grand_total_premium)
+                    ];
+                    matrix.addons.forEach(addon => {
+                        let quote = plan.with_addon[addon];
+                        cells.push(quote ? money(quote.grand_total_premium) : "-");
+                    });
+                    cells.push(money(plan.with_all_addons.grand_total_premium));
+                    return `<tr>${cells.map(c => `<td>${c}</td>`).join("")}</tr>`;
+                });
+
+                let d = new frappe.ui.Dialog({
+                    title: __("Plan Comparison for {0}", [frm.doc.vehicle]),
+                    size: "extra-large",
+                    fields: [{ fieldname: "matrix", fieldtype: "HTML" }]
+                });
+                d.fields_dict.matrix.$wrapper.html(`
+                    <div class="table-responsive">
+                        <table class="table table-bordered table-condensed">
+                            <thead><tr>${header.map(h => `<th>${frappe.utils.escape_html(h)}</th>`).join("")}</tr></thead>
+                            <tbody>${rows.join("")}</tbody>
+                        </table>
+                    </div>
+                    <p class="text-muted small">${__("Grand total incl. GST. Click a plan to select it.")}</p>
+                `);
+                d.fields_dict.matrix.$wrapper.find(".select-plan").on("click", function() {
+                    frm.set_value("insurance_plan", decodeURIComponent($(this).attr("data-plan")));
+                    d.hide();
+                });
+                d.show();
             }
         });
     }
 });
 
+const preview_premium = frappe.utils.debounce(function(frm) {
+    if (!frm.doc.is_insurance_proposal || !frm.doc.insurance_plan || !frm.doc.idv) return;
+
+    frappe.call({
+        method: "insurance_erp.insurance_erp.api.premium_calculator.calculate_premium",
+        args: get_premium_args(frm),
+        callback: function(r) {
+            if (r.message) {
+                set_premium(frm, r.message);
+            }
+        }
+    });
+}, 500);
+
+function get_premium_args(frm) {
+    return {
+        plan: frm.doc.insurance_plan,
+        vehicle: frm.doc.vehicle,
+        idv: frm.doc.idv,
+        addons: JSON.stringify((frm.doc.proposal_addons || []).map(row => row.addon)),
+        ncb_percent: frm.doc.ncb_percent
+    };
+}
+
+function set_premium(frm, premium) {
+    frm.set_value("od_premium", premium.od_premium);
+    frm.set_value("tp_premium", premium.tp_premium);
+    frm.set_value("addon_premium", premium.addon_premium);
+    frm.set_value("total_net_premium", premium.total_net_premium);
+    frm.set_value("total_gst", premium.total_gst);
+    frm.set_value("grand_total_premium", premium.grand_total_premium);
+
+    if (premium.addon_details) {
+        premium.addon_details.forEach(det => {
+            let row = (frm.doc.proposal_addons || []).find(d => d.addon === det.addon);
+            if (row) {
+                frappe.model.set_value(row.doctype, row.name, "premium_amount", det.premium_amount);
+            }
+        });
+        frm.refresh_field("proposal_addons");
+    }
+
+    // Update Item Rate logic in Client Script for immediate feedback
+    // Find the plan item
+    let items = frm.doc.items || [];
+    let plan_item = items.find(i => i.item_code === frm.doc.insurance_plan);
+    if (plan_item) {
+        frappe.model.set_value(plan_item.doctype, plan_item.name, "rate", premium.total_net_premium);
+    }
+}
+
 frappe.ui.form.on('Proposal Addon', {
     proposal_addons_remove: function(frm) {
         frm.trigger('calculate_premium');
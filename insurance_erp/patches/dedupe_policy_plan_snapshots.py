@@ -0,0 +1,100 @@
+# Copyright (c) 2026, Insurance Solutions Inc and contributors
+# For license information, please see license.txt
+
+"""
+Move the full plan copies on existing policies into Insurance Plan Versions.
+
+Every policy's `plan_snapshot_json` is replaced by a link to the version with
+the same content, and coverage rows that are identical to the version's
+coverages are dropped. Policies whose coverage rows differ from their plan
+keep them as policy-specific coverages. Runs in chunks and commits after
+each one, so it can be re-run after an interruption.
+"""
+
+import json
+
+import frappe
+from frappe.utils import flt
+
+from insurance_erp.insurance_erp.doctype.insurance_plan_version.insurance_plan_version import (
+	get_or_create_plan_version,
+	get_plan_version_coverages,
+)
+
+CHUNK_SIZE = 1000
+COVERAGE_FIELDS = ("coverage_type", "limit_type", "limit_value", "deductible")
+
+
+def execute():
+	after = ""
+	while True:
+		policies = frappe.db.sql(
+			"""
+			SELECT name, plan_snapshot_json
+			FROM `tabInsurance Policy`
+			WHERE name > %(after)s
+				AND IFNULL(plan_version, '') = ''
+				AND IFNULL(plan_snapshot_json, '') != ''
+			ORDER BY name
+			LIMIT %(limit)s
+		""",
+			{"after": after, "limit": CHUNK_SIZE},
+			as_dict=True,
+		)
+		if not policies:
+			break
+
+		migrate_chunk(policies)
+		frappe.db.commit()
+		after = policies[-1].name
+
+
+def migrate_chunk(policies):
+	by_version = {}
+	for policy in policies:
+		try:
+			plan = json.loads(policy.plan_snapshot_json)
+		except ValueError:
+			continue
+		if not isinstance(plan, dict) or not plan.get("name"):
+			continue
+		by_version.setdefault(get_or_create_plan_version(plan), []).append(policy.name)
+
+	for version, names in by_version.items():
+		frappe.db.sql(
+			"""
+			UPDATE `tabInsurance Policy`
+			SET plan_version = %s, plan_snapshot_json = NULL
+			WHERE name IN %s
+		""",
+			(version, names),
+		)
+		drop_plan_coverage_rows(version, names)
+
+
+def drop_plan_coverage_rows(version, policies):
+	"""Delete the coverage rows of `policies` that only repeat the plan version's coverages"""
+	plan_coverages = sorted(_coverage_key(row) for row in get_plan_version_coverages(version))
+
+	rows = frappe.get_all(
+		"Policy Coverage Snapshot",
+		filters={"parent": ["in", policies], "parenttype": "Insurance Policy", "parentfield": "coverage_snapshot"},
+		fields=["parent", *COVERAGE_FIELDS],
+	)
+	by_policy = {}
+	for row in rows:
+		by_policy.setdefault(row.parent, []).append(_coverage_key(row))
+
+	duplicates = [policy for policy, coverages in by_policy.items() if sorted(coverages) == plan_coverages]
+	if duplicates:
+		frappe.db.sql(
+			"""
+			DELETE FROM `tabPolicy Coverage Snapshot`
+			WHERE parenttype = 'Insurance Policy' AND parentfield = 'coverage_snapshot' AND parent IN %s
+		""",
+			(duplicates,),
+		)
+
+
+def _coverage_key(row):
+	return (row.get("coverage_type"), row.get("limit_type"), flt(row.get("limit_value")), flt(row.get("deductible")))
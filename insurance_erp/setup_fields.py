@@ -3,6 +3,16 @@ from frappe.custom.doctype.custom_field.custom_field import create_custom_fields
 
 def setup_all_custom_fields():
     custom_fields = {
+        "Journal Entry Account": [
+            {
+                "fieldname": "insurance_claim",
+                "fieldtype": "Link",
+                "label": "Insurance Claim",
+                "options": "Insurance Claim",
+                "insert_after": "reference_name",
+                "search_index": 1
+            }
+        ],
         "Sales Order": [
             {
                 "fieldname": "insurance_section",
@@ -119,6 +129,23 @@ def setup_all_custom_fields():
                 "label": "Grand Total Premium",
                 "read_only": 1,
                 "insert_after": "total_gst"
+            },
+            {
+                "fieldname": "rating_fingerprint",
+                "fieldtype": "Data",
+                "label": "Rating Fingerprint",
+                "read_only": 1,
+                "hidden": 1,
+                "no_copy": 1,
+                "insert_after": "grand_total_premium"
+            },
+            {
+                "fieldname": "insurance_quote",
+                "fieldtype": "Data",
+                "label": "Quote",
+                "read_only": 1,
+                "no_copy": 1,
+                "insert_after": "rating_fingerprint"
             }
         ],
         "Sales Invoice": [